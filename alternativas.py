@@ -0,0 +1,113 @@
+# alternativas.py
+# Várias opções de plano em uma requisição (configuracoes.alternativas = k):
+# cada alimento de um grupo de get_substitution_rules() pode virar outro do
+# mesmo grupo, na quantidade equivalente, e otimizar_alternativas resolve o
+# mesmo modelo k vezes com um corte de diversidade entre as soluções. A
+# primeira alternativa é a melhor solução (cada troca de alimento do template
+# custa PESO_TROCA); as seguintes usam alimentos diferentes dos de todas as
+# anteriores em pelo menos TROCAS_MIN_ALTERNATIVAS itens.
+
+import copy
+from typing import Any, Dict, List, Tuple
+
+from database import COLUNAS_NUTRIENTES, get_food_data
+from indice_substituicoes import equivalentes
+from multidias import GRUPOS, _multiplicador
+from otimizador import otimizar_alternativas
+from resolvedor import resolver_chave
+from totais import calcular_totais, formatar_totais, vetorizar_plano
+
+
+def opcoes_troca(refeicoes: List[Dict[str, Any]]) -> Tuple[List[List[Any]], Dict[str, Tuple[float, ...]]]:
+    """Opções de cada item para ``otimizar_alternativas`` e a matriz de nutrientes delas.
+
+    O alimento do item vem primeiro; os demais do grupo entram com a
+    quantidade que mantém o macro base do grupo (a mesma conversão do
+    rodízio de ``multidias``).
+    """
+    catalogo = get_food_data()
+    nutrientes = {}
+
+    def registrar(chave):
+        if chave not in nutrientes:
+            nutrientes[chave] = tuple(catalogo[chave][nome] for nome in COLUNAS_NUTRIENTES)
+
+    opcoes = []
+    for refeicao in refeicoes:
+        opcoes_refeicao = []
+        for item in refeicao["alimentos"]:
+            chave = resolver_chave(item["alimento"])
+            if chave is None:
+                opcoes_refeicao.append(None)
+                continue
+            registrar(chave)
+            opcoes_item = [(chave, item["quantidade_g"])]
+            if chave in GRUPOS:
+                _, macro, alimentos = GRUPOS[chave]
+                for opcao in alimentos:
+                    if opcao != chave:
+                        registrar(opcao)
+                        opcoes_item.append((opcao, item["quantidade_g"] * _multiplicador(nutrientes, chave, opcao, macro)))
+            opcoes_refeicao.append(opcoes_item)
+        opcoes.append(opcoes_refeicao)
+    return opcoes, nutrientes
+
+
+def calcular_alternativas(base: List[Dict[str, Any]], dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Núcleo de um plano com alternativas (mesmo formato do de um dia + ``alternativas``).
+
+    ``refeicoes``/``totais_refeicoes``/``totais_dia`` são os da primeira
+    alternativa, para clientes que só leem um plano. Sem solução do solver
+    a única alternativa é o template.
+    """
+    metas = dados.get("metas", {})
+    configuracoes = dados.get("configuracoes", {})
+    peso = dados.get("paciente", {}).get("peso_kg", 0)
+
+    opcoes, nutrientes = opcoes_troca(base)
+    resultados, otimizacao = otimizar_alternativas(
+        base, opcoes, nutrientes, metas, peso, configuracoes, configuracoes.get("alternativas", 1))
+
+    planos = []
+    for resultado in resultados or [None]:
+        refeicoes = copy.deepcopy(base)
+        trocas = []
+        if resultado is not None:
+            for refeicao, escolhas in zip(refeicoes, resultado["escolhas"]):
+                for item, escolha in zip(refeicao["alimentos"], escolhas):
+                    if escolha is None:
+                        continue
+                    chave, gramas = escolha
+                    if chave != resolver_chave(item["alimento"]):
+                        trocas.append({"refeicao": refeicao["nome"], "de": item["alimento"], "para": chave})
+                        item["alimento"] = chave
+                    item["quantidade_g"] = gramas
+        planos.append((refeicoes, trocas, None if resultado is None else resultado["objetivo"]))
+
+    # Um único vetor CSR com as refeições de todas as alternativas
+    vetor = vetorizar_plano([refeicao for refeicoes, _, _ in planos for refeicao in refeicoes])
+    totais_refeicoes, _ = calcular_totais(vetor)
+    saida, posicao = [], 0
+    for i, (refeicoes, trocas, objetivo) in enumerate(planos):
+        totais_dia = [0.0] * len(COLUNAS_NUTRIENTES)
+        for refeicao in refeicoes:
+            totais = totais_refeicoes[posicao]
+            posicao += 1
+            refeicao["totais"] = formatar_totais(totais)
+            refeicao["equivalentes"] = equivalentes(refeicao["alimentos"])
+            totais_dia = [a + b for a, b in zip(totais_dia, totais)]
+        saida.append({"alternativa": i + 1, "refeicoes": refeicoes, "totais_dia": totais_dia,
+                      "trocas": trocas, "objetivo": objetivo})
+
+    return {
+        "refeicoes": saida[0]["refeicoes"],
+        "totais_refeicoes": [list(totais) for totais in totais_refeicoes[:len(base)]],
+        "totais_dia": saida[0]["totais_dia"],
+        "alternativas": saida,
+        "alimentos_nao_resolvidos": sorted(set(vetor.nao_resolvidos)),
+        "alimentos_aproximados": {
+            nome: {"chave": chave, "confianca": confianca}
+            for nome, (chave, confianca) in vetor.aproximados.items()
+        },
+        "otimizacao": otimizacao
+    }
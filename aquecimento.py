@@ -0,0 +1,135 @@
+# aquecimento.py
+# Aquecimento da partida a frio: importa o PuLP, roda um MILP mínimo (o
+# primeiro CBC carrega o binário do disco), monta o índice de substituições
+# e um plano padrão completo, antes da primeira requisição real pagar por isso.
+#
+# NUTRI_AQUECIMENTO escolhe o modo:
+#   fundo (padrão)  thread no import; a porta abre sem esperar. Um fork
+#                   (gunicorn --preload) espera o aquecimento terminar, então
+#                   os workers já nascem aquecidos e nunca herdam um import
+#                   pela metade.
+#   sincrono        tudo no import, antes de a aplicação ficar disponível.
+#   desligado       nada; o PuLP é importado no primeiro solve.
+#
+# GET /pronto responde 503 até o aquecimento terminar.
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from logic import calcular_refeicoes, montar_plano
+import indice_substituicoes
+from otimizador import carregar_solver
+from serializacao import codificar
+
+MODO = os.environ.get("NUTRI_AQUECIMENTO", "fundo")
+# Limite para um fork esperar o aquecimento em andamento
+ESPERA_FORK_S = float(os.environ.get("NUTRI_AQUECIMENTO_ESPERA_FORK_S", "60"))
+
+# Paciente sintético: só exercita o código, nunca entra em cache
+_DADOS = {
+    "paciente": {"nome": "Aquecimento", "peso_kg": 70, "altura_cm": 170, "sexo": "M"},
+    "metas": {
+        "kcal_total": 2000,
+        "proteina_min_g_por_kg": 1.6,
+        "carboidrato_max_percent": 45,
+        "gordura_max_percent": 30,
+        "fibras_min_g": 25,
+    },
+    "configuracoes": {"num_refeicoes": 5, "modo": "padrao"},
+}
+
+
+def _iniciar_cbc():
+    # Um MILP de uma variável: o que importa é o primeiro subprocesso do CBC
+    # (binário lido do disco), não o branch and bound de um plano real
+    pulp = carregar_solver()
+    prob = pulp.LpProblem("aquecimento", pulp.LpMinimize)
+    x = pulp.LpVariable("x", lowBound=0, upBound=10, cat=pulp.LpInteger)
+    prob += x
+    prob += x >= 1
+    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+
+
+def _montar_plano():
+    codificar(montar_plano(_DADOS, calcular_refeicoes(_DADOS)))
+
+
+ETAPAS = (
+    ("solver", carregar_solver),
+    ("cbc", _iniciar_cbc),
+    ("substituicoes", indice_substituicoes.preparar),
+    ("plano", _montar_plano),
+)
+
+
+class Aquecimento:
+    """Executa ``ETAPAS`` uma vez e guarda a duração de cada uma."""
+
+    def __init__(self):
+        self.modo: Optional[str] = None
+        self.etapas: Dict[str, float] = {}
+        self.erro: Optional[str] = None
+        self.duracao_s: Optional[float] = None
+        self._concluido = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pronto(self) -> bool:
+        return self._concluido.is_set()
+
+    def executar(self) -> None:
+        inicio = time.perf_counter()
+        try:
+            for nome, etapa in ETAPAS:
+                t0 = time.perf_counter()
+                etapa()
+                self.etapas[nome] = round(time.perf_counter() - t0, 4)
+        except Exception as e:
+            # Aquecimento é best-effort: a primeira requisição só fica mais lenta
+            self.erro = f"{nome}: {e}"
+        finally:
+            self.duracao_s = round(time.perf_counter() - inicio, 4)
+            self._concluido.set()
+
+    def iniciar(self, modo: str = MODO) -> None:
+        if self.modo is not None:
+            return
+        self.modo = modo
+        if modo == "sincrono":
+            self.executar()
+        elif modo == "fundo":
+            self._thread = threading.Thread(target=self.executar, name="aquecimento", daemon=True)
+            self._thread.start()
+            os.register_at_fork(before=self._antes_do_fork)
+        else:
+            self._concluido.set()
+
+    def aguardar(self, timeout: Optional[float] = None) -> bool:
+        return self._concluido.wait(timeout)
+
+    def _antes_do_fork(self) -> None:
+        if threading.current_thread() is not self._thread:
+            self.aguardar(ESPERA_FORK_S)
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "pronto": self.pronto,
+            "modo": self.modo,
+            "etapas_s": dict(self.etapas),
+            "duracao_s": self.duracao_s,
+            "erro": self.erro,
+        }
+
+
+AQUECIMENTO = Aquecimento()
+
+
+def iniciar(modo: str = MODO) -> None:
+    """Dispara o aquecimento do processo (idempotente)."""
+    AQUECIMENTO.iniciar(modo)
+
+
+def estado() -> Dict[str, Any]:
+    return AQUECIMENTO.estado()
@@ -0,0 +1,389 @@
+# arquivo_planos.py
+# Arquivo colunar opcional dos planos gerados (NUTRI_ARQUIVO_DIR). Cada plano
+# vira linhas achatadas (plano, dia, refeição, alimento, gramas, macros) mais
+# uma linha de resumo com peso, metas e aderência. A gravação acontece em uma
+# thread de fundo alimentada por uma fila: a requisição só faz um put_nowait.
+#
+# Formato: segmentos imutáveis no mesmo espírito do snapshot do catálogo
+# (cabeçalho + colunas contíguas de array + metadados JSON), abertos com
+# mmap. Textos são codificados por dicionário. Segmentos pequenos são
+# compactados em níveis: N segmentos de um nível viram um do nível seguinte.
+# As consultas ficam em consultas_planos.py.
+
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+from database import COLUNAS_NUTRIENTES, get_food_data
+from resolvedor import resolver_chave
+
+logger = logging.getLogger(__name__)
+
+SEGMENTO_MAGIC = b"NUTRIARQ"
+SEGMENTO_VERSAO_FORMATO = 1
+# magic, versão do formato, reservado, offset e tamanho dos metadados
+SEGMENTO_CABECALHO = struct.Struct("<8sHHIQQ")
+SEGMENTO_OFFSET_COLUNAS = 32
+
+ADERENCIA_OK = ("proteina_ok", "carboidrato_ok", "gordura_ok", "fibras_ok")
+
+# tabela -> ((coluna, typecode do array), ...); colunas "I" listadas em
+# COLUNAS_DICIONARIO guardam o índice do texto no dicionário do segmento
+TABELAS = {
+    "itens": (
+        ("plano", "I"), ("dia", "H"), ("refeicao", "I"), ("alimento", "I"), ("quantidade_g", "d"),
+        *((nome, "d") for nome in COLUNAS_NUTRIENTES),
+    ),
+    "planos": (
+        ("plano", "I"), ("instante", "d"), ("modo", "I"), ("peso_kg", "d"), ("kcal_meta", "d"),
+        ("dias", "H"), *((nome, "d") for nome in COLUNAS_NUTRIENTES),
+        ("calorias_percent_meta", "d"), *((nome, "B") for nome in ADERENCIA_OK),
+    ),
+}
+COLUNAS_DICIONARIO = ("plano", "refeicao", "alimento", "modo")
+
+DIRETORIO = os.environ.get("NUTRI_ARQUIVO_DIR")
+FILA_MAX = int(os.environ.get("NUTRI_ARQUIVO_FILA", "10000"))
+LOTE_LINHAS = int(os.environ.get("NUTRI_ARQUIVO_LOTE_LINHAS", "50000"))
+INTERVALO_S = float(os.environ.get("NUTRI_ARQUIVO_INTERVALO_S", "5"))
+# Quantos segmentos de um nível disparam a compactação para o nível seguinte
+COMPACTAR_A_PARTIR = int(os.environ.get("NUTRI_ARQUIVO_COMPACTAR", "8"))
+
+
+class _Buffer:
+    """Colunas em construção de um segmento."""
+
+    def __init__(self):
+        self.tabelas = {nome: {coluna: array(tipo) for coluna, tipo in colunas} for nome, colunas in TABELAS.items()}
+        self.dicionarios: Dict[str, Dict[str, int]] = {coluna: {} for coluna in COLUNAS_DICIONARIO}
+
+    def codigo(self, coluna: str, valor: str) -> int:
+        dicionario = self.dicionarios[coluna]
+        return dicionario.setdefault(valor, len(dicionario))
+
+    @property
+    def linhas(self) -> int:
+        return sum(len(colunas["plano"]) for colunas in self.tabelas.values())
+
+
+class Segmento:
+    """Segmento aberto via mmap: colunas como ``memoryview`` tipadas."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        with open(caminho, "rb") as arquivo:
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, versao_formato, _, _, offset_meta, tamanho_meta = SEGMENTO_CABECALHO.unpack_from(mapa, 0)
+        if magic != SEGMENTO_MAGIC:
+            raise ValueError(f"{caminho}: não é um segmento do arquivo de planos")
+        if versao_formato != SEGMENTO_VERSAO_FORMATO:
+            raise ValueError(f"{caminho}: formato {versao_formato} não suportado (esperado {SEGMENTO_VERSAO_FORMATO})")
+        meta = json.loads(mapa[offset_meta:offset_meta + tamanho_meta])
+        bruto = memoryview(mapa)
+        self.dicionarios: Dict[str, List[str]] = meta["dicionarios"]
+        self.substitui: List[str] = meta["substitui"]
+        self.linhas: Dict[str, int] = {}
+        self.tabelas: Dict[str, Dict[str, memoryview]] = {}
+        for nome, tabela in meta["tabelas"].items():
+            n = tabela["linhas"]
+            self.linhas[nome] = n
+            self.tabelas[nome] = {
+                coluna: bruto[offset:offset + n * array(tipo).itemsize].cast(tipo)
+                for coluna, (tipo, offset) in tabela["colunas"].items()
+            }
+
+
+def _gravar_segmento(diretorio: str, nivel: int, tabelas, dicionarios: Dict[str, List[str]], substitui=()) -> str:
+    """Grava um segmento de forma atômica (arquivo temporário + rename)."""
+    partes, meta_tabelas, offset = [], {}, SEGMENTO_OFFSET_COLUNAS
+    for nome, colunas in tabelas.items():
+        descricao = {}
+        for coluna, valores in colunas.items():
+            dados = valores.tobytes()
+            dados += bytes(-len(dados) % 8)  # alinha cada coluna em 8 bytes
+            descricao[coluna] = (valores.typecode, offset)
+            partes.append(dados)
+            offset += len(dados)
+        meta_tabelas[nome] = {"linhas": len(colunas["plano"]), "colunas": descricao}
+    meta = json.dumps({
+        "tabelas": meta_tabelas,
+        "dicionarios": dicionarios,
+        "substitui": list(substitui),
+        "criado": time.time(),
+    }, ensure_ascii=False).encode("utf-8")
+
+    nome = f"n{nivel}_{time.time_ns():020d}_{os.getpid()}_{uuid.uuid4().hex[:8]}.col"
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+    with os.fdopen(fd, "wb") as arquivo:
+        arquivo.write(SEGMENTO_CABECALHO.pack(SEGMENTO_MAGIC, SEGMENTO_VERSAO_FORMATO, 0, 0, offset, len(meta)))
+        for dados in partes:
+            arquivo.write(dados)
+        arquivo.write(meta)
+    caminho = os.path.join(diretorio, nome)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def listar_segmentos(diretorio: str) -> List[str]:
+    """Segmentos vigentes, em ordem de criação.
+
+    Uma compactação grava o segmento novo antes de apagar os antigos; até lá
+    os antigos continuam no diretório, mas constam em ``substitui`` do novo e
+    são ignorados aqui, então nenhuma linha é contada duas vezes.
+    """
+    caminhos = sorted(glob.glob(os.path.join(diretorio, "n*.col")), key=lambda c: os.path.basename(c).split("_")[1])
+    substituidos = set()
+    for caminho in caminhos:
+        if not os.path.basename(caminho).startswith("n0_"):
+            try:
+                substituidos.update(Segmento(caminho).substitui)
+            except FileNotFoundError:
+                continue
+    return [caminho for caminho in caminhos if os.path.basename(caminho) not in substituidos]
+
+
+def abrir_segmentos(diretorio: str) -> List[Segmento]:
+    segmentos = []
+    for caminho in listar_segmentos(diretorio):
+        try:
+            segmentos.append(Segmento(caminho))
+        except FileNotFoundError:
+            continue  # apagado por uma compactação concorrente já contada
+    return segmentos
+
+
+def _mesclar(segmentos: Iterable[Segmento]):
+    """Colunas e dicionários de vários segmentos em um só (códigos remapeados)."""
+    buffer = _Buffer()
+    for segmento in segmentos:
+        remapear = {
+            coluna: [buffer.codigo(coluna, valor) for valor in segmento.dicionarios[coluna]]
+            for coluna in COLUNAS_DICIONARIO
+        }
+        for nome, colunas in segmento.tabelas.items():
+            for coluna, valores in colunas.items():
+                destino = buffer.tabelas[nome][coluna]
+                if coluna in remapear:
+                    mapa = remapear[coluna]
+                    destino.extend(mapa[codigo] for codigo in valores)
+                else:
+                    destino.frombytes(valores.tobytes())
+    return buffer
+
+
+def _dicionarios(buffer: _Buffer) -> Dict[str, List[str]]:
+    return {coluna: list(valores) for coluna, valores in buffer.dicionarios.items()}
+
+
+def compactar(diretorio: str, a_partir: int = COMPACTAR_A_PARTIR) -> int:
+    """Compacta cada nível com ``a_partir`` ou mais segmentos; retorna quantos
+    segmentos novos foram gravados. Só um processo compacta por vez."""
+    with open(os.path.join(diretorio, "compactacao.lock"), "a") as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        gravados = 0
+        while True:
+            niveis: Dict[int, List[str]] = {}
+            for caminho in listar_segmentos(diretorio):
+                nivel = int(os.path.basename(caminho)[1:].split("_", 1)[0])
+                niveis.setdefault(nivel, []).append(caminho)
+            nivel = next((n for n, caminhos in sorted(niveis.items()) if len(caminhos) >= a_partir), None)
+            if nivel is None:
+                return gravados
+            caminhos = niveis[nivel]
+            buffer = _mesclar(Segmento(caminho) for caminho in caminhos)
+            _gravar_segmento(
+                diretorio, nivel + 1, buffer.tabelas, _dicionarios(buffer),
+                substitui=[os.path.basename(caminho) for caminho in caminhos],
+            )
+            gravados += 1
+            for caminho in caminhos:
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+
+
+class ArquivoPlanos:
+    """Fila + thread de fundo que acumula linhas e grava segmentos.
+
+    ``registrar`` nunca bloqueia: com a fila cheia o plano é descartado e
+    contado em ``descartados``. Um segmento é gravado a cada
+    ``lote_linhas`` linhas ou ``intervalo_s`` segundos com dados pendentes.
+    Um plano que não pode ser achatado ou um segmento que não pode ser
+    gravado é logado e contado em ``falhas``; a thread segue com o próximo.
+    """
+
+    def __init__(self, diretorio: str, fila_max: int = FILA_MAX, lote_linhas: int = LOTE_LINHAS,
+                 intervalo_s: float = INTERVALO_S, compactar_a_partir: int = COMPACTAR_A_PARTIR):
+        self.diretorio = diretorio
+        self.fila_max = fila_max
+        self.lote_linhas = lote_linhas
+        self.intervalo_s = intervalo_s
+        self.compactar_a_partir = compactar_a_partir
+        self.descartados = 0
+        self.falhas = 0
+        self.ultimo_erro: Optional[str] = None
+        self._lock = threading.Lock()
+        self._fila: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _garantir_thread(self):
+        # Threads e filas não sobrevivem ao fork: recria no worker. Uma
+        # thread encerrada (fechar) volta com a mesma fila.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._fila = queue.Queue(maxsize=self.fila_max)
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="arquivo-planos", daemon=True)
+                self._thread.start()
+
+    def registrar(self, plano_id: Optional[str], dados: Dict[str, Any], plano: Dict[str, Any]) -> None:
+        self._garantir_thread()
+        try:
+            self._fila.put_nowait((plano_id or uuid.uuid4().hex, time.time(), dados, plano))
+        except queue.Full:
+            self.descartados += 1
+
+    def fechar(self, timeout: float = 5.0) -> None:
+        """Grava o que estiver pendente e encerra a thread do processo atual."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        try:
+            self._fila.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _executar(self):
+        fila = self._fila
+        buffer = _Buffer()
+        ultimo = time.monotonic()
+        encerrar = False
+        while not encerrar:
+            try:
+                item = fila.get(timeout=self.intervalo_s)
+            except queue.Empty:
+                item = False
+            if item is None:
+                encerrar = True
+            elif item:
+                tamanhos = {nome: len(colunas["plano"]) for nome, colunas in buffer.tabelas.items()}
+                try:
+                    self._acumular(buffer, *item)
+                except Exception as e:
+                    # Desfaz as linhas parciais para as colunas não desalinharem
+                    for nome, colunas in buffer.tabelas.items():
+                        for valores in colunas.values():
+                            del valores[tamanhos[nome]:]
+                    self._falhou(f"plano {item[0]} não arquivado", e)
+            vencido = time.monotonic() - ultimo >= self.intervalo_s
+            if buffer.linhas and (encerrar or vencido or buffer.linhas >= self.lote_linhas):
+                try:
+                    _gravar_segmento(self.diretorio, 0, buffer.tabelas, _dicionarios(buffer))
+                    compactar(self.diretorio, self.compactar_a_partir)
+                except Exception as e:
+                    # O arquivo é best-effort: um disco cheio não derruba a API
+                    self._falhou("segmento do arquivo de planos não gravado", e)
+                buffer = _Buffer()
+                ultimo = time.monotonic()
+
+    def _falhou(self, contexto: str, erro: Exception) -> None:
+        logger.exception("%s", contexto)
+        with self._lock:
+            self.falhas += 1
+            self.ultimo_erro = f"{contexto}: {type(erro).__name__}: {erro}"
+
+    def estado(self) -> Dict[str, Any]:
+        """Saúde da thread de gravação deste processo (para o /pronto)."""
+        with self._lock:
+            # A thread só nasce no primeiro plano registrado pelo processo
+            if self._pid != os.getpid() or self._thread is None:
+                thread = "nao_iniciada"
+            else:
+                thread = "ativa" if self._thread.is_alive() else "parada"
+            return {
+                "thread": thread,
+                "fila": self._fila.qsize() if thread != "nao_iniciada" else 0,
+                "descartados": self.descartados,
+                "falhas": self.falhas,
+                "ultimo_erro": self.ultimo_erro,
+            }
+
+    def _acumular(self, buffer: _Buffer, plano_id: str, instante: float, dados: Dict[str, Any], plano: Dict[str, Any]):
+        catalogo = get_food_data()
+        itens = buffer.tabelas["itens"]
+        codigo_plano = buffer.codigo("plano", plano_id)
+        dias = plano.get("dias") or [{"dia": 1, "refeicoes": plano["refeicoes"]}]
+        for dia in dias:
+            for refeicao in dia["refeicoes"]:
+                codigo_refeicao = buffer.codigo("refeicao", refeicao["nome"])
+                for item in refeicao["alimentos"]:
+                    chave = resolver_chave(item["alimento"])
+                    quantidade = item["quantidade_g"]
+                    itens["plano"].append(codigo_plano)
+                    itens["dia"].append(dia["dia"])
+                    itens["refeicao"].append(codigo_refeicao)
+                    itens["alimento"].append(buffer.codigo("alimento", chave or item["alimento"]))
+                    itens["quantidade_g"].append(quantidade)
+                    alimento = catalogo[chave] if chave is not None else None
+                    for nome in COLUNAS_NUTRIENTES:
+                        itens[nome].append(alimento[nome] * quantidade if alimento is not None else 0.0)
+
+        resumo = plano["resumo_nutricional"]
+        aderencia = resumo["aderencia"]
+        totais = resumo["totais_reais"]
+        configuracoes = dados.get("configuracoes", {})
+        planos = buffer.tabelas["planos"]
+        planos["plano"].append(codigo_plano)
+        planos["instante"].append(instante)
+        planos["modo"].append(buffer.codigo("modo", configuracoes.get("modo", "padrao")))
+        planos["peso_kg"].append(dados.get("paciente", {}).get("peso_kg", 0))
+        planos["kcal_meta"].append(dados.get("metas", {}).get("kcal_total", 0))
+        planos["dias"].append(len(dias))
+        for nome, campo in zip(COLUNAS_NUTRIENTES, ("calorias", "proteina_g", "carboidrato_g", "gordura_g", "fibras_g")):
+            planos[nome].append(totais[campo])
+        percentual = aderencia["calorias_percent_meta"]
+        planos["calorias_percent_meta"].append(float("nan") if percentual is None else percentual)
+        for nome in ADERENCIA_OK:
+            planos[nome].append(1 if aderencia[nome] else 0)
+
+
+def _criar_arquivo():
+    if not DIRETORIO:
+        return None
+    arquivo = ArquivoPlanos(DIRETORIO)
+    atexit.register(arquivo.fechar)
+    return arquivo
+
+
+ARQUIVO = _criar_arquivo()
+
+
+def estado() -> Optional[Dict[str, Any]]:
+    """Saúde do arquivo de planos, ou None se NUTRI_ARQUIVO_DIR não estiver definido."""
+    return ARQUIVO.estado() if ARQUIVO is not None else None
+
+
+def arquivar(plano_id: Optional[str], dados: Dict[str, Any], plano: Dict[str, Any]) -> None:
+    """Enfileira ``plano`` no arquivo colunar, se NUTRI_ARQUIVO_DIR estiver definido."""
+    if ARQUIVO is not None:
+        ARQUIVO.registrar(plano_id, dados, plano)
@@ -0,0 +1,59 @@
+# benchmarks/alternativas.py
+# Custo de configuracoes.alternativas = k contra k pedidos independentes no
+# modo otimizado (sem cache), e quantos alimentos separam as alternativas.
+#
+# Uso: python benchmarks/alternativas.py [pacientes] [--k 3 5]
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("NUTRI_AQUECIMENTO", "desligado")
+
+from benchmarks.payloads import pacientes  # noqa: E402
+from logic import calcular_refeicoes  # noqa: E402
+from otimizador import carregar_solver  # noqa: E402
+
+
+def _segundos(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def medir(n=10, valores_k=(3, 5)):
+    carregar_solver()
+    corpos = list(pacientes(n, "otimizado"))
+    calcular_refeicoes(corpos[0])
+
+    resultado = {"pacientes": n}
+    for k in valores_k:
+        juntos, separados, obtidas, trocas = [], [], [], []
+        for dados in corpos:
+            pedido = dict(dados, configuracoes=dict(dados["configuracoes"], alternativas=k))
+            tempo, nucleo = _segundos(lambda: calcular_refeicoes(pedido))
+            juntos.append(tempo)
+            obtidas.append(len(nucleo["alternativas"]))
+            trocas.extend(len(alternativa["trocas"]) for alternativa in nucleo["alternativas"][1:])
+            separados.append(sum(_segundos(lambda: calcular_refeicoes(dados))[0] for _ in range(k)))
+        resultado[f"k{k}"] = {
+            "alternativas_s": round(statistics.median(juntos), 3),
+            "independentes_s": round(statistics.median(separados), 3),
+            "razao": round(statistics.median(juntos) / statistics.median(separados), 2),
+            "alternativas_obtidas_min": min(obtidas),
+            "trocas_por_alternativa": round(statistics.mean(trocas), 1) if trocas else 0,
+        }
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alternativas em um pedido vs pedidos independentes")
+    parser.add_argument("pacientes", nargs="?", type=int, default=10)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5])
+    args = parser.parse_args()
+    print(json.dumps(medir(args.pacientes, args.k), indent=2, ensure_ascii=False))
@@ -0,0 +1,110 @@
+# benchmarks/arranque.py
+# Partida a frio: quanto tempo do start do gunicorn até a primeira resposta
+# de /gerarPlano, e de onde vem o custo de import (python -X importtime).
+#
+# Uso: python benchmarks/arranque.py [repeticoes] [--importtime N]
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from benchmarks.carga import API_KEY  # noqa: E402
+from benchmarks.payloads import pacientes  # noqa: E402
+
+PORTA = 18100
+
+
+def importtime(modulo="main", top=15):
+    """Módulos com maior tempo cumulativo de import (ms), do -X importtime."""
+    # Sem aquecimento: a thread dele importaria em paralelo e embaralharia a árvore
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+        env=dict(os.environ, NUTRI_AQUECIMENTO="desligado"),
+    ).stderr
+    tempos = {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        _, cumulativo, nome = linha.split("|")
+        # Só os imports de primeiro e segundo nível mostram onde está o custo
+        if len(nome) - len(nome.lstrip()) <= 3:
+            tempos[nome.strip()] = int(cumulativo) / 1000
+    ordenados = sorted(tempos.items(), key=lambda item: item[1], reverse=True)
+    return {"total_ms": round(tempos.get(modulo, 0), 1), "modulos_ms": {n: round(t, 1) for n, t in ordenados[:top]}}
+
+
+def _requisicao(porta, metodo, caminho, corpo=None, headers=None):
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+    conexao.request(metodo, caminho, body=corpo, headers=headers or {})
+    resposta = conexao.getresponse()
+    resposta.read()
+    return resposta.status
+
+
+def partida(ambiente, corpo):
+    """Segundos do Popen até (1) a porta responder, (2) o primeiro plano e (3) o segundo."""
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        ["gunicorn", "main:app", "--preload", "--workers", "2", "--threads", "4", "--bind", f"127.0.0.1:{PORTA}"],
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                _requisicao(PORTA, "GET", "/")
+                break
+            except OSError:
+                if time.perf_counter() - inicio > 60:
+                    raise RuntimeError("gunicorn não subiu")
+                time.sleep(0.005)
+        porta_pronta = time.perf_counter()
+        headers = {"API_KEY": API_KEY, "Content-Type": "application/json"}
+        status = _requisicao(PORTA, "POST", "/gerarPlano", corpo, headers)
+        primeiro = time.perf_counter()
+        _requisicao(PORTA, "POST", "/gerarPlano", corpo, headers)
+        segundo = time.perf_counter()
+        if status != 200:
+            raise RuntimeError(f"/gerarPlano respondeu {status}")
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        processo.wait(timeout=60)
+    return {
+        "ate_porta_s": porta_pronta - inicio,
+        "ate_primeiro_plano_s": primeiro - inicio,
+        "primeiro_plano_s": primeiro - porta_pronta,
+        "segundo_plano_s": segundo - primeiro,
+    }
+
+
+def medir(repeticoes=5, modo="otimizado"):
+    corpo = json.dumps(next(pacientes(1, modo))).encode("utf-8")
+    ambiente = dict(os.environ, API_KEY=API_KEY, NUTRI_CACHE_TAMANHO="0")
+    medidas = [partida(ambiente, corpo) for _ in range(repeticoes)]
+    return {
+        "repeticoes": repeticoes,
+        "modo": modo,
+        "mediana": {chave: round(statistics.median(m[chave] for m in medidas), 3) for chave in medidas[0]},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempo de partida a frio do gunicorn")
+    parser.add_argument("repeticoes", nargs="?", type=int, default=5)
+    parser.add_argument("--modo", default="otimizado")
+    parser.add_argument("--importtime", type=int, default=15, metavar="N",
+                        help="quantos módulos listar no breakdown de import")
+    args = parser.parse_args()
+    print(json.dumps({
+        "importtime": importtime("main", args.importtime),
+        "partida": medir(args.repeticoes, args.modo),
+    }, indent=2, ensure_ascii=False))
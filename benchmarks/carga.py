@@ -0,0 +1,126 @@
+# benchmarks/carga.py
+# Gerador de carga em malha fechada para POST /gerarPlano: via interface WSGI
+# (main.app no próprio processo) ou via HTTP (gunicorn/uvicorn locais).
+
+import http.client
+import threading
+import time
+from io import BytesIO
+
+API_KEY = "benchmark"
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(int(p / 100 * len(ordenados)), len(ordenados) - 1)]
+
+
+def executar(criar_cliente, corpos, clientes, duracao_s):
+    """Roda ``clientes`` threads por ``duracao_s``; cada uma reenvia assim que recebe.
+
+    ``criar_cliente()`` devolve, por thread, uma função ``enviar(corpo) -> status``.
+    Retorna RPS, latências p50/p95/p99 (só respostas 200) e contagem por status.
+    """
+    latencias, status = [], {}
+    lock = threading.Lock()
+    fim = time.monotonic() + duracao_s
+
+    def cliente(indice):
+        enviar = criar_cliente()
+        i = indice
+        while time.monotonic() < fim:
+            corpo = corpos[i % len(corpos)]
+            i += clientes
+            inicio = time.perf_counter()
+            codigo = enviar(corpo)
+            decorrido = time.perf_counter() - inicio
+            with lock:
+                status[codigo] = status.get(codigo, 0) + 1
+                if codigo == 200:
+                    latencias.append(decorrido)
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_s = time.perf_counter() - inicio
+
+    latencias.sort()
+    resultado = {
+        "requisicoes": sum(status.values()),
+        "rps_200": round(len(latencias) / total_s, 1),
+        "status": {str(codigo): n for codigo, n in sorted(status.items(), key=str)},
+    }
+    for p in (50, 95, 99):
+        resultado[f"p{p}_ms"] = round(_percentil(latencias, p) * 1000, 2) if latencias else None
+    return resultado
+
+
+def cliente_wsgi(app, caminho="/gerarPlano"):
+    """Chama o app WSGI diretamente, sem socket nem servidor."""
+    def criar():
+        def enviar(corpo):
+            ambiente = {
+                "REQUEST_METHOD": "POST",
+                "PATH_INFO": caminho,
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(corpo)),
+                "HTTP_API_KEY": API_KEY,
+                "wsgi.input": BytesIO(corpo),
+                "wsgi.url_scheme": "http",
+                "wsgi.errors": BytesIO(),
+                "wsgi.multithread": True,
+                "wsgi.multiprocess": False,
+                "wsgi.run_once": False,
+            }
+            estado = {}
+
+            def start_response(status, cabecalhos, exc_info=None):
+                estado["status"] = int(status.split(" ", 1)[0])
+
+            resposta = app(ambiente, start_response)
+            try:
+                for _ in resposta:
+                    pass
+            finally:
+                if hasattr(resposta, "close"):
+                    resposta.close()
+            return estado["status"]
+        return enviar
+    return criar
+
+
+def cliente_http(porta, caminho="/gerarPlano", host="127.0.0.1"):
+    """Uma conexão keep-alive por thread; erros de rede contam como "erro"."""
+    def criar():
+        conexao = [http.client.HTTPConnection(host, porta, timeout=60)]
+
+        def enviar(corpo):
+            try:
+                conexao[0].request("POST", caminho, corpo, {"API_KEY": API_KEY, "Content-Type": "application/json"})
+                resposta = conexao[0].getresponse()
+                resposta.read()
+                return resposta.status
+            except (OSError, http.client.HTTPException):
+                conexao[0].close()
+                conexao[0] = http.client.HTTPConnection(host, porta, timeout=60)
+                return "erro"
+        return enviar
+    return criar
+
+
+def esperar_pronto(porta, timeout=30, host="127.0.0.1"):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conexao = http.client.HTTPConnection(host, porta, timeout=1)
+            conexao.request("GET", "/")
+            conexao.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"servidor não respondeu na porta {porta}")
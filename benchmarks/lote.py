@@ -0,0 +1,50 @@
+# benchmarks/lote.py
+# Vazão (planos/s) de POST /gerarPlanos comparada a um loop de POST /gerarPlano.
+#
+# Uso: python benchmarks/lote.py [num_pacientes] [modo]
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("API_KEY", "benchmark")
+# Tamanho zero desliga o cache: cada paciente custa um plano completo
+os.environ.setdefault("NUTRI_CACHE_TAMANHO", "0")
+
+import lote  # noqa: E402
+import main  # noqa: E402
+from benchmarks.payloads import pacientes  # noqa: E402
+
+
+def main_benchmark(n=50, modo="otimizado"):
+    cliente = main.app.test_client()
+    cabecalhos = {"API_KEY": os.environ["API_KEY"]}
+    payloads = list(pacientes(n, modo))
+
+    inicio = time.perf_counter()
+    for dados in payloads:
+        assert cliente.post("/gerarPlano", json=dados, headers=cabecalhos).status_code == 200
+    loop_s = time.perf_counter() - inicio
+
+    corpo = "\n".join(json.dumps(dados) for dados in payloads)
+    inicio = time.perf_counter()
+    resposta = cliente.post("/gerarPlanos", data=corpo, headers=cabecalhos, content_type="application/x-ndjson")
+    linhas = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+    lote_s = time.perf_counter() - inicio
+
+    print(json.dumps({
+        "pacientes": n,
+        "modo": modo,
+        "processos": lote.num_processos(),
+        "loop_planos_por_s": round(n / loop_s, 1),
+        "lote_planos_por_s": round(n / lote_s, 1),
+        "aceleracao": round(loop_s / lote_s, 2),
+        "erros_lote": linhas[-1]["resumo"]["erros"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+                   sys.argv[2] if len(sys.argv) > 2 else "otimizado")
@@ -0,0 +1,20 @@
+# benchmarks/payloads.py
+# Gerador determinístico (semente fixa) de payloads sintéticos de /gerarPlano.
+
+import random
+
+
+def pacientes(n, modo="padrao", semente=42):
+    rng = random.Random(semente)
+    for i in range(n):
+        yield {
+            "paciente": {"nome": f"Paciente {i}", "peso_kg": rng.randint(50, 110), "altura_cm": rng.randint(150, 195)},
+            "metas": {
+                "kcal_total": rng.randrange(1400, 3200, 50),
+                "proteina_min_g_por_kg": rng.choice([1.2, 1.6, 2.0]),
+                "carboidrato_max_percent": rng.choice([40, 45, 50]),
+                "gordura_max_percent": rng.choice([25, 30, 35]),
+                "fibras_min_g": rng.choice([25, 30]),
+            },
+            "configuracoes": {"num_refeicoes": rng.choice([3, 4, 5]), "modo": modo},
+        }
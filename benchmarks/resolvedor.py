@@ -0,0 +1,81 @@
+# benchmarks/resolvedor.py
+# Casos reais de resolução de nomes livres (nome -> chave esperada, ou None
+# para "fora do catálogo") e o custo de uma resolução sem cache. Sai com
+# código 1 se algum caso divergir, para rodar antes de mexer na pontuação.
+#
+# Uso: python benchmarks/resolvedor.py [repeticoes]
+# (com NUTRI_CATALOGO_SNAPSHOT os casos não se aplicam; só o tempo vale)
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("NUTRI_AQUECIMENTO", "desligado")
+
+from resolvedor import CONFIANCA_MIN, RESOLVEDOR, normalizar_nome  # noqa: E402
+
+CASOS = {
+    # Token inicial manda: "doce_leite" é doce, não leite
+    "Leite": "leite_desnatado",
+    "Ovo": "ovo_inteiro",
+    "Iogurte": "iogurte_natural",
+    "Queijo minas": "queijo_minas_light",
+    "Arroz integral": "arroz_integral_cozido",
+    "Pão integral": "pao_integral",
+    # Preposições não contam como token sem par
+    "Peito de frango": "peito_frango_grelhado_sem_pele",
+    "Aveia em flocos": "aveia_flocos",
+    "Whey protein": "whey_protein_isolado_hidrolisado",
+    "Morangos": "morangos",
+    # Token sem par no catálogo: melhor não resolver que trocar o alimento
+    "Iogurte grego natural": None,
+    "Leite de coco": None,
+    "Carne": None,
+}
+
+# Chaves que não podem aparecer nem como sugestão acima de CONFIANCA_MIN:
+# "frango" e "morango" compartilham quatro trigramas, mas nenhum token
+PROIBIDOS = {
+    "Frango": "morango",
+    "Batata doce": "doce_leite",
+}
+
+
+def verificar():
+    falhas = []
+    for nome, esperado in CASOS.items():
+        resolvido = RESOLVEDOR.resolver(nome)
+        obtido = resolvido[0] if resolvido else None
+        if obtido != esperado:
+            falhas.append({"nome": nome, "esperado": esperado, "obtido": resolvido})
+    for nome, proibido in PROIBIDOS.items():
+        for chave, confianca in RESOLVEDOR.sugestoes(nome):
+            if chave == proibido and confianca >= CONFIANCA_MIN:
+                falhas.append({"nome": nome, "proibido": proibido, "confianca": confianca})
+    return falhas
+
+
+def medir(repeticoes):
+    nomes = [normalizar_nome(nome) for nome in CASOS]
+
+    def sem_cache():
+        for nome in nomes:
+            RESOLVEDOR._pontuar(nome)
+
+    melhor = min(timeit.repeat(sem_cache, number=repeticoes, repeat=5))
+    return {
+        "chaves": len(RESOLVEDOR.chaves),
+        "resolucao_sem_cache_us": round(melhor / (repeticoes * len(nomes)) * 1e6, 2),
+    }
+
+
+if __name__ == "__main__":
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    resultado = medir(repeticoes)
+    falhas = [] if os.environ.get("NUTRI_CATALOGO_SNAPSHOT") else verificar()
+    resultado["falhas"] = falhas
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,84 @@
+# benchmarks/servidores.py
+# Teste de carga de POST /gerarPlano comparando a configuração atual
+# (gunicorn, main:app) com a variante ASGI (uvicorn, main_async:app) com o
+# mesmo número de processos, para comparar com memória equivalente.
+#
+# Uso: python benchmarks/servidores.py [clientes] [duracao_s] [modo]
+
+import json
+import os
+import signal
+import subprocess
+import sys
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from benchmarks.carga import API_KEY, cliente_http, esperar_pronto, executar  # noqa: E402
+from benchmarks.payloads import pacientes  # noqa: E402
+
+PORTA = 18000
+
+SERVIDORES = {
+    "gunicorn_wsgi": lambda porta: [
+        "gunicorn", "main:app", "--preload", "--workers", "2", "--threads", "4", "--bind", f"127.0.0.1:{porta}",
+    ],
+    "uvicorn_asgi": lambda porta: [
+        "uvicorn", "main_async:app", "--workers", "2", "--log-level", "warning", "--port", str(porta),
+    ],
+}
+
+
+def _rss_kb(pid):
+    """RSS somado do processo e de todos os descendentes (lido de /proc)."""
+    filhos = {}
+    for entrada in os.listdir("/proc"):
+        if entrada.isdigit():
+            try:
+                with open(f"/proc/{entrada}/stat") as arquivo:
+                    ppid = int(arquivo.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            filhos.setdefault(ppid, []).append(int(entrada))
+    total, pendentes = 0, [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pendentes.extend(filhos.get(atual, ()))
+        try:
+            with open(f"/proc/{atual}/status") as arquivo:
+                for linha in arquivo:
+                    if linha.startswith("VmRSS:"):
+                        total += int(linha.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def comparar(clientes=32, duracao_s=10.0, modo="otimizado"):
+    corpos = [json.dumps(dados).encode("utf-8") for dados in pacientes(200, modo)]
+    ambiente = dict(os.environ, API_KEY=API_KEY, NUTRI_CACHE_TAMANHO="0")
+    resultados = {"clientes": clientes, "duracao_s": duracao_s, "modo": modo, "servidores": {}}
+    for i, (nome, comando) in enumerate(SERVIDORES.items()):
+        porta = PORTA + i
+        processo = subprocess.Popen(
+            comando(porta), cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            esperar_pronto(porta)
+            rss_inicial = _rss_kb(processo.pid)
+            carga = executar(cliente_http(porta), corpos, clientes, duracao_s)
+            carga["rss_mb_inicial"] = round(rss_inicial / 1024, 1)
+            carga["rss_mb_final"] = round(_rss_kb(processo.pid) / 1024, 1)
+            resultados["servidores"][nome] = carga
+        finally:
+            processo.send_signal(signal.SIGTERM)
+            processo.wait(timeout=60)
+    return resultados
+
+
+if __name__ == "__main__":
+    print(json.dumps(comparar(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 32,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10.0,
+        sys.argv[3] if len(sys.argv) > 3 else "otimizado",
+    ), indent=2))
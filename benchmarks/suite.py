@@ -0,0 +1,129 @@
+# benchmarks/suite.py
+# Suíte de benchmarks do pipeline de planos: micro-benchmarks das funções
+# principais e carga em /gerarPlano (via WSGI no processo e via gunicorn).
+# O resultado vai para um JSON identificado pelo commit, para comparar
+# regressões entre versões (benchmarks/resultados/ fica fora do git).
+#
+# Uso: python benchmarks/suite.py [--rapido] [--sem-gunicorn] [--saida arquivo.json]
+
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+import timeit
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("API_KEY", "benchmark")
+# Sem cache: cada requisição mede um plano completo
+os.environ.setdefault("NUTRI_CACHE_TAMANHO", "0")
+
+import database  # noqa: E402
+import main  # noqa: E402
+import prescritor_pedro_barros  # noqa: E402
+import serializacao  # noqa: E402
+from benchmarks.carga import API_KEY, cliente_http, cliente_wsgi, esperar_pronto, executar  # noqa: E402
+from benchmarks.payloads import pacientes  # noqa: E402
+from logic import gerar_plano_personalizado  # noqa: E402
+
+PORTA_GUNICORN = 18100
+
+
+def _por_chamada_us(funcao, numero):
+    """Melhor de 5 rodadas, em microssegundos por chamada."""
+    return round(min(timeit.repeat(funcao, number=numero, repeat=5)) / numero * 1e6, 2)
+
+
+def micro(rapido=False):
+    escala = 10 if rapido else 1
+    dados = next(pacientes(1))
+    otimizado = dict(dados, configuracoes=dict(dados["configuracoes"], modo="otimizado"))
+    paciente, metas = dados["paciente"], dados["metas"]
+    resposta = gerar_plano_personalizado(dados)
+    tabela = database._tabela_padrao()
+
+    resultados = {
+        "get_food_data_construcao_us": _por_chamada_us(
+            lambda: database.CatalogoAlimentos.de_tabela(database._tabela_padrao()), 200 // escala),
+        "catalogo_de_tabela_us": _por_chamada_us(lambda: database.CatalogoAlimentos.de_tabela(tabela), 200 // escala),
+        "validate_food_data_us": _por_chamada_us(
+            lambda: database.validate_food_data(database.CATALOGO), 200 // escala),
+        "gerar_plano_padrao_us": _por_chamada_us(lambda: gerar_plano_personalizado(dados), 200 // escala),
+        "gerar_plano_otimizado_us": _por_chamada_us(lambda: gerar_plano_personalizado(otimizado), max(10 // escala, 1)),
+        "serializacao_resposta_us": _por_chamada_us(lambda: serializacao.codificar(resposta), 2000 // escala),
+    }
+    for nome in ("cafe", "almoco", "lanche", "jantar", "ceia"):
+        prescrever = getattr(prescritor_pedro_barros, f"prescrever_{nome}")
+        resultados[f"prescrever_{nome}_us"] = _por_chamada_us(lambda: prescrever(paciente, metas), 20000 // escala)
+        refeicao = prescrever(paciente, metas)
+        resultados[f"gerar_substituicoes_{nome}_us"] = _por_chamada_us(
+            lambda: prescritor_pedro_barros.gerar_substituicoes(refeicao), 2000 // escala)
+    return resultados
+
+
+def carga_wsgi(corpos, clientes, duracao_s):
+    return executar(cliente_wsgi(main.app), corpos, clientes, duracao_s)
+
+
+def carga_gunicorn(corpos, clientes, duracao_s):
+    processo = subprocess.Popen(
+        ["gunicorn", "main:app", "--preload", "--workers", "2", "--threads", "4",
+         "--bind", f"127.0.0.1:{PORTA_GUNICORN}"],
+        cwd=RAIZ, env=dict(os.environ, API_KEY=API_KEY), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_pronto(PORTA_GUNICORN)
+        return executar(cliente_http(PORTA_GUNICORN), corpos, clientes, duracao_s)
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        processo.wait(timeout=60)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def main_suite():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de planos.")
+    parser.add_argument("--rapido", action="store_true", help="menos repetições e carga mais curta")
+    parser.add_argument("--sem-gunicorn", action="store_true", help="pula a carga via gunicorn")
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--duracao", type=float, default=None, help="segundos de carga por cenário")
+    parser.add_argument("--saida", help="arquivo JSON (padrão: benchmarks/resultados/<commit>.json)")
+    args = parser.parse_args()
+    duracao_s = args.duracao or (2.0 if args.rapido else 10.0)
+
+    commit = _commit()
+    resultado = {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "serializacao": serializacao.MOTOR,
+        "cpus": os.cpu_count(),
+        "micro": micro(args.rapido),
+        "carga": {},
+    }
+    for modo in ("padrao", "otimizado"):
+        corpos = [json.dumps(dados).encode("utf-8") for dados in pacientes(200, modo)]
+        resultado["carga"][f"wsgi_{modo}"] = carga_wsgi(corpos, args.clientes, duracao_s)
+        if not args.sem_gunicorn:
+            resultado["carga"][f"gunicorn_{modo}"] = carga_gunicorn(corpos, args.clientes, duracao_s)
+
+    saida = args.saida or os.path.join(RAIZ, "benchmarks", "resultados", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w") as arquivo:
+        json.dump(resultado, arquivo, indent=2)
+    print(json.dumps(resultado, indent=2))
+    print(f"Resultado gravado em {saida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_suite()
@@ -0,0 +1,54 @@
+# benchmarks/validacao.py
+# Custo de decodificar + validar o payload de /gerarPlano e de codificar a
+# resposta, com orjson (se instalado) e com o json da biblioteca padrão.
+#
+# Uso: python benchmarks/validacao.py [repeticoes]
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import serializacao  # noqa: E402
+from logic import gerar_plano_personalizado  # noqa: E402
+from validacao import validar_pedido  # noqa: E402
+
+PAYLOAD = {
+    "paciente": {"nome": "Ana", "peso_kg": 70, "altura_cm": 165, "sexo": "F"},
+    "metas": {
+        "kcal_total": 1800,
+        "proteina_min_g_por_kg": 1.6,
+        "carboidrato_max_percent": 45,
+        "gordura_max_percent": 30,
+        "fibras_min_g": 25,
+    },
+    "configuracoes": {"num_refeicoes": 5, "preferencias": {"hamburguer_jantar": True}},
+}
+
+
+def medir(repeticoes):
+    corpo = json.dumps(PAYLOAD).encode("utf-8")
+    resposta = gerar_plano_personalizado(PAYLOAD)
+
+    def por_chamada_us(funcao):
+        return round(min(timeit.repeat(funcao, number=repeticoes, repeat=5)) / repeticoes * 1e6, 2)
+
+    return {
+        "motor": serializacao.MOTOR,
+        "decodificar_us": por_chamada_us(lambda: serializacao.decodificar(corpo)),
+        "decodificar_validar_us": por_chamada_us(lambda: validar_pedido(serializacao.decodificar(corpo)).para_dict()),
+        "codificar_resposta_us": por_chamada_us(lambda: serializacao.codificar(resposta)),
+    }
+
+
+if __name__ == "__main__":
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    resultados = [medir(repeticoes)]
+    if serializacao.orjson is not None:
+        # Mesma medição forçando o fallback da biblioteca padrão
+        serializacao.orjson = None
+        serializacao.MOTOR = "json"
+        resultados.append(medir(repeticoes))
+    print(json.dumps(resultados, indent=2))
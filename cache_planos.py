@@ -0,0 +1,228 @@
+# cache_planos.py
+# Cache de planos: chaveado por um hash canônico das metas numéricas, com
+# kcal e peso arredondados em faixas configuráveis. Nome e demais campos de
+# texto não entram na chave; são aplicados de novo na hora da resposta.
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Generator, Optional, Tuple
+
+from coalescencia import Coalescedor
+
+FAIXA_KCAL = float(os.environ.get("NUTRI_CACHE_FAIXA_KCAL", "50"))
+FAIXA_PESO_KG = float(os.environ.get("NUTRI_CACHE_FAIXA_PESO_KG", "1"))
+TAMANHO_MAX = int(os.environ.get("NUTRI_CACHE_TAMANHO", "256"))
+TTL_S = float(os.environ.get("NUTRI_CACHE_TTL_S", "600"))
+# TTL de resultados provisórios (solução viável, mas não provada ótima);
+# 0 desliga o cache deles
+TTL_PROVISORIO_S = float(os.environ.get("NUTRI_CACHE_TTL_PROVISORIO_S", "30"))
+# Caminho de um SQLite compartilhado entre os workers (opcional)
+CAMINHO_SQLITE = os.environ.get("NUTRI_CACHE_SQLITE")
+
+
+def _arredondar(valor, faixa):
+    if not faixa or not isinstance(valor, (int, float)):
+        return valor
+    return round(round(valor / faixa) * faixa, 6)
+
+
+def normalizar(dados: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Retorna (chave, dados normalizados) para um payload de /gerarPlano.
+
+    Só os campos numéricos e de configuração entram na chave; kcal e peso
+    são levados ao centro da faixa, e o plano é calculado com esses valores
+    para valer para qualquer requisição da mesma faixa.
+    """
+    paciente = dados.get("paciente", {})
+    metas = dict(dados.get("metas", {}))
+    if "kcal_total" in metas:
+        metas["kcal_total"] = _arredondar(metas["kcal_total"], FAIXA_KCAL)
+    normalizados = {
+        "paciente": {"peso_kg": _arredondar(paciente.get("peso_kg", 0), FAIXA_PESO_KG)},
+        "metas": metas,
+        "configuracoes": dados.get("configuracoes", {}),
+    }
+    canonico = json.dumps(normalizados, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest(), normalizados
+
+
+class _BackendSQLite:
+    """Armazenamento compartilhado entre processos em um arquivo SQLite."""
+
+    def __init__(self, caminho: str, tamanho_max: int):
+        self.caminho = caminho
+        self.tamanho_max = tamanho_max
+        with self._conectar() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS planos ("
+                "chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL, acesso REAL NOT NULL)"
+            )
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=1.0)
+
+    def obter(self, chave: str) -> Optional[str]:
+        agora = time.time()
+        with self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT valor FROM planos WHERE chave = ? AND expira > ?", (chave, agora)
+            ).fetchone()
+            if linha is None:
+                return None
+            conn.execute("UPDATE planos SET acesso = ? WHERE chave = ?", (agora, chave))
+            return linha[0]
+
+    def gravar(self, chave: str, valor: str, ttl: float) -> None:
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO planos (chave, valor, expira, acesso) VALUES (?, ?, ?, ?)",
+                (chave, valor, agora + ttl, agora),
+            )
+            conn.execute("DELETE FROM planos WHERE expira <= ?", (agora,))
+            conn.execute(
+                "DELETE FROM planos WHERE chave NOT IN "
+                "(SELECT chave FROM planos ORDER BY acesso DESC LIMIT ?)",
+                (self.tamanho_max,),
+            )
+
+
+class CachePlanos:
+    """LRU com TTL em memória, opcionalmente apoiado por um SQLite compartilhado."""
+
+    def __init__(self, tamanho_max: int = TAMANHO_MAX, ttl: float = TTL_S,
+                 caminho_sqlite: Optional[str] = CAMINHO_SQLITE):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self._itens: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compartilhado = _BackendSQLite(caminho_sqlite, tamanho_max) if caminho_sqlite else None
+        # Cálculos simultâneos da mesma chave viram um só (single-flight)
+        self.coalescedor = Coalescedor()
+        self.acertos = 0
+        self.acertos_compartilhados = 0
+        self.falhas = 0
+
+    def obter(self, chave: str):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                expira, valor = item
+                if expira > agora:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return copy.deepcopy(valor)
+                del self._itens[chave]
+
+        if self._compartilhado is not None:
+            serializado = self._compartilhado.obter(chave)
+            if serializado is not None:
+                valor = json.loads(serializado)
+                self._gravar_local(chave, copy.deepcopy(valor))
+                with self._lock:
+                    self.acertos_compartilhados += 1
+                return valor
+
+        with self._lock:
+            self.falhas += 1
+        return None
+
+    def gravar(self, chave: str, valor, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._gravar_local(chave, copy.deepcopy(valor), ttl)
+        if self._compartilhado is not None:
+            self._compartilhado.gravar(chave, json.dumps(valor), ttl)
+
+    def _gravar_local(self, chave: str, valor, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+
+    def obter_ou_calcular(self, dados: Dict[str, Any], calcular: Callable[[Dict[str, Any]], Any],
+                          cacheavel: Optional[Callable[[Any], bool]] = None,
+                          provisorio: Optional[Callable[[Any], bool]] = None):
+        """Busca o plano da faixa de ``dados`` ou o calcula com os dados normalizados.
+
+        ``cacheavel`` permite recusar resultados inválidos (por exemplo, um
+        fallback do solver) para que a próxima requisição tente de novo;
+        resultados marcados por ``provisorio`` (por exemplo, o solver parou
+        no tempo limite) ficam só ``TTL_PROVISORIO_S`` segundos.
+        Falhas de cache simultâneas da mesma chave esperam um único cálculo.
+        """
+        chave, normalizados = normalizar(dados)
+        valor = self.obter(chave)
+        if valor is not None:
+            return valor
+
+        def calcular_e_gravar():
+            valor = calcular(normalizados)
+            self._guardar(chave, valor, cacheavel, provisorio)
+            return valor
+
+        return self.coalescedor.executar(chave, calcular_e_gravar, lambda: self.obter(chave))
+
+    def obter_ou_calcular_em_fluxo(self, dados: Dict[str, Any],
+                                   calcular: Callable[[Dict[str, Any]], Generator[Any, None, Any]],
+                                   cacheavel: Optional[Callable[[Any], bool]] = None,
+                                   provisorio: Optional[Callable[[Any], bool]] = None) -> Generator[Any, None, Any]:
+        """Versão geradora de ``obter_ou_calcular``: repassa o que ``calcular``
+        produz enquanto calcula e retorna (``StopIteration.value``) o valor.
+
+        Em um acerto nada é produzido. Não passa pelo coalescedor: quem
+        espera o cálculo de outra requisição não teria o que repassar, então
+        só cálculos baratos (sem solver) devem vir por aqui.
+        """
+        chave, normalizados = normalizar(dados)
+        valor = self.obter(chave)
+        if valor is not None:
+            return valor
+        valor = yield from calcular(normalizados)
+        self._guardar(chave, valor, cacheavel, provisorio)
+        return valor
+
+    def _guardar(self, chave: str, valor, cacheavel, provisorio) -> None:
+        if cacheavel is not None and not cacheavel(valor):
+            return
+        if provisorio is not None and provisorio(valor):
+            if TTL_PROVISORIO_S > 0:
+                self.gravar(chave, valor, min(TTL_PROVISORIO_S, self.ttl))
+        else:
+            self.gravar(chave, valor)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "tamanho_max": self.tamanho_max,
+                "ttl_s": self.ttl,
+                "acertos": self.acertos,
+                "acertos_compartilhados": self.acertos_compartilhados,
+                "falhas": self.falhas,
+                "compartilhado": self._compartilhado is not None,
+                "coalescencia": self.coalescedor.estatisticas(),
+            }
+
+
+CACHE = CachePlanos()
+
+# Estado dos planos entregues (plano_id -> dados + núcleo) para o PATCH
+# /planos/<id>. Com mais de um worker, NUTRI_PLANOS_SQLITE deve apontar para
+# um arquivo comum, senão o PATCH pode cair em um worker que não viu o plano.
+PLANOS = CachePlanos(
+    tamanho_max=int(os.environ.get("NUTRI_PLANOS_TAMANHO", "1024")),
+    ttl=float(os.environ.get("NUTRI_PLANOS_TTL_S", "3600")),
+    caminho_sqlite=os.environ.get("NUTRI_PLANOS_SQLITE"),
+)
@@ -0,0 +1,153 @@
+# catalogo_externo.py
+# Importa tabelas nutricionais externas (CSV/JSON, ex.: exportações TACO ou
+# USDA) para o esquema de get_food_data() e compila um snapshot binário
+# versionado que os workers abrem com mmap (NUTRI_CATALOGO_SNAPSHOT).
+#
+# Uso: python catalogo_externo.py entrada.csv|entrada.json|padrao saida.bin [--por-100g] [--permitir-erros]
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+from typing import Dict, Any
+
+from database import (
+    COLUNAS_NUTRIENTES, COLUNAS_TEXTO, SNAPSHOT_CABECALHO, SNAPSHOT_MAGIC,
+    SNAPSHOT_OFFSET_COLUNAS, SNAPSHOT_VERSAO_FORMATO, _tabela_padrao, abrir_snapshot,
+    validate_food_data,
+)
+from resolvedor import normalizar_nome
+from templates_refeicoes import validar_templates
+
+# Nomes de coluna aceitos em tabelas externas -> campo do catálogo
+COLUNAS_ALTERNATIVAS = {
+    "kcal": ("kcal", "energia_kcal", "energia"),
+    "p": ("p", "proteina", "proteina_g"),
+    "c": ("c", "carboidrato", "carboidrato_g"),
+    "g": ("g", "lipidios", "gordura", "gordura_g"),
+    "f": ("f", "fibra", "fibra_alimentar", "fibra_g"),
+    "categoria": ("categoria", "grupo"),
+    "unidade_comum": ("unidade_comum", "unidade"),
+    "obs": ("obs", "observacao"),
+}
+
+
+def _numero(valor) -> float:
+    """Converte células numéricas, aceitando vírgula decimal e traços ("Tr", "NA")."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor or "").strip().replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return 0.0
+
+
+def _normalizar_linha(linha: Dict[str, Any], por_100g: bool) -> Dict[str, Any]:
+    colunas = {normalizar_nome(nome): valor for nome, valor in linha.items() if nome}
+    alimento = {}
+    for campo, alternativas in COLUNAS_ALTERNATIVAS.items():
+        for nome in alternativas:
+            if nome in colunas:
+                alimento[campo] = colunas[nome]
+                break
+    for campo in COLUNAS_NUTRIENTES:
+        if campo in alimento:
+            alimento[campo] = _numero(alimento[campo]) / (100 if por_100g else 1)
+    return alimento
+
+
+def carregar_tabela(caminho: str, por_100g: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Lê um CSV ou JSON e devolve um dict no mesmo esquema de ``get_food_data()``.
+
+    A chave vem da coluna ``chave`` ou, na falta dela, de ``nome``/``alimento``
+    em snake_case. JSON pode ser um dict chave -> alimento ou uma lista de
+    registros. Com ``por_100g`` os nutrientes são divididos por 100.
+    """
+    if caminho.endswith(".json"):
+        with open(caminho, encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        registros = [dict(valor, chave=chave) for chave, valor in dados.items()] if isinstance(dados, dict) else dados
+    else:
+        with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+            registros = list(csv.DictReader(arquivo, dialect=dialeto))
+
+    tabela = {}
+    for registro in registros:
+        chave = registro.get("chave") or normalizar_nome(str(registro.get("nome") or registro.get("alimento") or ""))
+        if chave:
+            tabela[chave] = _normalizar_linha(registro, por_100g)
+    return tabela
+
+
+def compilar_snapshot(tabela: Dict[str, Dict[str, Any]], destino: str, permitir_erros: bool = False) -> str:
+    """Compila ``tabela`` em um snapshot binário e retorna a versão gerada.
+
+    O snapshot é escrito em um arquivo temporário, aberto e validado com
+    ``validate_food_data()``; só então substitui ``destino`` de forma
+    atômica (workers com o arquivo antigo mapeado continuam funcionando).
+    Os templates de refeição também precisam compilar contra o snapshot.
+    """
+    chaves = list(tabela)
+    colunas = b"".join(
+        array("d", (float(tabela[chave].get(nome, 0)) for chave in chaves)).tobytes()
+        for nome in COLUNAS_NUTRIENTES
+    )
+    meta = {"chaves": chaves}
+    for nome in COLUNAS_TEXTO:
+        meta[nome] = [str(tabela[chave].get(nome, "")) for chave in chaves]
+    conteudo = json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    meta["versao"] = hashlib.sha256(colunas + conteudo).hexdigest()[:16]
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    offset_meta = SNAPSHOT_OFFSET_COLUNAS + len(colunas)
+    cabecalho = SNAPSHOT_CABECALHO.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSAO_FORMATO, 0, len(chaves), offset_meta, len(meta_bytes)
+    )
+
+    pasta = os.path.dirname(os.path.abspath(destino))
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            arquivo.write(cabecalho.ljust(SNAPSHOT_OFFSET_COLUNAS, b"\0"))
+            arquivo.write(colunas)
+            arquivo.write(meta_bytes)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+        catalogo = abrir_snapshot(temporario)
+        erros = validate_food_data(catalogo) + validar_templates(catalogo)
+        if erros and not permitir_erros:
+            raise ValueError(f"{len(erros)} erro(s) de validação:\n" + "\n".join(f"  - {erro}" for erro in erros))
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return meta["versao"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila uma tabela nutricional em snapshot binário.")
+    parser.add_argument("entrada", help="CSV/JSON da tabela, ou 'padrao' para a tabela embutida")
+    parser.add_argument("saida", help="arquivo do snapshot (.bin)")
+    parser.add_argument("--por-100g", action="store_true", help="valores da tabela são por 100 g")
+    parser.add_argument("--permitir-erros", action="store_true", help="compila mesmo com erros de validação")
+    args = parser.parse_args()
+
+    tabela = _tabela_padrao() if args.entrada == "padrao" else carregar_tabela(args.entrada, args.por_100g)
+    try:
+        versao = compilar_snapshot(tabela, args.saida, args.permitir_erros)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"Snapshot {args.saida}: {len(tabela)} alimentos, versão {versao}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# coalescencia.py
+# Single-flight: requisições concorrentes com a mesma chave canônica esperam
+# um único cálculo e recebem o mesmo resultado (ou o mesmo erro). Dentro do
+# processo a espera é um threading.Event; com NUTRI_COALESCER_DIR o líder de
+# cada chave também pega uma trava de arquivo (flock) própria da chave, e
+# quem esperou a trava relê o resultado no cache compartilhado
+# (NUTRI_CACHE_SQLITE) antes de calcular de novo.
+
+import copy
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+TIMEOUT_S = float(os.environ.get("NUTRI_COALESCER_TIMEOUT_S", "30"))
+DIRETORIO = os.environ.get("NUTRI_COALESCER_DIR")
+
+
+class TempoEsgotado(TimeoutError):
+    """O cálculo em andamento para a mesma chave não terminou a tempo."""
+
+
+class _Voo:
+    __slots__ = ("pronto", "valor", "erro", "esperando", "prazo")
+
+    def __init__(self, prazo: float):
+        self.pronto = threading.Event()
+        self.prazo = prazo
+        self.valor = None
+        self.erro: Optional[BaseException] = None
+        self.esperando = 0
+
+
+class Coalescedor:
+    """Agrupa cálculos concorrentes da mesma chave em um só."""
+
+    def __init__(self, timeout: float = TIMEOUT_S, diretorio: Optional[str] = DIRETORIO):
+        self.timeout = timeout
+        self.diretorio = diretorio
+        self._voos: Dict[str, _Voo] = {}
+        self._lock = threading.Lock()
+        self.calculos = 0
+        self.coalescidas = 0
+        self.coalescidas_entre_processos = 0
+        self.espera_trava_s = 0.0
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def executar(self, chave: str, calcular: Callable[[], Any],
+                 obter_pronto: Optional[Callable[[], Any]] = None) -> Any:
+        """Resultado de ``calcular()`` para ``chave``, calculado uma vez só.
+
+        Cada voo tem um prazo de ``timeout`` segundos a partir da chegada do
+        líder, e tudo sai dele: a espera do líder pela trava de outro
+        processo e a de quem chega com o cálculo da mesma chave em andamento
+        (``TempoEsgotado`` no prazo). Quem espera recebe uma cópia do
+        resultado, ou a mesma exceção do cálculo. ``obter_pronto`` é
+        consultado depois de esperar a trava de outro processo; um valor
+        diferente de None dispensa o cálculo.
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            if voo is None:
+                voo = self._voos[chave] = _Voo(time.monotonic() + self.timeout)
+                lider = True
+            else:
+                voo.esperando += 1
+                self.coalescidas += 1
+                lider = False
+
+        if not lider:
+            if not voo.pronto.wait(max(voo.prazo - time.monotonic(), 0)):
+                raise TempoEsgotado(f"plano idêntico em andamento não terminou em {self.timeout:g}s")
+            if voo.erro is not None:
+                raise voo.erro
+            return copy.deepcopy(voo.valor)
+
+        try:
+            with self._trava_arquivo(chave, voo.prazo) as esperou:
+                valor = obter_pronto() if esperou and obter_pronto is not None else None
+                if valor is None:
+                    with self._lock:
+                        self.calculos += 1
+                    valor = calcular()
+                else:
+                    with self._lock:
+                        self.coalescidas_entre_processos += 1
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            # Fora do dicionário ninguém mais entra no voo: ``esperando`` é final
+            with self._lock:
+                del self._voos[chave]
+            if voo.erro is None and voo.esperando:
+                # Os que esperam copiam do seu lado; esta cópia protege o
+                # resultado de alterações feitas pelo líder depois do retorno
+                voo.valor = copy.deepcopy(valor)
+            voo.pronto.set()
+        return valor
+
+    @contextmanager
+    def _trava_arquivo(self, chave: str, prazo: float) -> Iterator[bool]:
+        """flock exclusivo do arquivo de ``chave``; produz True se outro processo o segurava.
+
+        Só o líder do voo chega aqui, então threads do mesmo processo não
+        disputam a trava. O arquivo é apagado ao soltar a trava; quem a
+        obtém em um arquivo já apagado tenta de novo no caminho atual.
+        """
+        if not self.diretorio:
+            yield False
+            return
+        caminho = os.path.join(self.diretorio, f"coalescer_{chave}.lock")
+        inicio = time.monotonic()
+        esperou = False
+        while True:
+            fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+            resultado = _travar(fd, prazo)
+            if resultado is None:
+                self._contar_espera(inicio)
+                raise TempoEsgotado(f"plano idêntico em outro worker não terminou em {self.timeout:g}s")
+            esperou = esperou or resultado
+            try:
+                atual = os.stat(caminho).st_ino
+            except FileNotFoundError:
+                atual = None
+            if atual == os.fstat(fd).st_ino:
+                break
+            os.close(fd)
+        self._contar_espera(inicio)
+        try:
+            yield esperou
+        finally:
+            try:
+                os.unlink(caminho)
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _contar_espera(self, inicio: float) -> None:
+        with self._lock:
+            self.espera_trava_s += time.monotonic() - inicio
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "em_andamento": len(self._voos),
+                "calculos": self.calculos,
+                "coalescidas": self.coalescidas,
+                "coalescidas_entre_processos": self.coalescidas_entre_processos,
+                "espera_trava_s": round(self.espera_trava_s, 3),
+                "entre_processos": bool(self.diretorio),
+            }
+
+
+def _travar(fd: int, prazo: float) -> Optional[bool]:
+    """flock exclusivo em ``fd`` esperando até ``prazo`` (relógio monotônico).
+
+    False se a trava estava livre, True se foi preciso esperar e None se o
+    prazo venceu. flock não tem timeout, então a espera bloqueia em uma
+    thread auxiliar; se o prazo vence antes, ela fecha ``fd`` (soltando a
+    trava) assim que a obtiver, e quem chamou não deve mais usá-lo.
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        pass
+    obtida = threading.Event()
+    estado = threading.Lock()
+    abandonada = []
+
+    def esperar():
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with estado:
+            if abandonada:
+                os.close(fd)
+                return
+            obtida.set()
+
+    threading.Thread(target=esperar, name="coalescer-flock", daemon=True).start()
+    if obtida.wait(max(prazo - time.monotonic(), 0)):
+        return True
+    with estado:
+        if obtida.is_set():
+            return True
+        abandonada.append(True)
+    return None
@@ -0,0 +1,195 @@
+# consistencia.py
+# Verificador de consistência do catálogo nutricional, coluna a coluna sobre
+# as memoryview do CatalogoAlimentos: cada regra é um map/compress sobre as
+# colunas inteiras, e só as linhas reprovadas viram objetos Python.
+#
+#   kcal_atwater              kcal declarada longe de 4p + 4c + 9g (e da
+#                             variante com fibra a 2 kcal/g)
+#   soma_macros               p + c + g acima de 1 g por grama
+#   fibra_maior_que_carboidrato
+#   negativo                  algum nutriente < 0
+#   duplicatas                linhas com vetor de macros quase igual
+#
+# O relatório é um dict serializável, com a kcal sugerida para cada linha
+# reprovada no Atwater. Roda em todo carregamento do catálogo (database.py).
+#
+# Uso: python consistencia.py [snapshot.bin] [--distancia G] [--tolerancia-abs KCAL] [--tolerancia-rel FRACAO]
+
+import itertools
+import math
+import operator
+import time
+from typing import Any, Dict, List, Tuple
+
+NUTRIENTES = ("kcal", "p", "c", "g", "f")
+# Macros usados na distância entre linhas (g por 100 g)
+MACROS_DISTANCIA = ("p", "c", "g", "f")
+
+# Tolerância do resíduo de Atwater, em kcal por 100 g: o maior entre o
+# absoluto e a fração da kcal calculada
+TOLERANCIA_ABS_100G = 20.0
+TOLERANCIA_REL = 0.10
+# Distância euclidiana máxima (g por 100 g) para duas linhas serem duplicatas
+DISTANCIA_DUPLICATA = 0.1
+# Folga para arredondamentos nas regras de soma e fibra (g por grama)
+FOLGA_G = 0.005
+
+
+def _escalar(fator: float, coluna):
+    return map(operator.mul, itertools.repeat(fator), coluna)
+
+
+def _somar(*colunas):
+    return map(sum, zip(*colunas))
+
+
+def _atwater(colunas) -> Tuple[List[float], List[float]]:
+    """kcal por grama pelos fatores gerais (4/4/9) e com a fibra a 2 kcal/g."""
+    p, c, g, f = (colunas[nome] for nome in ("p", "c", "g", "f"))
+    geral = list(_somar(_escalar(4.0, p), _escalar(4.0, c), _escalar(9.0, g)))
+    # A fibra está contida no carboidrato: troca 4 por 2 kcal/g nessa parte
+    com_fibra = list(map(operator.sub, geral, _escalar(2.0, f)))
+    return geral, com_fibra
+
+
+def _duplicatas(chaves, colunas, distancia: float) -> List[Dict[str, Any]]:
+    """Pares de linhas a no máximo ``distancia`` (g/100 g) uma da outra.
+
+    As linhas são distribuídas em uma grade de lado ``distancia`` no plano
+    (carboidrato, gordura), os dois macros que mais separam os alimentos;
+    só pares da mesma célula ou de células vizinhas têm a distância completa
+    calculada, então o custo cresce com o número de linhas e não de pares.
+    """
+    vetores = list(zip(*(_escalar(100.0, colunas[nome]) for nome in MACROS_DISTANCIA)))
+    ic, ig = MACROS_DISTANCIA.index("c"), MACROS_DISTANCIA.index("g")
+    lado = distancia if distancia > 0 else 1e-9
+    grade: Dict[Tuple[int, int], List[int]] = {}
+    # Sem macros (sal, adoçante) não há composição a comparar
+    for i in itertools.compress(range(len(vetores)), map(any, vetores)):
+        vetor = vetores[i]
+        grade.setdefault((math.floor(vetor[ic] / lado), math.floor(vetor[ig] / lado)), []).append(i)
+
+    # Metade da vizinhança: cada par de células é visitado uma única vez
+    vizinhas = ((0, 1), (1, -1), (1, 0), (1, 1))
+    pares = []
+    for (x, y), linhas in grade.items():
+        candidatos = [(i, j) for a, i in enumerate(linhas) for j in linhas[a + 1:]]
+        for dx, dy in vizinhas:
+            outras = grade.get((x + dx, y + dy))
+            if outras:
+                candidatos.extend((i, j) for i in linhas for j in outras)
+        for i, j in candidatos:
+            d = math.dist(vetores[i], vetores[j])
+            if d <= distancia:
+                pares.append({"chaves": sorted((chaves[i], chaves[j])), "distancia_g_100g": round(d, 3)})
+    pares.sort(key=lambda par: (par["distancia_g_100g"], par["chaves"]))
+    return pares
+
+
+def verificar_catalogo(catalogo, tolerancia_abs_100g: float = TOLERANCIA_ABS_100G,
+                       tolerancia_rel: float = TOLERANCIA_REL,
+                       distancia_duplicata: float = DISTANCIA_DUPLICATA) -> Dict[str, Any]:
+    """Relatório de consistência de um ``CatalogoAlimentos``.
+
+    ``problemas`` traz uma entrada por (alimento, regra); valores em kcal ou
+    g por 100 g. ``resumo`` conta as entradas por regra e ``kcal_sugerida``
+    mapeia cada alimento reprovado no Atwater para a kcal/g corrigida.
+    """
+    inicio = time.perf_counter()
+    chaves = catalogo.chaves
+    colunas = {nome: catalogo.coluna(nome) for nome in NUTRIENTES}
+    kcal, p, c, g, f = (colunas[nome] for nome in NUTRIENTES)
+
+    n = len(chaves)
+    linhas = range(n)
+
+    geral, com_fibra = _atwater(colunas)
+    # Fibra dentro do carboidrato: aí valem as duas convenções de Atwater.
+    # Fibra maior que o carboidrato indica carboidrato disponível (sem a
+    # fibra), e a variante passa a somar a fibra a 2 kcal/g.
+    fibra_valida = list(map(operator.le, f, map(operator.add, c, itertools.repeat(FOLGA_G))))
+    for i in itertools.compress(linhas, map(operator.not_, fibra_valida)):
+        com_fibra[i] = geral[i] + 2.0 * f[i]
+    residuo = list(map(min, map(abs, map(operator.sub, kcal, geral)), map(abs, map(operator.sub, kcal, com_fibra))))
+    limite = map(max, itertools.repeat(tolerancia_abs_100g / 100), _escalar(tolerancia_rel, geral))
+    soma = list(_somar(p, c, g))
+
+    problemas = []
+    kcal_sugerida = {}
+    for i in itertools.compress(linhas, map(operator.gt, residuo, limite)):
+        sugerida = com_fibra[i]
+        kcal_sugerida[chaves[i]] = round(sugerida, 4)
+        problemas.append({
+            "chave": chaves[i], "regra": "kcal_atwater", "severidade": "erro",
+            "kcal_declarada_100g": round(kcal[i] * 100, 1),
+            "kcal_atwater_100g": round(geral[i] * 100, 1),
+            "kcal_atwater_fibra_100g": round(com_fibra[i] * 100, 1),
+            "kcal_sugerida_100g": round(sugerida * 100, 1),
+        })
+    for i in itertools.compress(linhas, map(operator.gt, soma, itertools.repeat(1 + FOLGA_G))):
+        problemas.append({
+            "chave": chaves[i], "regra": "soma_macros", "severidade": "erro",
+            "soma_g_100g": round(soma[i] * 100, 1),
+        })
+    for i in itertools.compress(linhas, map(operator.not_, fibra_valida)):
+        problemas.append({
+            "chave": chaves[i], "regra": "fibra_maior_que_carboidrato", "severidade": "aviso",
+            "fibra_g_100g": round(f[i] * 100, 1), "carboidrato_g_100g": round(c[i] * 100, 1),
+        })
+    for i in itertools.compress(linhas, map(operator.lt, map(min, kcal, p, c, g, f), itertools.repeat(0.0))):
+        problemas.append({"chave": chaves[i], "regra": "negativo", "severidade": "erro"})
+
+    duplicatas = _duplicatas(chaves, colunas, distancia_duplicata)
+    resumo = {}
+    for problema in problemas:
+        resumo[problema["regra"]] = resumo.get(problema["regra"], 0) + 1
+    resumo["duplicatas"] = len(duplicatas)
+    return {
+        "versao": catalogo.versao,
+        "linhas": n,
+        "parametros": {
+            "tolerancia_abs_kcal_100g": tolerancia_abs_100g,
+            "tolerancia_rel": tolerancia_rel,
+            "distancia_duplicata_g_100g": distancia_duplicata,
+        },
+        "resumo": resumo,
+        "problemas": problemas,
+        "duplicatas": duplicatas,
+        "kcal_sugerida": kcal_sugerida,
+        "tempo_s": round(time.perf_counter() - inicio, 4),
+    }
+
+
+def erros(relatorio: Dict[str, Any]) -> List[str]:
+    """Problemas de severidade "erro" como mensagens de texto."""
+    mensagens = []
+    for problema in relatorio["problemas"]:
+        if problema["severidade"] != "erro":
+            continue
+        chave, regra = problema["chave"], problema["regra"]
+        if regra == "kcal_atwater":
+            mensagens.append(
+                f"{chave}: calorias não batem. Declarado: {problema['kcal_declarada_100g']}/100g, "
+                f"Atwater: {problema['kcal_atwater_100g']}/100g, sugerido: {problema['kcal_sugerida_100g']}/100g"
+            )
+        elif regra == "soma_macros":
+            mensagens.append(f"{chave}: proteína + carboidrato + gordura somam {problema['soma_g_100g']} g por 100 g")
+        else:
+            mensagens.append(f"{chave}: nutriente negativo")
+    return mensagens
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import abrir_snapshot, get_food_data
+    from serializacao import codificar
+
+    parser = argparse.ArgumentParser(description="Verifica a consistência do catálogo nutricional")
+    parser.add_argument("snapshot", nargs="?", help="snapshot compilado (padrão: catálogo carregado)")
+    parser.add_argument("--distancia", type=float, default=DISTANCIA_DUPLICATA)
+    parser.add_argument("--tolerancia-abs", type=float, default=TOLERANCIA_ABS_100G)
+    parser.add_argument("--tolerancia-rel", type=float, default=TOLERANCIA_REL)
+    args = parser.parse_args()
+    catalogo = abrir_snapshot(args.snapshot) if args.snapshot else get_food_data()
+    print(codificar(verificar_catalogo(catalogo, args.tolerancia_abs, args.tolerancia_rel, args.distancia)).decode("utf-8"))
@@ -0,0 +1,106 @@
+# consultas_planos.py
+# Agregados sobre o arquivo colunar de arquivo_planos.py. Cada consulta roda
+# por segmento direto nas colunas mapeadas (sum/map/Counter sobre
+# memoryview, sem montar linhas em Python) e os parciais são somados no fim.
+#
+# Uso: python consultas_planos.py [DIRETORIO] [--top N]
+
+import argparse
+import math
+import operator
+import os
+from collections import Counter
+from typing import Any, Dict, List
+
+from arquivo_planos import ADERENCIA_OK, DIRETORIO, Segmento, abrir_segmentos
+
+
+def total_planos(segmentos: List[Segmento]) -> int:
+    return sum(segmento.linhas["planos"] for segmento in segmentos)
+
+
+def proteina_por_kg(segmentos: List[Segmento]) -> Dict[str, Any]:
+    """Média e extremos da proteína diária por kg de peso."""
+    soma, n, minimo, maximo = 0.0, 0, math.inf, -math.inf
+    for segmento in segmentos:
+        planos = segmento.tabelas["planos"]
+        pesos = planos["peso_kg"]
+        if 0.0 in pesos:
+            # Pesos zerados (paciente sem peso) ficam fora da razão
+            razoes = [p / peso for p, peso in zip(planos["p"], pesos) if peso > 0]
+        else:
+            razoes = list(map(operator.truediv, planos["p"], pesos))
+        if razoes:
+            soma += math.fsum(razoes)
+            n += len(razoes)
+            minimo = min(minimo, min(razoes))
+            maximo = max(maximo, max(razoes))
+    if not n:
+        return {"planos": 0, "media": None, "minimo": None, "maximo": None}
+    return {"planos": n, "media": round(soma / n, 3), "minimo": round(minimo, 3), "maximo": round(maximo, 3)}
+
+
+def alimentos_mais_usados(segmentos: List[Segmento], top: int = 10) -> List[Dict[str, Any]]:
+    """Alimentos por número de prescrições, com o total e a média de gramas."""
+    usos, gramas = Counter(), Counter()
+    for segmento in segmentos:
+        itens = segmento.tabelas["itens"]
+        nomes = segmento.dicionarios["alimento"]
+        contagem = Counter(itens["alimento"])
+        soma = [0.0] * len(nomes)
+        for codigo, quantidade in zip(itens["alimento"], itens["quantidade_g"]):
+            soma[codigo] += quantidade
+        for codigo, vezes in contagem.items():
+            usos[nomes[codigo]] += vezes
+            gramas[nomes[codigo]] += soma[codigo]
+    return [
+        {"alimento": nome, "usos": vezes, "gramas_total": round(gramas[nome], 1),
+         "gramas_media": round(gramas[nome] / vezes, 1)}
+        for nome, vezes in usos.most_common(top)
+    ]
+
+
+def metas_nao_atingidas(segmentos: List[Segmento], tolerancia_kcal_percent: float = 5.0) -> Dict[str, Any]:
+    """Frequência de cada meta perdida (e de planos com alguma meta perdida)."""
+    n = total_planos(segmentos)
+    falhas = Counter()
+    for segmento in segmentos:
+        planos = segmento.tabelas["planos"]
+        for nome in ADERENCIA_OK:
+            falhas[nome] += segmento.linhas["planos"] - sum(planos[nome])
+        # Calorias fora de 100% ± tolerância (NaN = paciente sem meta de kcal)
+        falhas["calorias_ok"] += sum(
+            1 for percentual in planos["calorias_percent_meta"]
+            if percentual == percentual and abs(percentual - 100) > tolerancia_kcal_percent
+        )
+        todas_ok = map(min, *(planos[nome] for nome in ADERENCIA_OK))
+        falhas["alguma"] += segmento.linhas["planos"] - sum(todas_ok)
+    return {
+        "planos": n,
+        "taxas": {nome: round(vezes / n, 4) if n else None for nome, vezes in falhas.items()},
+        "contagens": dict(falhas),
+    }
+
+
+def resumo(diretorio: str = DIRETORIO, top: int = 10) -> Dict[str, Any]:
+    segmentos = abrir_segmentos(diretorio)
+    return {
+        "segmentos": len(segmentos),
+        "planos": total_planos(segmentos),
+        "itens": sum(segmento.linhas["itens"] for segmento in segmentos),
+        "proteina_por_kg": proteina_por_kg(segmentos),
+        "alimentos_mais_usados": alimentos_mais_usados(segmentos, top),
+        "metas_nao_atingidas": metas_nao_atingidas(segmentos),
+    }
+
+
+if __name__ == "__main__":
+    from serializacao import codificar
+
+    parser = argparse.ArgumentParser(description="Agregados do arquivo de planos")
+    parser.add_argument("diretorio", nargs="?", default=DIRETORIO)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    if not args.diretorio or not os.path.isdir(args.diretorio):
+        parser.error("informe o diretório do arquivo (ou defina NUTRI_ARQUIVO_DIR)")
+    print(codificar(resumo(args.diretorio, args.top)).decode("utf-8"))
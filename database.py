@@ -1,5 +1,27 @@
 # database.py - VERSÃO COMPLETA E DEFINITIVA
-def get_food_data():
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+
+import consistencia
+
+# Colunas numéricas do catálogo (valores por grama)
+COLUNAS_NUTRIENTES = ('kcal', 'p', 'c', 'g', 'f')
+COLUNAS_TEXTO = ('categoria', 'unidade_comum', 'obs')
+
+# Snapshot binário do catálogo (ver catalogo_externo.py):
+# cabeçalho | colunas float64 (kcal, p, c, g, f; n linhas cada) | metadados JSON
+SNAPSHOT_MAGIC = b'NUTRICAT'
+SNAPSHOT_VERSAO_FORMATO = 1
+# magic, versão do formato, reservado, n linhas, offset e tamanho dos metadados
+SNAPSHOT_CABECALHO = struct.Struct('<8sHHIQQ')
+SNAPSHOT_OFFSET_COLUNAS = 32
+
+
+def _tabela_padrao():
    """Base de dados nutricional completa com valores por grama."""
    return {
        # PROTEÍNAS PRINCIPAIS - VALORES CORRIGIDOS
@@ -159,6 +181,151 @@ def get_food_data():
        "pimenta_reino": {"kcal": 2.55, "p": 0.11, "c": 0.64, "g": 0.03, "f": 0.25, "categoria": "tempero", "unidade_comum": "g", "obs": "Moída"}
    }
 
+class AlimentoView(Mapping):
+   """Visão leve (somente leitura) de uma linha do catálogo.
+
+   Expõe a mesma interface de dicionário que os alimentos tinham antes
+   (``alimento['kcal']``, ``'p' in alimento``, ``alimento.items()``), mas lê
+   direto das colunas do catálogo em vez de manter um dict por alimento.
+   """
+
+   __slots__ = ('_catalogo', 'indice')
+
+   def __init__(self, catalogo, indice):
+      self._catalogo = catalogo
+      self.indice = indice
+
+   @property
+   def chave(self):
+      return self._catalogo.chaves[self.indice]
+
+   def __getitem__(self, campo):
+      if campo in COLUNAS_NUTRIENTES:
+         return self._catalogo.coluna(campo)[self.indice]
+      if campo in COLUNAS_TEXTO:
+         return self._catalogo._texto[campo][self.indice]
+      raise KeyError(campo)
+
+   def __iter__(self):
+      return iter(COLUNAS_NUTRIENTES + COLUNAS_TEXTO)
+
+   def __len__(self):
+      return len(COLUNAS_NUTRIENTES) + len(COLUNAS_TEXTO)
+
+   def __repr__(self):
+      return f"AlimentoView({self.chave!r})"
+
+   def to_dict(self):
+      return dict(self.items())
+
+
+class CatalogoAlimentos(Mapping):
+   """Catálogo imutável de alimentos em colunas contíguas de floats.
+
+   Cada nutriente (kcal, p, c, g, f) fica em um ``array('d')`` contíguo e
+   cada chave de alimento aponta para um índice de linha. As colunas só são
+   expostas como ``memoryview`` somente leitura, então o catálogo pode ser
+   compartilhado entre threads e, com ``--preload``, entre os workers do
+   gunicorn via copy-on-write sem que nenhuma página seja copiada.
+   """
+
+   __slots__ = ('chaves', 'indice', 'versao', '_colunas', '_texto', '_linhas')
+
+   def __init__(self, chaves, colunas, texto, versao='padrao'):
+      self.chaves = tuple(chaves)
+      self.indice = {chave: i for i, chave in enumerate(self.chaves)}
+      self.versao = versao
+      self._colunas = {nome: memoryview(colunas[nome]).toreadonly() for nome in COLUNAS_NUTRIENTES}
+      self._texto = {nome: tuple(texto[nome]) for nome in COLUNAS_TEXTO}
+      self._linhas = tuple(AlimentoView(self, i) for i in range(len(self.chaves)))
+
+   @classmethod
+   def de_tabela(cls, tabela, versao='padrao'):
+      """Monta o catálogo a partir de um dict chave -> {kcal, p, c, g, f, ...}."""
+      colunas = {nome: array('d') for nome in COLUNAS_NUTRIENTES}
+      texto = {nome: [] for nome in COLUNAS_TEXTO}
+      for chave in tabela:
+         dados = tabela[chave]
+         for nome in COLUNAS_NUTRIENTES:
+            colunas[nome].append(float(dados.get(nome, 0)))
+         for nome in COLUNAS_TEXTO:
+            texto[nome].append(dados.get(nome, ''))
+      return cls(tabela, colunas, texto, versao)
+
+   def coluna(self, nome):
+      """Coluna de um nutriente (por grama), indexada pelo índice da linha."""
+      return self._colunas[nome]
+
+   def linha(self, indice):
+      return self._linhas[indice]
+
+   def __getitem__(self, chave):
+      return self._linhas[self.indice[chave]]
+
+   def __contains__(self, chave):
+      return chave in self.indice
+
+   def __iter__(self):
+      return iter(self.chaves)
+
+   def __len__(self):
+      return len(self.chaves)
+
+
+def abrir_snapshot(caminho):
+   """Abre um snapshot compilado por ``catalogo_externo.py`` via ``mmap``.
+
+   As colunas numéricas não são copiadas: viram ``memoryview`` sobre as
+   páginas do arquivo, compartilhadas pelo page cache entre todos os
+   workers, então a memória fica estável mesmo com milhares de alimentos.
+   """
+   with open(caminho, 'rb') as arquivo:
+      mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+   magic, versao_formato, _, n, offset_meta, tamanho_meta = SNAPSHOT_CABECALHO.unpack_from(mapa, 0)
+   if magic != SNAPSHOT_MAGIC:
+      raise ValueError(f"{caminho}: não é um snapshot de catálogo")
+   if versao_formato != SNAPSHOT_VERSAO_FORMATO:
+      raise ValueError(f"{caminho}: formato {versao_formato} não suportado (esperado {SNAPSHOT_VERSAO_FORMATO})")
+   meta = json.loads(mapa[offset_meta:offset_meta + tamanho_meta])
+   bruto = memoryview(mapa)
+   colunas = {}
+   for i, nome in enumerate(COLUNAS_NUTRIENTES):
+      inicio = SNAPSHOT_OFFSET_COLUNAS + i * n * 8
+      colunas[nome] = bruto[inicio:inicio + n * 8].cast('d')
+   return CatalogoAlimentos(meta['chaves'], colunas, meta, meta['versao'])
+
+
+def _carregar_catalogo():
+   # NUTRI_CATALOGO_SNAPSHOT aponta para um catálogo externo compilado;
+   # sem ele vale a tabela embutida acima.
+   caminho = os.environ.get('NUTRI_CATALOGO_SNAPSHOT')
+   if caminho:
+      return abrir_snapshot(caminho)
+   return CatalogoAlimentos.de_tabela(_tabela_padrao())
+
+
+# Construído uma única vez por processo, no import do módulo
+CATALOGO = _carregar_catalogo()
+
+# Verificação de consistência a cada carregamento (NUTRI_CATALOGO_VERIFICAR=0
+# desliga); o relatório fica disponível em get_consistency_report()
+RELATORIO_CONSISTENCIA = (
+   consistencia.verificar_catalogo(CATALOGO)
+   if os.environ.get('NUTRI_CATALOGO_VERIFICAR', '1') != '0' else None
+)
+
+
+def get_food_data():
+   """Catálogo nutricional (valores por grama), compartilhado e somente leitura."""
+   return CATALOGO
+
+
+def get_consistency_report():
+   """Relatório de consistência do catálogo carregado (ver consistencia.py)."""
+   if RELATORIO_CONSISTENCIA is None:
+      return consistencia.verificar_catalogo(CATALOGO)
+   return RELATORIO_CONSISTENCIA
+
 def get_meal_templates():
    """Retorna templates de refeições modulares."""
    return {
@@ -229,7 +396,8 @@ def get_substitution_rules():
                'atum_enlatado_agua',
                'ovo_inteiro'
            ],
-           'fator_conversao': 1.0
+           'fator_conversao': 1.0,
+           'macro_base': 'p'
        },
        'carboidrato_complexo': {
            'alimentos': [
@@ -241,7 +409,8 @@ def get_substitution_rules():
                'aipim_macaxeira_cozido',
                'inhame_cozido'
            ],
-           'fator_conversao': 1.0
+           'fator_conversao': 1.0,
+           'macro_base': 'c'
        },
        'leguminosas': {
            'alimentos': [
@@ -251,7 +420,8 @@ def get_substitution_rules():
                'grao_de_bico_cozido',
                'ervilha_cozida'
            ],
-           'fator_conversao': 1.0
+           'fator_conversao': 1.0,
+           'macro_base': 'c'
        },
        'frutas': {
            'alimentos': [
@@ -265,7 +435,8 @@ def get_substitution_rules():
                'manga',
                'uva'
            ],
-           'fator_conversao': 1.0
+           'fator_conversao': 1.0,
+           'macro_base': 'c'
        },
        'laticinios': {
            'alimentos': [
@@ -274,7 +445,8 @@ def get_substitution_rules():
                'queijo_minas_light',
                'requeijao_light'
            ],
-           'fator_conversao': 1.0
+           'fator_conversao': 1.0,
+           'macro_base': 'p'
        }
    }
 
@@ -306,32 +478,42 @@ def get_static_info():
        }
    }
 
-def validate_food_data():
-   """Valida integridade da base de dados."""
-   foods = get_food_data()
+def validate_food_data(foods=None):
+   """Valida integridade da base de dados (por padrão, o catálogo carregado).
+
+   Aceita um ``CatalogoAlimentos`` ou um dict chave -> dados; as regras
+   numéricas são as de ``consistencia.verificar_catalogo`` e só os
+   problemas de severidade "erro" entram na lista.
+   """
+   if foods is None:
+       return consistencia.erros(get_consistency_report())
+   if isinstance(foods, CatalogoAlimentos):
+       return consistencia.erros(consistencia.verificar_catalogo(foods))
+
    errors = []
-   
+   required_fields = ['kcal', 'p', 'c', 'g', 'categoria']
+   completos = {}
    for name, data in foods.items():
        # Verifica campos obrigatórios
-       required_fields = ['kcal', 'p', 'c', 'g', 'categoria']
-       for field in required_fields:
-           if field not in data:
-               errors.append(f"{name}: faltando campo {field}")
-       
-       # Valida cálculo calórico
-       calc_kcal = (data['p'] * 4) + (data['c'] * 4) + (data['g'] * 9)
-       diff = abs(calc_kcal - data['kcal'])
-       if diff > 0.5:  # Tolerância de 0.5 kcal
-           errors.append(f"{name}: calorias não batem. Declarado: {data['kcal']}, Calculado: {calc_kcal:.2f}")
-   
+       missing = [field for field in required_fields if field not in data]
+       for field in missing:
+           errors.append(f"{name}: faltando campo {field}")
+       if not missing:
+           completos[name] = data
+
+   errors.extend(consistencia.erros(consistencia.verificar_catalogo(CatalogoAlimentos.de_tabela(completos))))
    return errors
 
 # Se executado diretamente, valida a base
 if __name__ == "__main__":
-   errors = validate_food_data()
+   relatorio = get_consistency_report()
+   errors = consistencia.erros(relatorio)
    if errors:
        print("Erros encontrados na base de dados:")
        for error in errors:
            print(f"  - {error}")
    else:
        print("Base de dados validada com sucesso!")
+   print(f"Resumo: {relatorio['resumo']} ({relatorio['linhas']} alimentos, {relatorio['tempo_s']}s)")
+   for par in relatorio['duplicatas']:
+       print(f"  ~ duplicata: {' / '.join(par['chaves'])} (distância {par['distancia_g_100g']} g/100g)")
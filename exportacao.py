@@ -0,0 +1,211 @@
+# exportacao.py
+# Saídas em NDJSON/CSV: o plano de /gerarPlano em NDJSON (uma linha por
+# refeição) e a exportação em massa de /exportarPlanos em CSV ou NDJSON.
+# Tudo é gerador: cada linha é serializada e enviada sozinha, então nenhuma
+# resposta inteira fica montada em memória. Na exportação cada plano sai
+# assim que fica pronto; no /gerarPlano cada refeição sai assim que fica
+# pronta (no modo otimizado, depois do solve).
+
+import csv
+import io
+import time
+from collections import deque
+from concurrent.futures import CancelledError, TimeoutError as FuturoEsgotado
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from arquivo_planos import arquivar
+from database import COLUNAS_NUTRIENTES, get_food_data
+from logic import gerar_plano_em_fluxo, gerar_plano_personalizado
+from lote import PRAZO_LOTE_S, EmVoo, descartar_pool, erro_pool, num_processos
+from resolvedor import resolver_chave
+from serializacao import codificar
+from totais import calcular_aderencia, formatar_totais
+from validacao import PedidoInvalido, validar_pedido
+
+FORMATOS = ("csv", "ndjson")
+
+CABECALHO_CSV = (
+    "indice", "paciente", "dia", "refeicao", "alimento", "quantidade_g",
+    *COLUNAS_NUTRIENTES, "erro",
+)
+
+
+def _linha(conteudo: Dict[str, Any]) -> bytes:
+    return codificar(conteudo) + b"\n"
+
+
+def linhas_plano_em_fluxo(dados: Dict[str, Any], guardar_estado: bool = False) -> Iterator[bytes]:
+    """Plano de ``gerar_plano_em_fluxo`` como NDJSON, linha a linha.
+
+    Primeira linha ``plano`` (id e texto), depois uma linha ``refeicao`` por
+    refeição (com ``dia`` em planos de vários dias, seguida da linha ``dia``
+    com os totais daquele dia), uma linha ``alternativa`` por alternativa
+    pedida em ``configuracoes.alternativas`` e, por último, o ``resumo``.
+
+    Cada refeição é escrita assim que fica pronta. Um erro depois da
+    primeira linha vira uma linha ``erro`` no lugar do ``resumo``; o
+    plano completo só é arquivado se chegar ao fim.
+    """
+    metas = dados.get("metas", {})
+    peso = dados.get("paciente", {}).get("peso_kg", 0)
+    fluxo = gerar_plano_em_fluxo(dados, guardar_estado)
+    primeira = True
+    while True:
+        try:
+            evento = next(fluxo)
+        except StopIteration as fim:
+            plano = fim.value
+            break
+        except Exception as e:
+            if primeira:
+                raise
+            yield _linha({"tipo": "erro", "erro": str(e)})
+            return
+        primeira = False
+        if evento[0] == "plano":
+            yield _linha({"tipo": "plano", **evento[1]})
+        elif evento[0] == "refeicao":
+            _, dia, indice, refeicao = evento
+            linha = {"tipo": "refeicao"}
+            if dia is not None:
+                linha["dia"] = dia
+            yield _linha({**linha, "indice": indice, "refeicao": refeicao})
+        else:
+            _, dia, totais_dia = evento
+            yield _linha({
+                "tipo": "dia", "dia": dia, "totais": formatar_totais(totais_dia),
+                "aderencia": calcular_aderencia(totais_dia, metas, peso),
+            })
+    for alternativa in plano.get("alternativas", ()):
+        yield _linha({"tipo": "alternativa", **alternativa})
+    yield _linha({"tipo": "resumo", "resumo_nutricional": plano["resumo_nutricional"]})
+    if guardar_estado:
+        arquivar(plano["plano_id"], dados, plano)
+
+
+def _planos_em_ordem(itens: List[Tuple[Any, str]]) -> Iterator[Tuple[int, Any, Optional[Dict[str, Any]], Optional[str]]]:
+    """(indice, dados, plano, erro) na ordem da entrada.
+
+    Com o pool, no máximo duas rodadas de planos ficam em voo: o próximo só
+    é enviado quando o mais antigo sai, então a memória não cresce com o
+    tamanho do lote.
+    """
+    processos = num_processos()
+    pendentes = deque()
+    prazo = time.monotonic() + PRAZO_LOTE_S
+    esgotado = f"tempo esgotado: exportação não terminou em {PRAZO_LOTE_S:g}s"
+
+    def entregar(voo):
+        while True:
+            try:
+                plano = voo.futuro.result(timeout=max(prazo - time.monotonic(), 0))
+                break
+            except BrokenProcessPool as e:
+                # Os demais itens em voo no mesmo pool também se perderam:
+                # reenvia todos de uma vez, não um por um ao chegar a vez deles
+                quebrado = voo.pool
+                if not voo.reenviar():
+                    return voo.indice, voo.dados, None, erro_pool(e)
+                for outro in pendentes:
+                    if outro.pool is quebrado and not outro.concluido():
+                        outro.reenviar()
+            except (FuturoEsgotado, CancelledError):
+                # Depois do prazo o pool é descartado e o que estava na fila, cancelado
+                descartar_pool()
+                return voo.indice, voo.dados, None, esgotado
+            except Exception as e:
+                return voo.indice, voo.dados, None, str(e)
+        arquivar(None, voo.dados, plano)
+        return voo.indice, voo.dados, plano, None
+
+    for indice, (dados, erro) in enumerate(itens):
+        if erro is None:
+            try:
+                dados = validar_pedido(dados).para_dict()
+            except PedidoInvalido as e:
+                erro = f"Requisição inválida: {e}"
+        if erro is not None:
+            # Mantém a ordem: o erro só sai depois dos planos já em voo
+            while pendentes:
+                yield entregar(pendentes.popleft())
+            yield indice, dados, None, erro
+        elif processos <= 1:
+            try:
+                plano = gerar_plano_personalizado(dados)
+            except Exception as e:
+                yield indice, dados, None, str(e)
+                continue
+            arquivar(None, dados, plano)
+            yield indice, dados, plano, None
+        elif time.monotonic() >= prazo:
+            while pendentes:
+                yield entregar(pendentes.popleft())
+            yield indice, dados, None, esgotado
+        else:
+            try:
+                pendentes.append(EmVoo(indice, dados))
+            except BrokenProcessPool as e:
+                while pendentes:
+                    yield entregar(pendentes.popleft())
+                yield indice, dados, None, erro_pool(e)
+                continue
+            if len(pendentes) >= 2 * processos:
+                yield entregar(pendentes.popleft())
+    while pendentes:
+        yield entregar(pendentes.popleft())
+
+
+def _linhas_csv(indice: int, dados: Any, plano: Optional[Dict[str, Any]], erro: Optional[str]) -> Iterator[tuple]:
+    """Uma linha por alimento, com os nutrientes da quantidade prescrita."""
+    paciente = dados.get("paciente") if isinstance(dados, dict) else None
+    nome = paciente.get("nome", "") if isinstance(paciente, dict) else ""
+    if erro is not None:
+        yield (indice, nome, "", "", "", "", *("",) * len(COLUNAS_NUTRIENTES), erro)
+        return
+    catalogo = get_food_data()
+    dias = plano.get("dias") or [{"dia": 1, "refeicoes": plano["refeicoes"]}]
+    for dia in dias:
+        for refeicao in dia["refeicoes"]:
+            for item in refeicao["alimentos"]:
+                chave = resolver_chave(item["alimento"])
+                quantidade = item["quantidade_g"]
+                if chave is None:
+                    nutrientes = ("",) * len(COLUNAS_NUTRIENTES)
+                else:
+                    alimento = catalogo[chave]
+                    nutrientes = tuple(round(alimento[coluna] * quantidade, 2) for coluna in COLUNAS_NUTRIENTES)
+                yield (indice, nome, dia["dia"], refeicao["nome"], item["alimento"], quantidade, *nutrientes, "")
+
+
+def exportar_csv(itens: List[Tuple[Any, str]]) -> Iterator[bytes]:
+    """Planos de ``itens`` em CSV, uma linha por alimento prescrito."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+
+    def esvaziar() -> bytes:
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto.encode("utf-8")
+
+    escritor.writerow(CABECALHO_CSV)
+    yield esvaziar()
+    for indice, dados, plano, erro in _planos_em_ordem(itens):
+        escritor.writerows(_linhas_csv(indice, dados, plano, erro))
+        yield esvaziar()
+
+
+def exportar_ndjson(itens: List[Tuple[Any, str]]) -> Iterator[bytes]:
+    """Planos de ``itens`` em NDJSON, uma linha por paciente na ordem da entrada."""
+    for indice, _, plano, erro in _planos_em_ordem(itens):
+        if erro is not None:
+            yield _linha({"indice": indice, "ok": False, "erro": erro})
+        else:
+            yield _linha({"indice": indice, "ok": True, "plano": plano})
+
+
+def exportar(itens: List[Tuple[Any, str]], formato: str) -> Iterator[bytes]:
+    if formato == "csv":
+        return exportar_csv(itens)
+    return exportar_ndjson(itens)
@@ -0,0 +1,189 @@
+# indice_substituicoes.py
+# Índice de substituições: para cada alimento do catálogo, os k equivalentes
+# mais próximos do mesmo grupo, já com o multiplicador de gramas que preserva
+# o macro dominante do grupo. No import só os grupos são montados (O(n)); a
+# grade de perfis de cada grupo é montada por ``preparar`` (no aquecimento,
+# antes de /pronto) ou na primeira consulta ao grupo, e os vizinhos de cada
+# alimento são calculados uma vez e guardados, sob ``_LOCK_INDICE``.
+
+import heapq
+import itertools
+import math
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from database import get_food_data, get_substitution_rules
+from resolvedor import resolver_chave
+
+TOP_K = 3
+# Grupos até este tamanho são varridos inteiros; acima disso a busca usa a
+# grade de perfis
+GRUPO_VARREDURA_MAX = 64
+
+# Macro preservado na troca para alimentos fora das regras de substituição,
+# agrupados pela categoria do catálogo
+MACRO_POR_CATEGORIA = {
+    "proteina": "p",
+    "carboidrato": "c",
+    "fruta": "c",
+    "gordura": "g",
+    "fibra": "f",
+}
+
+
+def _perfil(alimento) -> Tuple[float, float, float]:
+    """Fração das kcal vindas de proteína, carboidrato e gordura."""
+    kcal = alimento["kcal"]
+    return (alimento["p"] * 4 / kcal, alimento["c"] * 4 / kcal, alimento["g"] * 9 / kcal)
+
+
+def _grupos(catalogo) -> Dict[str, Tuple[str, List[str]]]:
+    """grupo -> (macro base, chaves). As regras de substituição têm prioridade
+    sobre a categoria do catálogo."""
+    grupos = {}
+    agrupados = set()
+    for nome, regra in get_substitution_rules().items():
+        chaves = [chave for chave in regra["alimentos"] if chave in catalogo]
+        grupos[nome] = (regra.get("macro_base", "kcal"), chaves)
+        agrupados.update(chaves)
+    for chave in catalogo:
+        if chave in agrupados:
+            continue
+        categoria = catalogo[chave]["categoria"]
+        macro = MACRO_POR_CATEGORIA.get(categoria, "kcal")
+        grupos.setdefault(f"categoria:{categoria}", (macro, []))[1].append(chave)
+    return grupos
+
+
+class _Grupo:
+    """Alimentos de um grupo e, sob demanda, a grade dos seus perfis de macros.
+
+    Os perfis (frações das kcal) ficam perto do plano p + c + g = 1; a grade
+    tem lado ~ sqrt(8 / n), o que dá poucos alimentos por célula ocupada. A
+    busca anda em anéis de células em volta da origem e para quando o anel
+    seguinte não pode ter nada mais perto que o k-ésimo vizinho.
+    """
+
+    def __init__(self, macro: str, chaves: List[str]):
+        self.macro = macro
+        self.chaves = chaves
+        self._perfis: Optional[List[Tuple[float, float, float]]] = None
+        self._grade: Optional[Dict[Tuple[int, int, int], List[int]]] = None
+        self._lock = threading.Lock()
+
+    def _preparar(self, catalogo) -> None:
+        with self._lock:
+            if self._perfis is not None:
+                return
+            # Alimentos sem calorias (sal, adoçante) não têm perfil de macros
+            self.chaves = [chave for chave in self.chaves if catalogo[chave]["kcal"] > 0]
+            perfis = [_perfil(catalogo[chave]) for chave in self.chaves]
+            self.posicao = {chave: i for i, chave in enumerate(self.chaves)}
+            if len(perfis) > GRUPO_VARREDURA_MAX:
+                self.lado = math.sqrt(8 / len(perfis))
+                grade = {}
+                for i, perfil in enumerate(perfis):
+                    grade.setdefault(self._celula(perfil), []).append(i)
+                self._grade = grade
+                # Do anel 0 até este toda célula ocupada já foi visitada
+                self._raio_max = max(max(eixo) - min(eixo) for eixo in zip(*grade))
+            self._perfis = perfis
+
+    def _celula(self, perfil) -> Tuple[int, int, int]:
+        return tuple(math.floor(valor / self.lado) for valor in perfil)
+
+    def vizinhos(self, chave: str, k: int, catalogo) -> List[Tuple[float, int]]:
+        """(distância, posição) dos ``k`` mais próximos de ``chave`` no grupo."""
+        if self._perfis is None:
+            self._preparar(catalogo)
+        i = self.posicao.get(chave)
+        if i is None:
+            return []
+        perfis = self._perfis
+        perfil = perfis[i]
+        if self._grade is None:
+            return heapq.nsmallest(k, ((math.dist(perfil, outro), j) for j, outro in enumerate(perfis) if j != i))
+
+        x, y, z = self._celula(perfil)
+        melhores: List[Tuple[float, int]] = []
+        for raio in range(self._raio_max + 1):
+            for dx, dy, dz in itertools.product(range(-raio, raio + 1), repeat=3):
+                if max(abs(dx), abs(dy), abs(dz)) != raio:
+                    continue
+                for j in self._grade.get((x + dx, y + dy, z + dz), ()):
+                    if j != i:
+                        melhores.append((math.dist(perfil, perfis[j]), j))
+            melhores = heapq.nsmallest(k, melhores)
+            # Tudo além do próximo anel está a pelo menos raio * lado
+            if len(melhores) == k and melhores[-1][0] <= raio * self.lado:
+                break
+        return melhores
+
+
+def _montar_grupos(catalogo) -> Dict[str, _Grupo]:
+    """chave -> grupo do alimento."""
+    por_chave = {}
+    for macro, chaves in _grupos(catalogo).values():
+        grupo = _Grupo(macro, chaves)
+        for chave in chaves:
+            por_chave.setdefault(chave, grupo)
+    return por_chave
+
+
+GRUPO_DE = _montar_grupos(get_food_data())
+# chave -> ((outra, multiplicador, distância), ...), preenchido nas consultas
+_INDICE: Dict[str, Tuple[Tuple[str, float, float], ...]] = {}
+_LOCK_INDICE = threading.Lock()
+
+
+def preparar() -> None:
+    """Monta a grade de perfis de todos os grupos (idempotente).
+
+    Chamado pelo aquecimento, para que nenhuma requisição pague pela grade
+    do seu grupo nem dispute a montagem com outra.
+    """
+    catalogo = get_food_data()
+    for grupo in set(GRUPO_DE.values()):
+        grupo._preparar(catalogo)
+
+
+def _equivalentes_de(chave: str, k: int = TOP_K) -> Tuple[Tuple[str, float, float], ...]:
+    resultado = _INDICE.get(chave)
+    if resultado is not None:
+        return resultado
+    grupo = GRUPO_DE.get(chave)
+    if grupo is None:
+        return ()
+    with _LOCK_INDICE:
+        # Outra requisição pode ter calculado a mesma chave enquanto esta esperava
+        if chave in _INDICE:
+            return _INDICE[chave]
+        catalogo = get_food_data()
+        origem = catalogo[chave]
+        equivalentes = []
+        for distancia, j in grupo.vizinhos(chave, k, catalogo):
+            outra = grupo.chaves[j]
+            destino = catalogo[outra]
+            base = grupo.macro if origem[grupo.macro] > 0 and destino[grupo.macro] > 0 else "kcal"
+            equivalentes.append((outra, origem[base] / destino[base], round(distancia, 4)))
+        _INDICE[chave] = resultado = tuple(equivalentes)
+    return resultado
+
+
+def substitutos(chave: str, quantidade_g: float) -> List[Dict[str, Any]]:
+    """Equivalentes de ``quantidade_g`` gramas de ``chave``, do mais próximo ao
+    mais distante, com a quantidade que mantém o macro dominante."""
+    return [
+        {"alimento": outra, "quantidade_g": round(quantidade_g * multiplicador), "distancia": distancia}
+        for outra, multiplicador, distancia in _equivalentes_de(chave)
+    ]
+
+
+def equivalentes(alimentos) -> Dict[str, List[Dict[str, Any]]]:
+    """Substitutos de cada item de uma refeição, pelo nome do item."""
+    resultado = {}
+    for item in alimentos:
+        chave = resolver_chave(item["alimento"])
+        if chave is not None:
+            resultado[item["alimento"]] = substitutos(chave, item["quantidade_g"])
+    return resultado
@@ -1,36 +1,18 @@
 
 import re
-from typing import Dict, Any
+import uuid
+from typing import Dict, Any, Generator
 
-def gerar_plano_personalizado(dados: Dict[str, Any]) -> Dict[str, Any]:
-    paciente = dados.get("paciente", {})
-    metas = dados.get("metas", {})
-    configuracoes = dados.get("configuracoes", {})
-
-    nome = paciente.get("nome", "Paciente")
-    peso = paciente.get("peso_kg", 0)
-    altura = paciente.get("altura_cm", 0)
-    sexo = paciente.get("sexo", "N")
+from database import COLUNAS_NUTRIENTES
+from totais import VetorPlano, vetorizar_plano, calcular_totais, calcular_aderencia, formatar_totais
+from indice_substituicoes import equivalentes
+from otimizador import refeicoes_template, otimizar_porcoes
+from cache_planos import CACHE, PLANOS
+from multidias import calcular_dias_em_fluxo
+from alternativas import calcular_alternativas
 
-    kcal_total = metas.get("kcal_total", 0)
-    proteina_min = metas.get("proteina_min_g_por_kg", 0) * peso
-    carbo_max_percent = metas.get("carboidrato_max_percent", 0)
-    gordura_max_percent = metas.get("gordura_max_percent", 0)
-    fibras_min = metas.get("fibras_min_g", 0)
-
-    num_refeicoes = configuracoes.get("num_refeicoes", 5)
-    pre_treino = configuracoes.get("pre_treino", {})
-    preferencias = configuracoes.get("preferencias", {})
-
-    plano_formatado = (
-        f"Plano alimentar para {nome}:\n"
-        f"- Peso: {peso} kg\n"
-        f"- Altura: {altura} cm\n"
-        f"- Calorias totais: {kcal_total} kcal\n"
-        f"- Refeições por dia: {num_refeicoes}\n"
-    )
-
-    refeicoes = [
+def _refeicoes_fixas():
+    return [
         {
             "nome": "Café da Manhã",
             "alimentos": [
@@ -66,6 +48,15 @@ def gerar_plano_personalizado(dados: Dict[str, Any]) -> Dict[str, Any]:
         }
     ]
 
+def refeicoes_base(modo: str, num_refeicoes: int, kcal_alvo=None):
+    """Refeições do dia antes das preferências (templates ou as fixas)."""
+    if modo == "otimizado":
+        return refeicoes_template(num_refeicoes, kcal_alvo)
+    return _refeicoes_fixas()
+
+def refeicoes_especiais(preferencias: Dict[str, Any]):
+    """Refeições extras pedidas em ``configuracoes.preferencias``."""
+    refeicoes = []
     if preferencias.get("hamburguer_jantar"):
         refeicoes.append({
             "nome": "Receita Especial - Hambúrguer Artesanal",
@@ -85,15 +76,236 @@ def gerar_plano_personalizado(dados: Dict[str, Any]) -> Dict[str, Any]:
                 {"alimento": "Whey", "quantidade_g": 20}
             ]
         })
+    return refeicoes
+
+def calcular_refeicoes(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Parte cacheável do plano: refeições, quantidades e totais do dia.
+
+    Depende só das metas e configurações (nunca do nome do paciente), então
+    pode ser reaproveitada por ``CACHE`` entre requisições da mesma faixa.
+    """
+    fluxo = _calcular_refeicoes_em_fluxo(dados)
+    while True:
+        try:
+            next(fluxo)
+        except StopIteration as fim:
+            return fim.value
+
+def _calcular_refeicoes_em_fluxo(dados: Dict[str, Any]) -> Generator[tuple, None, Dict[str, Any]]:
+    """Gerador de ``calcular_refeicoes``: produz ``("refeicao", dia, indice,
+    refeicao)`` assim que cada refeição tem totais e equivalentes (e, com
+    vários dias, ``("dia", dia, totais_dia)``) e retorna o núcleo.
+
+    No modo otimizado o solver acopla todas as refeições, então elas só
+    saem depois do solve; com alternativas nada é produzido.
+    """
+    metas = dados.get("metas", {})
+    configuracoes = dados.get("configuracoes", {})
+    peso = dados.get("paciente", {}).get("peso_kg", 0)
+    num_refeicoes = configuracoes.get("num_refeicoes", 5)
+    preferencias = configuracoes.get("preferencias", {})
+    modo = configuracoes.get("modo", "padrao")
+
+    especiais = refeicoes_especiais(preferencias)
+    kcal_alvo = metas.get("kcal_total")
+    if kcal_alvo and especiais and modo == "otimizado":
+        # Os templates ficam com o que sobra depois das refeições especiais
+        kcal_alvo = max(kcal_alvo - calcular_totais(vetorizar_plano(especiais))[1][0], 0) or None
+    refeicoes = refeicoes_base(modo, num_refeicoes, kcal_alvo) + especiais
+    if configuracoes.get("dias", 1) > 1:
+        return (yield from calcular_dias_em_fluxo(refeicoes, dados))
+    if modo == "otimizado" and configuracoes.get("alternativas", 1) > 1:
+        return calcular_alternativas(refeicoes, dados)
+
+    otimizacao = None
+    if modo == "otimizado":
+        otimizacao = otimizar_porcoes(refeicoes, metas, peso, configuracoes)
+
+    # O vetor CSR cresce uma refeição por vez; cada uma sai com seus totais
+    vetor = VetorPlano()
+    totais_refeicoes = []
+    totais_dia = [0.0] * len(COLUNAS_NUTRIENTES)
+    for indice, refeicao in enumerate(refeicoes):
+        vetor.adicionar_refeicao(refeicao.get("nome", ""), refeicao.get("alimentos", []))
+        (totais,), _ = calcular_totais(vetor, a_partir=indice)
+        totais_refeicoes.append(totais)
+        refeicao["totais"] = formatar_totais(totais)
+        refeicao["equivalentes"] = equivalentes(refeicao["alimentos"])
+        totais_dia = [a + b for a, b in zip(totais_dia, totais)]
+        yield "refeicao", None, indice, refeicao
 
     return {
-        "plano_formatado": plano_formatado,
         "refeicoes": refeicoes,
-        "resumo_nutricional": {
-            "calorias": kcal_total,
-            "proteina_minima": round(proteina_min, 2),
-            "carboidrato_max_percent": carbo_max_percent,
-            "gordura_max_percent": gordura_max_percent,
-            "fibras_min_g": fibras_min
-        }
+        # Totais brutos por refeição: base do replanejamento incremental
+        "totais_refeicoes": [list(totais) for totais in totais_refeicoes],
+        "totais_dia": totais_dia,
+        "alimentos_nao_resolvidos": vetor.nao_resolvidos,
+        "alimentos_aproximados": {
+            nome: {"chave": chave, "confianca": confianca}
+            for nome, (chave, confianca) in vetor.aproximados.items()
+        },
+        "otimizacao": otimizacao
+    }
+
+def _nucleo_cacheavel(nucleo: Dict[str, Any]) -> bool:
+    # Não guarda o fallback do solver: a próxima requisição tenta otimizar de novo
+    return not (nucleo["otimizacao"] or {}).get("fallback")
+
+def _nucleo_provisorio(nucleo: Dict[str, Any]) -> bool:
+    # Solução viável sem prova de ótimo (tempo_limite): cache curto, para a
+    # faixa voltar a tentar o ótimo quando o solver estiver menos disputado
+    return (nucleo["otimizacao"] or {}).get("status", "otimo") != "otimo"
+
+def obter_nucleo(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Núcleo do plano para ``dados``, do ``CACHE`` ou calculado agora.
+
+    Requisições simultâneas da mesma faixa dividem um só cálculo; fallbacks
+    do solver não ficam em cache e soluções sem prova de ótimo ficam pouco.
+    """
+    return CACHE.obter_ou_calcular(dados, calcular_refeicoes, _nucleo_cacheavel, _nucleo_provisorio)
+
+def gerar_plano_personalizado(dados: Dict[str, Any], guardar_estado: bool = False) -> Dict[str, Any]:
+    """Plano completo para ``dados``.
+
+    Com ``guardar_estado`` o estado do plano fica em ``PLANOS`` e a resposta
+    ganha um ``plano_id`` para ajustes via ``replanejamento.replanejar``.
+    """
+    nucleo = obter_nucleo(dados)
+    plano = montar_plano(dados, nucleo)
+    if guardar_estado:
+        plano["plano_id"] = uuid.uuid4().hex
+        PLANOS.gravar(plano["plano_id"], {"dados": dados, "nucleo": nucleo})
+    return plano
+
+def gerar_plano_em_fluxo(dados: Dict[str, Any], guardar_estado: bool = False) -> Generator[tuple, None, Dict[str, Any]]:
+    """Versão geradora de ``gerar_plano_personalizado`` para respostas em NDJSON.
+
+    Produz ``("plano", {"plano_id", "plano_formatado"})`` e depois as
+    refeições (e os dias) na ordem do plano; retorna o plano completo. No
+    modo padrão, numa falha de cache, cada refeição sai assim que fica
+    pronta. Com solver (ou num acerto de cache) o núcleo é obtido antes da
+    primeira linha, pelo mesmo caminho coalescido de
+    ``obter_nucleo``, e as refeições saem dele em seguida.
+    """
+    configuracoes = dados.get("configuracoes", {})
+    plano_id = uuid.uuid4().hex if guardar_estado else None
+    cabecalho = {"plano_id": plano_id, "plano_formatado": _texto_plano(dados, configuracoes.get("dias", 1))}
+
+    if configuracoes.get("modo", "padrao") == "padrao":
+        yield "plano", cabecalho
+        eventos = []
+        fluxo = CACHE.obter_ou_calcular_em_fluxo(dados, _calcular_refeicoes_em_fluxo, _nucleo_cacheavel, _nucleo_provisorio)
+        while True:
+            try:
+                evento = next(fluxo)
+            except StopIteration as fim:
+                nucleo = fim.value
+                break
+            eventos.append(evento)
+            yield evento
+    else:
+        nucleo = obter_nucleo(dados)
+        yield "plano", cabecalho
+        eventos = []
+    if not eventos:
+        yield from _eventos_do_nucleo(nucleo)
+
+    plano = montar_plano(dados, nucleo)
+    if guardar_estado:
+        plano["plano_id"] = plano_id
+        PLANOS.gravar(plano_id, {"dados": dados, "nucleo": nucleo})
+    return plano
+
+def _eventos_do_nucleo(nucleo: Dict[str, Any]):
+    """Os eventos de ``_calcular_refeicoes_em_fluxo`` a partir de um núcleo pronto."""
+    if "dias" in nucleo:
+        for dia in nucleo["dias"]:
+            for indice, refeicao in enumerate(dia["refeicoes"]):
+                yield "refeicao", dia["dia"], indice, refeicao
+            yield "dia", dia["dia"], dia["totais_dia"]
+    else:
+        for indice, refeicao in enumerate(nucleo["refeicoes"]):
+            yield "refeicao", None, indice, refeicao
+
+def _texto_plano(dados: Dict[str, Any], num_dias: int = 1) -> str:
+    paciente = dados.get("paciente", {})
+    configuracoes = dados.get("configuracoes", {})
+    texto = (
+        f"Plano alimentar para {paciente.get('nome', 'Paciente')}:\n"
+        f"- Peso: {paciente.get('peso_kg', 0)} kg\n"
+        f"- Altura: {paciente.get('altura_cm', 0)} cm\n"
+        f"- Calorias totais: {dados.get('metas', {}).get('kcal_total', 0)} kcal\n"
+        f"- Refeições por dia: {configuracoes.get('num_refeicoes', 5)}\n"
+    )
+    if num_dias > 1:
+        texto += f"- Dias: {num_dias}\n"
+    return texto
+
+def montar_plano(dados: Dict[str, Any], nucleo: Dict[str, Any]) -> Dict[str, Any]:
+    """Texto do plano e resumo nutricional a partir do núcleo calculado."""
+    paciente = dados.get("paciente", {})
+    metas = dados.get("metas", {})
+    configuracoes = dados.get("configuracoes", {})
+
+    peso = paciente.get("peso_kg", 0)
+    sexo = paciente.get("sexo", "N")
+
+    kcal_total = metas.get("kcal_total", 0)
+    proteina_min = metas.get("proteina_min_g_por_kg", 0) * peso
+    carbo_max_percent = metas.get("carboidrato_max_percent", 0)
+    gordura_max_percent = metas.get("gordura_max_percent", 0)
+    fibras_min = metas.get("fibras_min_g", 0)
+
+    pre_treino = configuracoes.get("pre_treino", {})
+    preferencias = configuracoes.get("preferencias", {})
+
+    plano_formatado = _texto_plano(dados, len(nucleo.get("dias", ())))
+
+    totais_dia = nucleo["totais_dia"]
+
+    resumo_nutricional = {
+        "calorias": kcal_total,
+        "proteina_minima": round(proteina_min, 2),
+        "carboidrato_max_percent": carbo_max_percent,
+        "gordura_max_percent": gordura_max_percent,
+        "fibras_min_g": fibras_min,
+        "totais_reais": formatar_totais(totais_dia),
+        "aderencia": calcular_aderencia(totais_dia, metas, peso),
+        "alimentos_nao_resolvidos": nucleo["alimentos_nao_resolvidos"],
+        "alimentos_aproximados": nucleo["alimentos_aproximados"]
     }
+    if nucleo.get("otimizacao") is not None:
+        resumo_nutricional["otimizacao"] = nucleo["otimizacao"]
+
+    plano = {
+        "plano_formatado": plano_formatado,
+        "refeicoes": nucleo["refeicoes"],
+        "resumo_nutricional": resumo_nutricional
+    }
+    if "dias" in nucleo:
+        # Vários dias: o resumo vale para a média diária do período
+        resumo_nutricional["dias"] = len(nucleo["dias"])
+        resumo_nutricional["variedade"] = nucleo["variedade"]
+        plano["dias"] = [
+            {
+                "dia": dia["dia"],
+                "refeicoes": dia["refeicoes"],
+                "totais": formatar_totais(dia["totais_dia"]),
+                "aderencia": calcular_aderencia(dia["totais_dia"], metas, peso)
+            }
+            for dia in nucleo["dias"]
+        ]
+    if "alternativas" in nucleo:
+        resumo_nutricional["alternativas"] = len(nucleo["alternativas"])
+        plano["alternativas"] = [
+            {
+                "alternativa": alternativa["alternativa"],
+                "refeicoes": alternativa["refeicoes"],
+                "trocas": alternativa["trocas"],
+                "objetivo": alternativa["objetivo"],
+                "totais": formatar_totais(alternativa["totais_dia"]),
+                "aderencia": calcular_aderencia(alternativa["totais_dia"], metas, peso)
+            }
+            for alternativa in nucleo["alternativas"]
+        ]
+    return plano
@@ -0,0 +1,238 @@
+# lote.py
+# Geração de planos em lote: distribui os pacientes em um pool de processos
+# e devolve os resultados como NDJSON, na ordem em que ficam prontos.
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from arquivo_planos import arquivar
+from logic import gerar_plano_personalizado
+from otimizador import SOLVERS_SIMULTANEOS
+from serializacao import codificar, decodificar
+from validacao import PedidoInvalido, validar_pedido
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+LOTE_MAX = int(os.environ.get("NUTRI_LOTE_MAX", "1000"))
+# Prazo de um lote inteiro no pool; itens que não terminarem saem como erro
+PRAZO_LOTE_S = float(os.environ.get("NUTRI_LOTE_TIMEOUT_S", "600"))
+# CBC simultâneos que a máquina comporta, divididos entre os workers do
+# gunicorn (NUTRI_WORKERS, ou WEB_CONCURRENCY)
+SOLVERS_TOTAL = os.environ.get("NUTRI_SOLVERS_TOTAL")
+WORKERS = int(os.environ.get("NUTRI_WORKERS") or os.environ.get("WEB_CONCURRENCY") or "1")
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def num_processos() -> int:
+    """Tamanho do pool de cada worker.
+
+    Cada processo do pool tem o seu próprio ``_SOLVERS_SIMULTANEOS``, então
+    o pool fica com a parte do worker no orçamento de solvers da máquina:
+    ``SOLVERS_TOTAL / (WORKERS * SOLVERS_SIMULTANEOS)``, no máximo um por CPU.
+    """
+    configurado = os.environ.get("NUTRI_POOL_PROCESSOS")
+    if configurado:
+        return max(int(configurado), 1)
+    cpus = _cpus()
+    orcamento = int(SOLVERS_TOTAL) if SOLVERS_TOTAL else cpus
+    return max(min(orcamento // (WORKERS * SOLVERS_SIMULTANEOS), cpus), 1)
+
+
+def obter_pool() -> "ProcessPoolExecutor":
+    """Pool de processos do worker atual, criado sob demanda.
+
+    Nunca é criado no import: com ``--preload`` o master do gunicorn faria o
+    fork dos workers com um pool herdado e inutilizável. Os processos saem
+    de um forkserver (ou spawn), nunca de um fork do worker: com várias
+    threads, um fork herdaria travas seguras por outra thread (métricas,
+    cache) e o filho travaria. O import do multiprocessing também fica para
+    cá: o lote é raro e pesa na partida.
+    """
+    global _pool, _pool_pid
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            contexto = multiprocessing.get_context(metodo)
+            if metodo == "forkserver":
+                # O servidor importa a lógica uma vez; cada filho já nasce com ela
+                contexto.set_forkserver_preload(["logic"])
+            _pool = ProcessPoolExecutor(max_workers=num_processos(), mp_context=contexto)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def descartar_pool(pool: Optional["ProcessPoolExecutor"] = None) -> None:
+    """Abandona o pool atual (prazo esgotado ou filho morto); o próximo uso cria outro.
+
+    Com ``pool``, só descarta se ele ainda for o atual: vários itens do
+    mesmo pool quebrado não derrubam o pool novo criado pelo primeiro.
+    """
+    global _pool
+    with _pool_lock:
+        if pool is not None and pool is not _pool:
+            return
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class EmVoo:
+    """Um plano enviado ao pool: o item, o pool que o recebeu e o futuro."""
+
+    __slots__ = ("indice", "dados", "pool", "futuro", "reenviado")
+
+    def __init__(self, indice: int, dados: Dict[str, Any]):
+        self.indice = indice
+        self.dados = dados
+        self.reenviado = False
+        self.pool = obter_pool()
+        try:
+            self.futuro: "Future" = self.pool.submit(gerar_plano_personalizado, dados)
+        except BrokenProcessPool:
+            # Um filho morreu depois do último lote: o pool em cache não serve mais
+            descartar_pool(self.pool)
+            self.pool = obter_pool()
+            self.futuro = self.pool.submit(gerar_plano_personalizado, dados)
+
+    def concluido(self) -> bool:
+        """True se o plano já saiu do pool (mesmo que o pool tenha quebrado depois)."""
+        futuro = self.futuro
+        return futuro.done() and not futuro.cancelled() and futuro.exception() is None
+
+    def reenviar(self) -> bool:
+        """Depois de um ``BrokenProcessPool`` (filho morto por OOM ou por um
+        segfault do CBC): descarta o pool quebrado e envia o item de novo em
+        um pool novo, uma vez só. False se o item já foi reenviado; aí ele
+        sai como erro."""
+        descartar_pool(self.pool)
+        if self.reenviado:
+            return False
+        self.reenviado = True
+        self.pool = obter_pool()
+        try:
+            self.futuro = self.pool.submit(gerar_plano_personalizado, self.dados)
+        except BrokenProcessPool:
+            return False
+        return True
+
+
+def erro_pool(erro: BaseException) -> str:
+    if isinstance(erro, BrokenProcessPool):
+        return "processo do pool encerrado inesperadamente ao gerar o plano"
+    return str(erro)
+
+
+def ler_itens(corpo: bytes, content_type: str) -> List[Tuple[Any, str]]:
+    """Converte o corpo (array JSON ou NDJSON) em uma lista de (dados, erro).
+
+    No NDJSON cada linha é decodificada separadamente, então uma linha
+    inválida vira um erro só daquele item.
+    """
+    if "ndjson" not in content_type and corpo.lstrip().startswith(b"["):
+        return [(dados, None) for dados in decodificar(corpo)]
+    itens = []
+    for linha in corpo.splitlines():
+        if not linha.strip():
+            continue
+        try:
+            itens.append((decodificar(linha), None))
+        except ValueError as e:
+            itens.append((None, f"JSON inválido: {e}"))
+    return itens
+
+
+def _linha(conteudo: Dict[str, Any]) -> bytes:
+    return codificar(conteudo) + b"\n"
+
+
+def gerar_lote(itens: List[Tuple[Any, str]]) -> Iterator[bytes]:
+    """Gera os planos no pool e produz uma linha NDJSON por paciente.
+
+    Cada linha traz o ``indice`` do item na entrada; erros de um item não
+    interrompem o lote. A última linha é um resumo com a vazão (planos/s).
+    """
+    inicio = time.perf_counter()
+    # Com um único núcleo o pool só acrescentaria serialização entre processos
+    usar_pool = num_processos() > 1
+    voos: Dict["Future", EmVoo] = {}
+    erros = 0
+    for indice, (dados, erro) in enumerate(itens):
+        if erro is None:
+            try:
+                dados = validar_pedido(dados).para_dict()
+            except PedidoInvalido as e:
+                erro = f"Requisição inválida: {e}"
+        if erro is not None:
+            erros += 1
+            yield _linha({"indice": indice, "ok": False, "erro": erro})
+        elif not usar_pool:
+            try:
+                plano = gerar_plano_personalizado(dados)
+                arquivar(None, dados, plano)
+                yield _linha({"indice": indice, "ok": True, "plano": plano})
+            except Exception as e:
+                erros += 1
+                yield _linha({"indice": indice, "ok": False, "erro": str(e)})
+        else:
+            try:
+                voo = EmVoo(indice, dados)
+            except BrokenProcessPool as e:
+                erros += 1
+                yield _linha({"indice": indice, "ok": False, "erro": erro_pool(e)})
+                continue
+            voos[voo.futuro] = voo
+
+    prazo = time.monotonic() + PRAZO_LOTE_S
+    while voos:
+        prontos, _ = wait(voos, timeout=max(prazo - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not prontos:
+            break
+        for futuro in prontos:
+            voo = voos.pop(futuro)
+            try:
+                plano = futuro.result()
+            except BrokenProcessPool as e:
+                if voo.reenviar():
+                    voos[voo.futuro] = voo
+                    continue
+                erros += 1
+                yield _linha({"indice": voo.indice, "ok": False, "erro": erro_pool(e)})
+                continue
+            except Exception as e:
+                erros += 1
+                yield _linha({"indice": voo.indice, "ok": False, "erro": str(e)})
+                continue
+            arquivar(None, voo.dados, plano)
+            yield _linha({"indice": voo.indice, "ok": True, "plano": plano})
+    if voos:
+        descartar_pool()
+        for voo in sorted(voos.values(), key=lambda voo: voo.indice):
+            erros += 1
+            yield _linha({"indice": voo.indice, "ok": False,
+                          "erro": f"tempo esgotado: lote não terminou em {PRAZO_LOTE_S:g}s"})
+
+    duracao = time.perf_counter() - inicio
+    yield _linha({"resumo": {
+        "total": len(itens),
+        "erros": erros,
+        "tempo_s": round(duracao, 3),
+        "planos_por_s": round(len(itens) / duracao, 1) if duracao else None,
+    }})
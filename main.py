@@ -1,5 +1,19 @@
-from flask import Flask, request, jsonify
+import time
+from itertools import chain
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from logic import gerar_plano_personalizado
+from replanejamento import PlanoNaoEncontrado, replanejar
+from lote import LOTE_MAX, ler_itens, gerar_lote
+from exportacao import FORMATOS, exportar, linhas_plano_em_fluxo
+import arquivo_planos
+from arquivo_planos import arquivar
+from coalescencia import TempoEsgotado
+from serializacao import codificar, decodificar
+from validacao import PedidoInvalido, validar_pedido
+import metricas
+import aquecimento
+import database  # noqa: F401 - monta o catálogo no import (compartilhado via --preload)
 import os
 from flask_cors import CORS
 
@@ -9,37 +23,204 @@ CORS(app)  # permite chamadas da web/GPT
 # Carrega a chave da API a partir da variável de ambiente
 API_KEY = os.environ.get("API_KEY")
 
+# 🔥 Importa o solver e roda um plano de exemplo antes da primeira requisição
+aquecimento.iniciar()
+
+
+def quer_streaming():
+    """``Accept: application/x-ndjson`` ou ``?stream=1`` pedem o plano em NDJSON."""
+    return "application/x-ndjson" in request.headers.get("Accept", "") or request.args.get("stream") in ("1", "true")
+
+
+def resposta_json(conteudo, status=200):
+    with metricas.medir_etapa("serializacao"):
+        corpo = codificar(conteudo)
+    return Response(corpo, status=status, mimetype="application/json")
+
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio = time.perf_counter()
+    if metricas.PROFILER is not None:
+        metricas.PROFILER.iniciar()
+
+
+@app.after_request
+def agendar_medicao(response):
+    # A escrita do corpo (inclusive respostas em streaming) só termina quando o
+    # servidor fecha a resposta; por isso o total é registrado no close.
+    rota = request.url_rule.rule if request.url_rule else "outra"
+    inicio, fim_view, status = g.inicio, time.perf_counter(), response.status_code
+
+    def registrar():
+        fim = time.perf_counter()
+        metricas.observar_etapa("escrita", fim - fim_view)
+        metricas.registrar_requisicao(rota, status, fim - inicio)
+        if metricas.PROFILER is not None:
+            metricas.PROFILER.finalizar(rota, fim - inicio)
+
+    response.call_on_close(registrar)
+    return response
+
 
 @app.route("/", methods=["GET"])
 def home():
     return jsonify({"message": "API do Plano Nutricional Pedro Barros"}), 200
 
 
+@app.route("/pronto", methods=["GET"])
+def pronto():
+    # Readiness: 503 enquanto o aquecimento não terminou
+    estado = aquecimento.estado()
+    # O arquivo de planos é best-effort: só informa, não tira o worker do ar
+    arquivo = arquivo_planos.estado()
+    if arquivo is not None:
+        estado["arquivo_planos"] = arquivo
+    return resposta_json(estado, 200 if estado["pronto"] else 503)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # 🔐 Só com NUTRI_METRICAS_TOKEN definido, enviado como Bearer
+    if not metricas.TOKEN:
+        return jsonify({"erro": "Não encontrado"}), 404
+    if not metricas.autorizado(request.headers.get("Authorization")):
+        return jsonify({"erro": "Não autorizado"}), 401
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/gerarPlano", methods=["POST"])
 def gerar_plano():
     # 🔐 Verificação de autenticação com chave de API
-    key = request.headers.get("API_KEY")
-    if key != API_KEY:
+    with metricas.medir_etapa("auth"):
+        key = request.headers.get("API_KEY")
+        autorizado = key == API_KEY
+    if not autorizado:
         return jsonify({"erro": "Não autorizado"}), 401
 
+    # 🔎 Extrai e valida os dados do corpo da requisição antes de qualquer cálculo
     try:
-        # 🔎 Extrai os dados do corpo da requisição
-        dados = request.get_json()
+        with metricas.medir_etapa("parse"):
+            pedido = validar_pedido(decodificar(request.get_data()))
+    except PedidoInvalido as e:
+        return resposta_json({"erro": "Requisição inválida", "detalhes": e.erros}, 400)
+    except ValueError as e:
+        return resposta_json({"erro": f"JSON inválido: {e}"}, 400)
+
+    try:
+        # 🌊 NDJSON: cada refeição é escrita assim que fica pronta (no modo
+        # otimizado, depois do solve). A primeira linha é gerada aqui, para
+        # que erros antes dela ainda virem 504/500
+        if quer_streaming():
+            with metricas.medir_etapa("plano"):
+                linhas = linhas_plano_em_fluxo(pedido.para_dict(), guardar_estado=True)
+                primeira = next(linhas)
+            return Response(stream_with_context(chain([primeira], linhas)), mimetype="application/x-ndjson")
 
         # ⚙️ Gera o plano nutricional com base nos dados
-        plano_formatado, resumo_nutricional, substituicoes = gerar_plano_personalizado(dados)
+        with metricas.medir_etapa("plano"):
+            dados = pedido.para_dict()
+            plano = gerar_plano_personalizado(dados, guardar_estado=True)
+        # 🗄️ Arquivo colunar (opcional): só enfileira, a gravação é em segundo plano
+        arquivar(plano["plano_id"], dados, plano)
 
         # 📦 Monta a resposta para a GPT
         resposta = {
-            "plano_formatado": plano_formatado,
-            "resumo_nutricional": resumo_nutricional,
-            "refeicoes": substituicoes
+            "plano_id": plano["plano_id"],
+            "plano_formatado": plano["plano_formatado"],
+            "resumo_nutricional": plano["resumo_nutricional"],
+            "refeicoes": plano["refeicoes"]
         }
+        if "dias" in plano:
+            resposta["dias"] = plano["dias"]
+        if "alternativas" in plano:
+            resposta["alternativas"] = plano["alternativas"]
 
-        return jsonify(resposta), 200
+        return resposta_json(resposta, 200)
 
+    except TempoEsgotado as e:
+        return resposta_json({"erro": str(e)}, 504)
     except Exception as e:
-        return jsonify({"erro": str(e)}), 500
+        return resposta_json({"erro": str(e)}, 500)
+
+
+@app.route("/planos/<plano_id>", methods=["PATCH"])
+def ajustar_plano(plano_id):
+    # 🔐 Verificação de autenticação com chave de API
+    key = request.headers.get("API_KEY")
+    if key != API_KEY:
+        return jsonify({"erro": "Não autorizado"}), 401
+
+    try:
+        with metricas.medir_etapa("parse"):
+            delta = decodificar(request.get_data())
+        # ✏️ Aplica o delta recalculando só as refeições afetadas
+        with metricas.medir_etapa("plano"):
+            plano = replanejar(plano_id, delta)
+    except PlanoNaoEncontrado:
+        return resposta_json({"erro": "Plano não encontrado ou expirado"}, 404)
+    except PedidoInvalido as e:
+        return resposta_json({"erro": "Requisição inválida", "detalhes": e.erros}, 400)
+    except ValueError as e:
+        return resposta_json({"erro": f"JSON inválido: {e}"}, 400)
+    except Exception as e:
+        return resposta_json({"erro": str(e)}, 500)
+
+    resposta = {
+        "plano_id": plano["plano_id"],
+        "plano_formatado": plano["plano_formatado"],
+        "resumo_nutricional": plano["resumo_nutricional"],
+        "refeicoes": plano["refeicoes"],
+        "replanejamento": plano["replanejamento"]
+    }
+    if "dias" in plano:
+        resposta["dias"] = plano["dias"]
+    if "alternativas" in plano:
+        resposta["alternativas"] = plano["alternativas"]
+    return resposta_json(resposta, 200)
+
+
+@app.route("/gerarPlanos", methods=["POST"])
+def gerar_planos():
+    # 🔐 Verificação de autenticação com chave de API
+    key = request.headers.get("API_KEY")
+    if key != API_KEY:
+        return jsonify({"erro": "Não autorizado"}), 401
+
+    try:
+        itens = ler_itens(request.get_data(), request.content_type or "")
+    except ValueError as e:
+        return jsonify({"erro": f"Corpo inválido: {e}"}), 400
+    if len(itens) > LOTE_MAX:
+        return jsonify({"erro": f"Lote maior que o limite de {LOTE_MAX} pacientes"}), 413
+
+    # 📦 Um plano por linha (NDJSON), na ordem em que ficam prontos
+    return Response(stream_with_context(gerar_lote(itens)), mimetype="application/x-ndjson")
+
+
+@app.route("/exportarPlanos", methods=["POST"])
+def exportar_planos():
+    # 🔐 Verificação de autenticação com chave de API
+    key = request.headers.get("API_KEY")
+    if key != API_KEY:
+        return jsonify({"erro": "Não autorizado"}), 401
+
+    formato = request.args.get("formato", "ndjson")
+    if formato not in FORMATOS:
+        return jsonify({"erro": f"Formato inválido: use {', '.join(FORMATOS)}"}), 400
+    try:
+        itens = ler_itens(request.get_data(), request.content_type or "")
+    except ValueError as e:
+        return jsonify({"erro": f"Corpo inválido: {e}"}), 400
+    if len(itens) > LOTE_MAX:
+        return jsonify({"erro": f"Lote maior que o limite de {LOTE_MAX} pacientes"}), 413
+
+    # 📤 Um paciente por vez, na ordem da entrada, direto para o cliente
+    mimetype = "text/csv" if formato == "csv" else "application/x-ndjson"
+    resposta = Response(stream_with_context(exportar(itens, formato)), mimetype=mimetype)
+    if formato == "csv":
+        resposta.headers["Content-Disposition"] = "attachment; filename=planos.csv"
+    return resposta
 
 
 if __name__ == "__main__":
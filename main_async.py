@@ -0,0 +1,293 @@
+# main_async.py
+# Variante ASGI (Starlette + uvicorn) do main.py, com o mesmo contrato de
+# "/", "/gerarPlano" e "PATCH /planos/{plano_id}". O loop de eventos só cuida de I/O; a geração do plano
+# roda em um executor limitado e, com a fila cheia, a API responde 503 com
+# Retry-After em vez de acumular requisições.
+#
+# Uso: uvicorn main_async:app --host 0.0.0.0 --port 10000 --timeout-graceful-shutdown 30
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from itertools import chain
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import database  # noqa: F401 - monta o catálogo no import
+import aquecimento
+import metricas
+import arquivo_planos
+from arquivo_planos import arquivar
+from coalescencia import TempoEsgotado
+from exportacao import linhas_plano_em_fluxo
+from logic import gerar_plano_personalizado
+from replanejamento import PlanoNaoEncontrado, replanejar
+from serializacao import codificar, decodificar
+from validacao import PedidoInvalido, validar_pedido
+
+API_KEY = os.environ.get("API_KEY")
+
+# Threads que geram planos (o CBC roda em subprocesso, fora do GIL) e quantas
+# requisições podem esperar por uma thread livre antes do 503.
+EXECUTOR_THREADS = int(os.environ.get("NUTRI_ASYNC_THREADS", "4"))
+FILA_MAX = int(os.environ.get("NUTRI_ASYNC_FILA", "16"))
+RETRY_AFTER_S = int(os.environ.get("NUTRI_ASYNC_RETRY_AFTER_S", "2"))
+DESLIGAMENTO_S = float(os.environ.get("NUTRI_ASYNC_DESLIGAMENTO_S", "30"))
+
+
+class Admissao:
+    """Controle de admissão: executando + na fila nunca passa de ``limite``."""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.em_andamento = 0
+        self.encerrando = False
+        self._ocioso = asyncio.Event()
+        self._ocioso.set()
+
+    def tentar_entrar(self) -> bool:
+        if self.encerrando or self.em_andamento >= self.limite:
+            return False
+        self.em_andamento += 1
+        self._ocioso.clear()
+        return True
+
+    def sair(self) -> None:
+        self.em_andamento -= 1
+        if self.em_andamento == 0:
+            self._ocioso.set()
+
+    async def drenar(self, timeout: float) -> bool:
+        """Recusa novas requisições e espera as em andamento terminarem."""
+        self.encerrando = True
+        try:
+            await asyncio.wait_for(self._ocioso.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def resposta_json(conteudo, status=200, headers=None):
+    with metricas.medir_etapa("serializacao"):
+        corpo = codificar(conteudo)
+    return Response(corpo, status_code=status, media_type="application/json", headers=headers)
+
+
+def _gerar(dados):
+    with metricas.medir_etapa("plano"):
+        plano = gerar_plano_personalizado(dados, guardar_estado=True)
+    arquivar(plano["plano_id"], dados, plano)
+    return plano
+
+
+def _iniciar_fluxo(dados):
+    # Roda no executor: até a linha ``plano`` (no modo otimizado, o solve)
+    with metricas.medir_etapa("plano"):
+        linhas = linhas_plano_em_fluxo(dados, guardar_estado=True)
+        primeira = next(linhas)
+    return chain([primeira], linhas)
+
+
+def _montar_resposta(dados):
+    # Roda no executor: plano + serialização saem do loop de eventos
+    plano = _gerar(dados)
+    resposta = {
+        "plano_id": plano["plano_id"],
+        "plano_formatado": plano["plano_formatado"],
+        "resumo_nutricional": plano["resumo_nutricional"],
+        "refeicoes": plano["refeicoes"],
+    }
+    if "dias" in plano:
+        resposta["dias"] = plano["dias"]
+    if "alternativas" in plano:
+        resposta["alternativas"] = plano["alternativas"]
+    with metricas.medir_etapa("serializacao"):
+        return codificar(resposta)
+
+
+def _replanejar(plano_id, delta):
+    # Roda no executor, como _montar_resposta
+    with metricas.medir_etapa("plano"):
+        plano = replanejar(plano_id, delta)
+    resposta = {
+        "plano_id": plano["plano_id"],
+        "plano_formatado": plano["plano_formatado"],
+        "resumo_nutricional": plano["resumo_nutricional"],
+        "refeicoes": plano["refeicoes"],
+        "replanejamento": plano["replanejamento"],
+    }
+    if "dias" in plano:
+        resposta["dias"] = plano["dias"]
+    if "alternativas" in plano:
+        resposta["alternativas"] = plano["alternativas"]
+    with metricas.medir_etapa("serializacao"):
+        return codificar(resposta)
+
+
+async def home(request):
+    return JSONResponse({"message": "API do Plano Nutricional Pedro Barros"})
+
+
+async def pronto(request):
+    estado = aquecimento.estado()
+    # O arquivo de planos é best-effort: só informa, não tira o worker do ar
+    arquivo = arquivo_planos.estado()
+    if arquivo is not None:
+        estado["arquivo_planos"] = arquivo
+    return resposta_json(estado, 200 if estado["pronto"] else 503)
+
+
+async def metrics(request):
+    # 🔐 Só com NUTRI_METRICAS_TOKEN definido, enviado como Bearer
+    if not metricas.TOKEN:
+        return JSONResponse({"erro": "Não encontrado"}, status_code=404)
+    if not metricas.autorizado(request.headers.get("Authorization")):
+        return JSONResponse({"erro": "Não autorizado"}, status_code=401)
+    return Response(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+async def gerar_plano(request):
+    # 🔐 Verificação de autenticação com chave de API
+    with metricas.medir_etapa("auth"):
+        autorizado = request.headers.get("API_KEY") == API_KEY
+    if not autorizado:
+        return JSONResponse({"erro": "Não autorizado"}, status_code=401)
+
+    # 🔎 Extrai e valida os dados do corpo da requisição antes de qualquer cálculo
+    try:
+        corpo = await request.body()
+        with metricas.medir_etapa("parse"):
+            pedido = validar_pedido(decodificar(corpo))
+    except PedidoInvalido as e:
+        return resposta_json({"erro": "Requisição inválida", "detalhes": e.erros}, 400)
+    except ValueError as e:
+        return resposta_json({"erro": f"JSON inválido: {e}"}, 400)
+
+    # 🚦 Backpressure: sem vaga no executor, o cliente tenta de novo depois
+    admissao = request.app.state.admissao
+    if not admissao.tentar_entrar():
+        return resposta_json(
+            {"erro": "Servidor ocupado, tente novamente"}, 503,
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        if "application/x-ndjson" in request.headers.get("Accept", "") or request.query_params.get("stream") in ("1", "true"):
+            # 🌊 NDJSON (ver main.py): a primeira linha sai do executor, para
+            # erros ainda virarem 504/500; as refeições seguem conforme ficam prontas
+            linhas = await loop.run_in_executor(request.app.state.executor, _iniciar_fluxo, pedido.para_dict())
+            return StreamingResponse(linhas, media_type="application/x-ndjson")
+        corpo = await loop.run_in_executor(request.app.state.executor, _montar_resposta, pedido.para_dict())
+        return Response(corpo, media_type="application/json")
+    except TempoEsgotado as e:
+        return resposta_json({"erro": str(e)}, 504)
+    except Exception as e:
+        return resposta_json({"erro": str(e)}, 500)
+    finally:
+        admissao.sair()
+
+
+async def ajustar_plano(request):
+    # 🔐 Verificação de autenticação com chave de API
+    if request.headers.get("API_KEY") != API_KEY:
+        return JSONResponse({"erro": "Não autorizado"}, status_code=401)
+
+    try:
+        corpo = await request.body()
+        with metricas.medir_etapa("parse"):
+            delta = decodificar(corpo)
+    except ValueError as e:
+        return resposta_json({"erro": f"JSON inválido: {e}"}, 400)
+
+    admissao = request.app.state.admissao
+    if not admissao.tentar_entrar():
+        return resposta_json(
+            {"erro": "Servidor ocupado, tente novamente"}, 503,
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+    try:
+        # ✏️ Aplica o delta recalculando só as refeições afetadas
+        loop = asyncio.get_running_loop()
+        corpo = await loop.run_in_executor(
+            request.app.state.executor, _replanejar, request.path_params["plano_id"], delta)
+        return Response(corpo, media_type="application/json")
+    except PlanoNaoEncontrado:
+        return resposta_json({"erro": "Plano não encontrado ou expirado"}, 404)
+    except PedidoInvalido as e:
+        return resposta_json({"erro": "Requisição inválida", "detalhes": e.erros}, 400)
+    except TempoEsgotado as e:
+        return resposta_json({"erro": str(e)}, 504)
+    except Exception as e:
+        return resposta_json({"erro": str(e)}, 500)
+    finally:
+        admissao.sair()
+
+
+class MedirRequisicao:
+    """Middleware ASGI que registra a latência total em ``metricas``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # O roteador preenche path_params: "/planos/abc" conta como "/planos/<plano_id>"
+            rota = scope["path"]
+            for nome, valor in scope.get("path_params", {}).items():
+                rota = rota.replace(str(valor), f"<{nome}>")
+            metricas.registrar_requisicao(rota, status, time.perf_counter() - inicio)
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    aquecimento.iniciar()
+    app.state.admissao = Admissao(EXECUTOR_THREADS + FILA_MAX)
+    app.state.executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="plano")
+    try:
+        yield
+    finally:
+        # 🛑 Desligamento gracioso: termina o que já foi aceito, recusa o resto
+        await app.state.admissao.drenar(DESLIGAMENTO_S)
+        app.state.executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/", home, methods=["GET"]),
+        Route("/pronto", pronto, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/gerarPlano", gerar_plano, methods=["POST"]),
+        Route("/planos/{plano_id}", ajustar_plano, methods=["PATCH"]),
+    ],
+    middleware=[
+        Middleware(MedirRequisicao),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=ciclo_de_vida,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=10000, timeout_graceful_shutdown=int(DESLIGAMENTO_S))
@@ -0,0 +1,330 @@
+# metricas.py
+# Métricas por etapa da requisição (contadores e histogramas) no formato
+# texto do Prometheus, agregadas entre os workers do gunicorn.
+#
+# Cada processo escreve em um arquivo próprio (NUTRI_METRICAS_DIR/metricas_<pid>.bin)
+# mapeado com mmap; o /metrics soma os arquivos de todos os processos. Sem
+# NUTRI_METRICAS_DIR as métricas ficam só na memória do processo. Cada
+# processo novo recolhe os arquivos de processos mortos em
+# metricas_acumulado.bin, para os contadores não voltarem e o diretório não
+# crescer a cada reinício de worker.
+#
+# O /metrics só responde com NUTRI_METRICAS_TOKEN definido, e exige
+# "Authorization: Bearer <token>".
+
+import fcntl
+import glob
+import hmac
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+DIRETORIO = os.environ.get("NUTRI_METRICAS_DIR")
+TOKEN = os.environ.get("NUTRI_METRICAS_TOKEN")
+ACUMULADO = "metricas_acumulado.bin"
+
+ROTAS = ("/", "/gerarPlano", "/gerarPlanos", "/exportarPlanos", "/planos/<plano_id>", "/pronto", "/metrics", "outra")
+CLASSES_STATUS = ("2xx", "4xx", "5xx")
+ETAPAS = ("auth", "parse", "plano", "solver", "serializacao", "escrita")
+BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _layout():
+    """Posição fixa de cada série no vetor de floats (igual em todos os processos)."""
+    posicoes = {}
+    proxima = 0
+    for rota in ROTAS:
+        for classe in CLASSES_STATUS:
+            posicoes[("requisicoes", rota, classe)] = proxima
+            proxima += 1
+    # Histograma: um contador por bucket (+Inf incluso), soma e contagem
+    for rota in ROTAS:
+        posicoes[("latencia", rota)] = proxima
+        proxima += len(BUCKETS_S) + 3
+    for etapa in ETAPAS:
+        posicoes[("etapa", etapa)] = proxima
+        proxima += len(BUCKETS_S) + 3
+    return posicoes, proxima
+
+
+POSICOES, TAMANHO = _layout()
+
+
+class _Armazenamento:
+    """Vetor de floats do processo atual, reaberto após um fork."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._valores = None
+
+    def valores(self):
+        if self._pid != os.getpid():
+            self._abrir()
+        return self._valores
+
+    def _abrir(self):
+        self._pid = os.getpid()
+        if not DIRETORIO:
+            self._valores = array("d", bytes(8 * TAMANHO))
+            return
+        os.makedirs(DIRETORIO, exist_ok=True)
+        recolher_mortos(DIRETORIO)
+        caminho = os.path.join(DIRETORIO, f"metricas_{self._pid}.bin")
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(bytes(8 * TAMANHO))
+        with open(caminho, "r+b") as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 8 * TAMANHO)
+        self._valores = memoryview(self._mapa).cast("d")
+
+    def somar(self, *pares) -> None:
+        """Soma cada (posição, valor) sob um único lock."""
+        with self._lock:
+            valores = self.valores()
+            for posicao, valor in pares:
+                valores[posicao] += valor
+
+
+_ARMAZENAMENTO = _Armazenamento()
+
+
+@contextmanager
+def _trava_diretorio(diretorio: str, modo: int) -> Iterator[None]:
+    """Leitura do /metrics (compartilhada) contra o recolhimento (exclusiva)."""
+    with open(os.path.join(diretorio, "metricas.lock"), "a") as trava:
+        fcntl.flock(trava, modo)
+        yield
+
+
+def _vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recolher_mortos(diretorio: str) -> int:
+    """Soma os arquivos de processos mortos em ``ACUMULADO`` e os apaga; retorna quantos."""
+    with _trava_diretorio(diretorio, fcntl.LOCK_EX):
+        mortos = []
+        for caminho in glob.glob(os.path.join(diretorio, "metricas_*.bin")):
+            try:
+                pid = int(os.path.basename(caminho)[len("metricas_"):-len(".bin")])
+            except ValueError:
+                continue  # o próprio acumulado
+            if pid != os.getpid() and not _vivo(pid):
+                mortos.append(caminho)
+        if not mortos:
+            return 0
+        acumulado = os.path.join(diretorio, ACUMULADO)
+        total = _ler(acumulado) or array("d", bytes(8 * TAMANHO))
+        for caminho in mortos:
+            valores = _ler(caminho)
+            if valores is not None:
+                for i, valor in enumerate(valores):
+                    total[i] += valor
+        temporario = f"{acumulado}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(total.tobytes())
+        os.replace(temporario, acumulado)
+        for caminho in mortos:
+            os.remove(caminho)
+        return len(mortos)
+
+
+def _ler(caminho: str) -> Optional[array]:
+    """Vetor gravado em ``caminho``, ou None se não existe ou é de outro layout."""
+    try:
+        with open(caminho, "rb") as arquivo:
+            dados = arquivo.read()
+    except FileNotFoundError:
+        return None
+    if len(dados) != 8 * TAMANHO:
+        return None
+    return array("d", dados)
+
+
+def autorizado(authorization: Optional[str]) -> bool:
+    """True se o cabeçalho Authorization traz o ``TOKEN`` do /metrics."""
+    if not TOKEN or not authorization or not authorization.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(authorization[len("Bearer "):].encode(), TOKEN.encode())
+
+
+def _observacao_histograma(base: int, segundos: float):
+    bucket = next((i for i, limite in enumerate(BUCKETS_S) if segundos <= limite), len(BUCKETS_S))
+    return (base + bucket, 1), (base + len(BUCKETS_S) + 1, segundos), (base + len(BUCKETS_S) + 2, 1)
+
+
+def _rota(rota: str) -> str:
+    return rota if rota in ROTAS else "outra"
+
+
+def registrar_requisicao(rota: str, status: int, segundos: float) -> None:
+    rota = _rota(rota)
+    classe = f"{min(max(status // 100, 2), 5)}xx"
+    _ARMAZENAMENTO.somar(
+        (POSICOES[("requisicoes", rota, classe)], 1),
+        *_observacao_histograma(POSICOES[("latencia", rota)], segundos),
+    )
+
+
+def observar_etapa(etapa: str, segundos: float) -> None:
+    _ARMAZENAMENTO.somar(*_observacao_histograma(POSICOES[("etapa", etapa)], segundos))
+
+
+@contextmanager
+def medir_etapa(etapa: str) -> Iterator[None]:
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar_etapa(etapa, time.perf_counter() - inicio)
+
+
+def _agregado():
+    """Soma dos vetores de todos os processos (ou só do atual, sem diretório)."""
+    if not DIRETORIO:
+        return array("d", _ARMAZENAMENTO.valores())
+    total = array("d", bytes(8 * TAMANHO))
+    with _trava_diretorio(DIRETORIO, fcntl.LOCK_SH):
+        for caminho in glob.glob(os.path.join(DIRETORIO, "metricas_*.bin")):
+            valores = _ler(caminho)
+            if valores is None:
+                continue  # arquivo de outra versão do layout
+            for i, valor in enumerate(valores):
+                total[i] += valor
+    return total
+
+
+def _formatar_histograma(linhas, nome: str, rotulo: str, base: int, valores) -> None:
+    acumulado = 0.0
+    for i, limite in enumerate(BUCKETS_S):
+        acumulado += valores[base + i]
+        linhas.append(f'{nome}_bucket{{{rotulo},le="{limite}"}} {acumulado:g}')
+    acumulado += valores[base + len(BUCKETS_S)]
+    linhas.append(f'{nome}_bucket{{{rotulo},le="+Inf"}} {acumulado:g}')
+    linhas.append(f"{nome}_sum{{{rotulo}}} {valores[base + len(BUCKETS_S) + 1]:.6f}")
+    linhas.append(f"{nome}_count{{{rotulo}}} {valores[base + len(BUCKETS_S) + 2]:g}")
+
+
+def exportar() -> str:
+    """Métricas de todos os workers no formato texto do Prometheus."""
+    valores = _agregado()
+    linhas = [
+        "# HELP nutri_requisicoes_total Requisições atendidas por rota e classe de status.",
+        "# TYPE nutri_requisicoes_total counter",
+    ]
+    for rota in ROTAS:
+        for classe in CLASSES_STATUS:
+            valor = valores[POSICOES[("requisicoes", rota, classe)]]
+            linhas.append(f'nutri_requisicoes_total{{rota="{rota}",status="{classe}"}} {valor:g}')
+    linhas += [
+        "# HELP nutri_requisicao_segundos Latência total da requisição por rota.",
+        "# TYPE nutri_requisicao_segundos histogram",
+    ]
+    for rota in ROTAS:
+        _formatar_histograma(linhas, "nutri_requisicao_segundos", f'rota="{rota}"', POSICOES[("latencia", rota)], valores)
+    linhas += [
+        "# HELP nutri_etapa_segundos Duração de cada etapa da requisição.",
+        "# TYPE nutri_etapa_segundos histogram",
+    ]
+    for etapa in ETAPAS:
+        _formatar_histograma(linhas, "nutri_etapa_segundos", f'etapa="{etapa}"', POSICOES[("etapa", etapa)], valores)
+    return "\n".join(linhas) + "\n"
+
+
+# --- Profiler por amostragem (opcional) ----------------------------------
+
+class ProfilerAmostragem:
+    """Amostra as pilhas das threads com requisição ativa.
+
+    Ligado por NUTRI_PROFILER_LIMIAR_MS: requisições mais lentas que o
+    limiar têm suas pilhas gravadas em NUTRI_PROFILER_DIR no formato
+    "folded" (uma pilha por linha + contagem), pronto para o flamegraph.pl
+    ou o speedscope.
+    """
+
+    def __init__(self, limiar_s: float, diretorio: str, intervalo_s: float = 0.005):
+        self.limiar_s = limiar_s
+        self.diretorio = diretorio
+        self.intervalo_s = intervalo_s
+        self._ativas: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def _garantir_thread(self):
+        # Threads não sobrevivem ao fork: recria no worker (chamado com o lock)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._amostrar, name="profiler-amostragem", daemon=True)
+            self._thread.start()
+
+    def _amostrar(self):
+        while True:
+            time.sleep(self.intervalo_s)
+            with self._lock:
+                ativas = list(self._ativas.items())
+            if not ativas:
+                continue
+            quadros = sys._current_frames()
+            amostras = []
+            for ident, pilhas in ativas:
+                quadro = quadros.get(ident)
+                if quadro is None:
+                    continue
+                nomes = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    nomes.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{quadro.f_lineno})")
+                    quadro = quadro.f_back
+                amostras.append((ident, pilhas, ";".join(reversed(nomes))))
+            # Conta sob o lock e só se a requisição ainda está ativa: depois
+            # do pop em finalizar ninguém mais escreve no Counter dela
+            with self._lock:
+                for ident, pilhas, pilha in amostras:
+                    if self._ativas.get(ident) is pilhas:
+                        pilhas[pilha] += 1
+
+    def iniciar(self) -> None:
+        with self._lock:
+            self._garantir_thread()
+            self._ativas[threading.get_ident()] = Counter()
+
+    def finalizar(self, rota: str, segundos: float) -> Optional[str]:
+        with self._lock:
+            pilhas = self._ativas.pop(threading.get_ident(), None)
+            contagens = pilhas.most_common() if pilhas and segundos >= self.limiar_s else None
+        if not contagens:
+            return None
+        os.makedirs(self.diretorio, exist_ok=True)
+        # Rotas como /planos/<id> viram um só componente de nome de arquivo
+        rota = re.sub(r"[^A-Za-z0-9_-]+", "_", rota.strip("/")) or "raiz"
+        nome = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{rota}_{int(segundos * 1000)}ms.folded"
+        caminho = os.path.join(self.diretorio, nome)
+        with open(caminho, "w") as arquivo:
+            for pilha, contagem in contagens:
+                arquivo.write(f"{pilha} {contagem}\n")
+        return caminho
+
+
+def _criar_profiler() -> Optional[ProfilerAmostragem]:
+    limiar_ms = os.environ.get("NUTRI_PROFILER_LIMIAR_MS")
+    if not limiar_ms:
+        return None
+    return ProfilerAmostragem(float(limiar_ms) / 1000, os.environ.get("NUTRI_PROFILER_DIR", "perfis"))
+
+
+PROFILER = _criar_profiler()
+
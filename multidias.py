@@ -0,0 +1,143 @@
+# multidias.py
+# Planos de vários dias (configuracoes.dias): o dia base é replicado e, em
+# cada dia, os alimentos dos grupos de get_substitution_rules() giram entre
+# os equivalentes do grupo, sem repetir a mesma proteína dentro do intervalo
+# pedido. No modo otimizado todos os dias vão juntos para otimizar_dias.
+
+import copy
+from typing import Any, Dict, Generator, List, Tuple
+
+from database import COLUNAS_NUTRIENTES, get_food_data, get_substitution_rules
+from indice_substituicoes import equivalentes
+from otimizador import otimizar_dias
+from resolvedor import resolver_chave
+from totais import VetorPlano, calcular_totais, formatar_totais
+from validacao import DIAS_MAX
+
+GRUPO_PROTEINA = "proteina_animal"
+INTERVALO_PROTEINA_PADRAO = 1
+
+
+def _grupos() -> Dict[str, Tuple[str, str, List[str]]]:
+    """chave -> (grupo, macro base, alimentos do grupo) para as chaves do catálogo."""
+    catalogo = get_food_data()
+    grupos = {}
+    for nome, regra in get_substitution_rules().items():
+        alimentos = [chave for chave in regra["alimentos"] if chave in catalogo]
+        for chave in alimentos:
+            grupos[chave] = (nome, regra.get("macro_base", "kcal"), alimentos)
+    return grupos
+
+
+GRUPOS = _grupos()
+
+
+def _multiplicador(nutrientes, origem: str, destino: str, macro: str) -> float:
+    """Gramas de ``destino`` por grama de ``origem`` mantendo ``macro``."""
+    i = COLUNAS_NUTRIENTES.index(macro)
+    if nutrientes[origem][i] > 0 and nutrientes[destino][i] > 0:
+        return nutrientes[origem][i] / nutrientes[destino][i]
+    return nutrientes[origem][0] / nutrientes[destino][0] if nutrientes[destino][0] else 1.0
+
+
+def rotacionar(base: List[Dict[str, Any]], dias: int, intervalo_proteina: int) -> Tuple[List[List[Dict[str, Any]]], int]:
+    """Gera ``dias`` cópias de ``base`` com os alimentos dos grupos em rodízio.
+
+    Cada posição (refeição, alimento) avança um passo no seu grupo por dia.
+    Um dia nunca repete o mesmo alimento de grupo, e uma proteína usada não
+    volta antes de ``intervalo_proteina`` dias; quando não há opção livre, a
+    proteína usada há mais tempo é escolhida e a repetição é contada.
+    Retorna (dias, repetições de proteína).
+    """
+    catalogo = get_food_data()
+    nutrientes = {}
+    ultimo_uso = {}
+    repeticoes = 0
+    resultado = []
+    for d in range(dias):
+        dia = copy.deepcopy(base)
+        usados = set()
+        for refeicao in dia:
+            for item in refeicao["alimentos"]:
+                chave = resolver_chave(item["alimento"])
+                if chave not in GRUPOS:
+                    continue
+                grupo, macro, alimentos = GRUPOS[chave]
+                inicio = (alimentos.index(chave) + d) % len(alimentos)
+                ordem = [opcao for opcao in alimentos[inicio:] + alimentos[:inicio] if opcao not in usados] or alimentos
+                if grupo == GRUPO_PROTEINA:
+                    livres = [opcao for opcao in ordem if d - ultimo_uso.get(opcao, -DIAS_MAX) > intervalo_proteina]
+                    if livres:
+                        escolhido = livres[0]
+                    else:
+                        escolhido = min(ordem, key=lambda opcao: ultimo_uso.get(opcao, -DIAS_MAX))
+                        repeticoes += 1
+                    ultimo_uso[escolhido] = d
+                else:
+                    escolhido = ordem[0]
+                usados.add(escolhido)
+                if escolhido != chave:
+                    for opcao in (chave, escolhido):
+                        if opcao not in nutrientes:
+                            nutrientes[opcao] = tuple(catalogo[opcao][nome] for nome in COLUNAS_NUTRIENTES)
+                    item["alimento"] = escolhido
+                    item["quantidade_g"] = round(item["quantidade_g"] * _multiplicador(nutrientes, chave, escolhido, macro))
+        resultado.append(dia)
+    return resultado, repeticoes
+
+
+def calcular_dias_em_fluxo(base: List[Dict[str, Any]], dados: Dict[str, Any]) -> Generator[tuple, None, Dict[str, Any]]:
+    """Núcleo de um plano de vários dias (mesmo formato do de um dia + ``dias``).
+
+    Gerador: produz ``("refeicao", dia, indice, refeicao)`` assim que cada
+    refeição tem totais e equivalentes e ``("dia", dia, totais_dia)`` ao fim
+    de cada dia, e retorna o núcleo. No modo otimizado todos os dias saem do
+    mesmo solve, então nada é produzido antes dele.
+
+    ``refeicoes``/``totais_refeicoes`` são as do primeiro dia, para clientes
+    que só leem um dia; ``totais_dia`` é a média diária do período.
+    """
+    metas = dados.get("metas", {})
+    configuracoes = dados.get("configuracoes", {})
+    peso = dados.get("paciente", {}).get("peso_kg", 0)
+    num_dias = configuracoes.get("dias", 1)
+    intervalo = configuracoes.get("intervalo_proteina_dias", INTERVALO_PROTEINA_PADRAO)
+
+    dias, repeticoes = rotacionar(base, num_dias, intervalo)
+
+    otimizacao = None
+    if configuracoes.get("modo", "padrao") == "otimizado":
+        otimizacao = otimizar_dias(dias, metas, peso, configuracoes)
+
+    # Um único vetor CSR com as refeições de todos os dias, uma a uma
+    vetor = VetorPlano()
+    totais_refeicoes = []
+    totais_periodo = [0.0] * len(COLUNAS_NUTRIENTES)
+    saida = []
+    for d, refeicoes in enumerate(dias):
+        totais_dia = [0.0] * len(COLUNAS_NUTRIENTES)
+        for indice, refeicao in enumerate(refeicoes):
+            vetor.adicionar_refeicao(refeicao.get("nome", ""), refeicao.get("alimentos", []))
+            (totais,), _ = calcular_totais(vetor, a_partir=len(totais_refeicoes))
+            totais_refeicoes.append(totais)
+            refeicao["totais"] = formatar_totais(totais)
+            refeicao["equivalentes"] = equivalentes(refeicao["alimentos"])
+            totais_dia = [a + b for a, b in zip(totais_dia, totais)]
+            totais_periodo = [a + b for a, b in zip(totais_periodo, totais)]
+            yield "refeicao", d + 1, indice, refeicao
+        saida.append({"dia": d + 1, "refeicoes": refeicoes, "totais_dia": totais_dia})
+        yield "dia", d + 1, totais_dia
+
+    return {
+        "refeicoes": saida[0]["refeicoes"],
+        "totais_refeicoes": [list(totais) for totais in totais_refeicoes[:len(base)]],
+        "totais_dia": [total / num_dias for total in totais_periodo],
+        "dias": saida,
+        "variedade": {"intervalo_proteina_dias": intervalo, "repeticoes_proteina": repeticoes},
+        "alimentos_nao_resolvidos": sorted(set(vetor.nao_resolvidos)),
+        "alimentos_aproximados": {
+            nome: {"chave": chave, "confianca": confianca}
+            for nome, (chave, confianca) in vetor.aproximados.items()
+        },
+        "otimizacao": otimizacao
+    }
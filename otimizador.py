@@ -0,0 +1,542 @@
+# otimizador.py
+# Otimizador de porções (MILP via PuLP/CBC): ajusta as gramas dos alimentos
+# dos templates de refeição para bater as metas do paciente.
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from database import COLUNAS_NUTRIENTES, get_food_data
+from resolvedor import resolver_chave
+from templates_refeicoes import TEMPLATES, TemplateInvalido
+from metricas import observar_etapa
+
+# Passo das porções em gramas (as variáveis do MILP são inteiras em porções)
+PASSO_G = 5
+# Limites de cada alimento em relação ao qtd_base do template
+FATOR_MIN = 0.25
+FATOR_MAX = 3.0
+
+TEMPO_LIMITE_PADRAO_S = float(os.environ.get("NUTRI_SOLVER_TIMEOUT", "2"))
+TEMPO_LIMITE_MAX_S = float(os.environ.get("NUTRI_SOLVER_TIMEOUT_MAX", "5"))
+
+# Limita quantos CBC rodam ao mesmo tempo por worker: com --threads 4 o
+# gunicorn poderia disparar 4 solvers disputando a mesma CPU.
+SOLVERS_SIMULTANEOS = int(os.environ.get("NUTRI_SOLVERS_SIMULTANEOS", "1"))
+_SOLVERS_SIMULTANEOS = threading.BoundedSemaphore(SOLVERS_SIMULTANEOS)
+
+# O PuLP só é importado no primeiro solve (ou pelo aquecimento): só o modo
+# otimizado usa, e o import pesa na partida a frio.
+pulp = None
+_pulp_lock = threading.Lock()
+
+
+def carregar_solver():
+    """Importa o PuLP uma única vez por processo e o devolve."""
+    global pulp
+    if pulp is None:
+        with _pulp_lock:
+            if pulp is None:
+                import pulp as modulo
+                pulp = modulo
+    return pulp
+
+
+# Quais templates compõem o dia para cada número de refeições
+SEQUENCIA_REFEICOES = {
+    3: [("cafe_manha", "padrao"), ("almoco", "tradicional"), ("jantar", "leve")],
+    4: [("cafe_manha", "padrao"), ("almoco", "tradicional"), ("lanche", "proteico"), ("jantar", "leve")],
+    5: [("cafe_manha", "padrao"), ("almoco", "tradicional"), ("lanche", "proteico"), ("jantar", "leve"), ("ceia", "leve")],
+}
+
+# Pesos das folgas na função objetivo (kcal de desvio equivalentes)
+PESO_KCAL = 1.0
+PESO_PROTEINA = 40.0
+PESO_FIBRAS = 20.0
+PESO_CARBO = 4.0
+PESO_GORDURA = 9.0
+PESO_DESVIO_TEMPLATE = 0.05
+
+# Alternativas (configuracoes.alternativas): custo de trocar um alimento do
+# template por outro do mesmo grupo e quantos alimentos, no mínimo, separam
+# duas alternativas entre si
+PESO_TROCA = 2.0
+TROCAS_MIN_ALTERNATIVAS = 2
+# Cada solve de alternativa para quando a solução está a até esta distância
+# do limite inferior (kcal equivalentes), sem provar o ótimo
+GAP_ABS_ALTERNATIVAS = 5.0
+
+
+def refeicoes_template(num_refeicoes: int, kcal_alvo: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Refeições do dia a partir dos templates compilados.
+
+    Com ``kcal_alvo`` todos os templates do dia são escalados pelo mesmo
+    fator para que a soma das quantidades base bata a meta de kcal; é desse
+    ponto que o solver parte (warm start e limites das porções).
+    """
+    n = min(max(num_refeicoes, 3), 5)
+    # Templates que não compilaram contra o catálogo carregado ficam de fora
+    templates = [TEMPLATES[chave] for chave in SEQUENCIA_REFEICOES[n] if chave in TEMPLATES]
+    if not templates:
+        raise TemplateInvalido("nenhum template de refeição disponível no catálogo carregado")
+    fator = 1.0
+    if kcal_alvo:
+        kcal_base = sum(template.macros_base[0] for template in templates)
+        fator = kcal_alvo / kcal_base if kcal_base else 1.0
+    return [template.refeicao(fator) for template in templates]
+
+
+def _tempo_limite(configuracoes: Dict[str, Any]) -> float:
+    pedido = configuracoes.get("tempo_limite_solver_s", TEMPO_LIMITE_PADRAO_S)
+    return min(max(float(pedido), 0.1), TEMPO_LIMITE_MAX_S)
+
+
+def _vaga_no_prazo(prazo: float) -> Optional[float]:
+    """Ocupa uma vaga de ``_SOLVERS_SIMULTANEOS`` até ``prazo`` (monotônico).
+
+    Retorna o tempo que sobra para o solver, ou None (sem vaga ocupada) se
+    a espera pela vaga consumiu o prazo inteiro: a espera conta no mesmo
+    tempo limite do pedido, não antes dele.
+    """
+    if not _SOLVERS_SIMULTANEOS.acquire(timeout=max(prazo - time.monotonic(), 0)):
+        return None
+    restante = prazo - time.monotonic()
+    if restante <= 0:
+        _SOLVERS_SIMULTANEOS.release()
+        return None
+    return restante
+
+
+def otimizar_porcoes(refeicoes: List[Dict[str, Any]], metas: Dict[str, Any], peso: float,
+                     configuracoes: Dict[str, Any], fixos: Sequence[float] = (0, 0, 0, 0, 0)) -> Dict[str, Any]:
+    """Resolve as gramas de cada alimento das refeições para bater as metas.
+
+    As metas (kcal, proteína mínima, % máximo de carboidrato e gordura,
+    fibras mínimas) entram como restrições com folga penalizada, então o
+    problema é sempre viável. O solver parte das quantidades do template
+    (warm start) e respeita um tempo limite por requisição; se não houver
+    solução dentro do limite, as quantidades do template são mantidas.
+
+    ``fixos`` são os totais (kcal, p, c, g, f) de refeições que ficam fora do
+    problema com quantidades fixas; as metas continuam sendo as do dia, então
+    ``refeicoes`` são resolvidas contra o orçamento que sobra.
+
+    Altera ``quantidade_g`` em ``refeicoes`` e retorna o status da otimização.
+    """
+    inicio = time.perf_counter()
+    prazo = time.monotonic() + _tempo_limite(configuracoes)
+
+    restante = _vaga_no_prazo(prazo)
+    if restante is None:
+        return {"status": "ocupado", "fallback": True, "tempo_s": round(time.perf_counter() - inicio, 3)}
+    try:
+        inicio_solver = time.perf_counter()
+        status, valores = _resolver(refeicoes, metas, peso, restante, fixos)
+        observar_etapa("solver", time.perf_counter() - inicio_solver)
+    finally:
+        _SOLVERS_SIMULTANEOS.release()
+
+    fallback = valores is None
+    if not fallback:
+        for refeicao, porcoes in zip(refeicoes, valores):
+            for item, quantidade in zip(refeicao["alimentos"], porcoes):
+                item["quantidade_g"] = quantidade
+    return {"status": status, "fallback": fallback, "tempo_s": round(time.perf_counter() - inicio, 3)}
+
+
+def otimizar_dias(dias: List[List[Dict[str, Any]]], metas: Dict[str, Any], peso: float,
+                  configuracoes: Dict[str, Any]) -> Dict[str, Any]:
+    """Versão de ``otimizar_porcoes`` para vários dias com as mesmas metas.
+
+    Cada dia entra como um bloco independente do mesmo problema (metas e
+    folgas por dia), resolvido como LP e arredondado dia a dia por
+    ``_arredondar_dia``; o CBC é disparado uma vez por bloco de dias em vez
+    de uma vez por dia e, com mais de uma CPU, os blocos rodam em paralelo.
+    A matriz de nutrientes dos alimentos usados é montada uma vez e
+    compartilhada por todos os blocos. O pedido inteiro ocupa uma vaga de
+    ``_SOLVERS_SIMULTANEOS`` e respeita um único tempo limite.
+
+    Altera ``quantidade_g`` em ``dias``; dias de um bloco sem solução mantêm
+    as quantidades de entrada.
+    """
+    inicio = time.perf_counter()
+    prazo = time.monotonic() + _tempo_limite(configuracoes)
+    nutrientes = _matriz_nutrientes(refeicao for refeicoes in dias for refeicao in refeicoes)
+
+    processos = min(_processos_dias(), len(dias))
+    tamanho = -(-len(dias) // processos)
+    blocos = [dias[i:i + tamanho] for i in range(0, len(dias), tamanho)]
+
+    restante = _vaga_no_prazo(prazo)
+    if restante is None:
+        return {"status": "ocupado", "fallback": True, "blocos": len(blocos),
+                "tempo_s": round(time.perf_counter() - inicio, 3)}
+    try:
+        inicio_solver = time.perf_counter()
+
+        def resolver_bloco(bloco):
+            return _resolver_dias(bloco, metas, peso, restante, nutrientes=nutrientes, relaxado=True)
+
+        if len(blocos) == 1:
+            resultados = [resolver_bloco(blocos[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(blocos)) as executor:
+                resultados = list(executor.map(resolver_bloco, blocos))
+        observar_etapa("solver", time.perf_counter() - inicio_solver)
+    finally:
+        _SOLVERS_SIMULTANEOS.release()
+
+    estados = []
+    for bloco, (status, valores) in zip(blocos, resultados):
+        estados.append(status)
+        if valores is None:
+            continue
+        for refeicoes, valores_dia in zip(bloco, valores):
+            for refeicao, porcoes in zip(refeicoes, valores_dia):
+                for item, quantidade in zip(refeicao["alimentos"], porcoes):
+                    item["quantidade_g"] = quantidade
+
+    fallback = any(valores is None for _, valores in resultados)
+    status = "otimo" if all(estado == "otimo" for estado in estados) else next(
+        estado for estado in estados if estado != "otimo")
+    return {"status": status, "fallback": fallback, "blocos": len(blocos),
+            "tempo_s": round(time.perf_counter() - inicio, 3)}
+
+
+def otimizar_alternativas(refeicoes: List[Dict[str, Any]], opcoes, nutrientes: Dict[str, Tuple[float, ...]],
+                          metas: Dict[str, Any], peso: float, configuracoes: Dict[str, Any],
+                          quantidade: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Até ``quantidade`` soluções diferentes do mesmo problema de porções.
+
+    ``opcoes[r][a]`` lista os alimentos possíveis do item ``a`` da refeição
+    ``r`` como (chave, quantidade base em g), o próprio alimento primeiro, ou
+    None para itens fora do catálogo; ``nutrientes`` cobre todas as chaves.
+    O modelo é montado uma vez e resolvido de novo a cada alternativa, com um
+    corte de diversidade a cada solução encontrada: a próxima precisa trocar
+    pelo menos ``TROCAS_MIN_ALTERNATIVAS`` alimentos em relação a cada uma
+    das anteriores. Todas as alternativas dividem uma vaga de
+    ``_SOLVERS_SIMULTANEOS`` e o tempo limite do pedido.
+
+    Retorna (alternativas, status); cada alternativa traz ``escolhas``
+    (por refeição, (chave, gramas) de cada item ou None) e ``objetivo``.
+    Com menos opções de troca do que o pedido, voltam menos alternativas.
+    """
+    inicio = time.perf_counter()
+    prazo = time.monotonic() + _tempo_limite(configuracoes)
+
+    if _vaga_no_prazo(prazo) is None:
+        return [], {"status": "ocupado", "fallback": True, "tempo_s": round(time.perf_counter() - inicio, 3)}
+    alternativas = []
+    status = "otimo"
+    try:
+        inicio_solver = time.perf_counter()
+        carregar_solver()
+        prob, variaveis = _modelo_alternativas(refeicoes, opcoes, nutrientes, metas, peso)
+        com_troca = [candidatos for porcoes_refeicao in variaveis for candidatos in porcoes_refeicao
+                     if candidatos is not None and len(candidatos) > 1]
+        while len(alternativas) < quantidade:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                status = "tempo_limite"
+                break
+            prob.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=restante, warmStart=True, threads=1,
+                                         gapAbs=GAP_ABS_ALTERNATIVAS))
+            if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                # Infactível depois dos cortes: não há mais combinações
+                if prob.sol_status != pulp.LpSolutionInfeasible:
+                    status = "tempo_limite"
+                break
+            if prob.sol_status != pulp.LpSolutionOptimal:
+                status = "tempo_limite"
+
+            escolhas = [
+                [None if candidatos is None else _escolha(candidatos) for candidatos in porcoes_refeicao]
+                for porcoes_refeicao in variaveis
+            ]
+            alternativas.append({"escolhas": escolhas, "objetivo": round(pulp.value(prob.objective), 2)})
+            if not com_troca:
+                break
+
+            # Corte de diversidade: pelo menos TROCAS_MIN itens com troca usam
+            # alimentos fora dos desta solução (trocar dois de lugar não conta)
+            usados = {_escolha(candidatos)[0] for candidatos in com_troca}
+            repetidos = [y for candidatos in com_troca for chave, _, y in candidatos if chave in usados]
+            prob += pulp.lpSum(repetidos) <= len(com_troca) - min(TROCAS_MIN_ALTERNATIVAS, len(com_troca))
+        observar_etapa("solver", time.perf_counter() - inicio_solver)
+    finally:
+        _SOLVERS_SIMULTANEOS.release()
+
+    return alternativas, {"status": status, "fallback": not alternativas, "alternativas": len(alternativas),
+                          "tempo_s": round(time.perf_counter() - inicio, 3)}
+
+
+def _escolha(candidatos) -> Tuple[str, int]:
+    """(chave, gramas) da opção ligada na solução atual."""
+    chave, x, _ = max(candidatos, key=lambda candidato: pulp.value(candidato[2]))
+    return chave, int(round(x.value())) * PASSO_G
+
+
+def _processos_dias() -> int:
+    configurado = os.environ.get("NUTRI_DIAS_PROCESSOS")
+    if configurado:
+        return max(int(configurado), 1)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _matriz_nutrientes(refeicoes) -> Dict[str, Tuple[float, ...]]:
+    """chave -> (kcal, p, c, g, f) por grama dos alimentos das refeições."""
+    catalogo = get_food_data()
+    matriz = {}
+    for refeicao in refeicoes:
+        for item in refeicao["alimentos"]:
+            chave = resolver_chave(item["alimento"])
+            if chave is not None and chave not in matriz:
+                alimento = catalogo[chave]
+                matriz[chave] = tuple(alimento[nome] for nome in COLUNAS_NUTRIENTES)
+    return matriz
+
+
+def _resolver(refeicoes, metas, peso, tempo_limite, fixos=(0, 0, 0, 0, 0)):
+    status, valores = _resolver_dias([refeicoes], metas, peso, tempo_limite, [fixos])
+    return status, None if valores is None else valores[0]
+
+
+def _adicionar_dia(prob, refeicoes, metas, peso, fixos, nutrientes, prefixo, categoria=None):
+    """Variáveis e restrições de um dia; retorna (variáveis, termos do objetivo)."""
+    if categoria is None:
+        categoria = pulp.LpInteger
+    variaveis = []
+    desvios = []
+    totais = list(fixos)
+    for r, refeicao in enumerate(refeicoes):
+        porcoes_refeicao = []
+        for a, item in enumerate(refeicao["alimentos"]):
+            chave = resolver_chave(item["alimento"])
+            if chave is None:
+                # Fora do catálogo: mantém a quantidade original
+                porcoes_refeicao.append(None)
+                continue
+            base = item["quantidade_g"] / PASSO_G
+            x = pulp.LpVariable(f"x_{prefixo}{r}_{a}", lowBound=int(base * FATOR_MIN),
+                                upBound=max(int(base * FATOR_MAX), 1), cat=categoria)
+            x.setInitialValue(round(base))
+            porcoes_refeicao.append(x)
+
+            # |x - base| para manter as porções próximas do template
+            d = pulp.LpVariable(f"d_{prefixo}{r}_{a}", lowBound=0)
+            prob += d >= x - base
+            prob += d >= base - x
+            desvios.append(d * PASSO_G)
+
+            for i, valor in enumerate(nutrientes[chave]):
+                totais[i] += valor * PASSO_G * x
+        variaveis.append(porcoes_refeicao)
+    objetivo = _adicionar_metas(prob, totais, metas, peso, prefixo) + PESO_DESVIO_TEMPLATE * pulp.lpSum(desvios)
+    return variaveis, objetivo
+
+
+def _adicionar_metas(prob, totais, metas, peso, prefixo):
+    """Restrições das metas sobre ``totais`` (kcal, p, c, g, f); retorna o custo das folgas."""
+    kcal_meta = metas.get("kcal_total", 0)
+    proteina_min = metas.get("proteina_min_g_por_kg", 0) * peso
+    carbo_max_kcal = metas.get("carboidrato_max_percent", 100) / 100 * kcal_meta
+    gordura_max_kcal = metas.get("gordura_max_percent", 100) / 100 * kcal_meta
+    fibras_min = metas.get("fibras_min_g", 0)
+    kcal, p, c, g, f = totais
+
+    kcal_acima = pulp.LpVariable(f"kcal_acima{prefixo}", lowBound=0)
+    kcal_abaixo = pulp.LpVariable(f"kcal_abaixo{prefixo}", lowBound=0)
+    falta_proteina = pulp.LpVariable(f"falta_proteina{prefixo}", lowBound=0)
+    falta_fibras = pulp.LpVariable(f"falta_fibras{prefixo}", lowBound=0)
+    excesso_carbo = pulp.LpVariable(f"excesso_carbo{prefixo}", lowBound=0)
+    excesso_gordura = pulp.LpVariable(f"excesso_gordura{prefixo}", lowBound=0)
+
+    prob += kcal - kcal_meta == kcal_acima - kcal_abaixo
+    prob += p + falta_proteina >= proteina_min
+    prob += f + falta_fibras >= fibras_min
+    prob += c * 4 - excesso_carbo <= carbo_max_kcal
+    prob += g * 9 - excesso_gordura <= gordura_max_kcal
+
+    return (PESO_KCAL * (kcal_acima + kcal_abaixo)
+            + PESO_PROTEINA * falta_proteina
+            + PESO_FIBRAS * falta_fibras
+            + PESO_CARBO * excesso_carbo
+            + PESO_GORDURA * excesso_gordura)
+
+
+def _modelo_alternativas(refeicoes, opcoes, nutrientes, metas, peso):
+    """Problema de porções com escolha de alimento por item; retorna (problema, variáveis).
+
+    Cada opção tem suas porções ``x`` e, quando o item tem mais de uma, um
+    binário ``y`` que a liga; exatamente uma opção por item é usada. Trocar o
+    alimento do template custa ``PESO_TROCA`` e um alimento de grupo não
+    aparece no dia mais vezes do que no template (ao menos uma).
+    """
+    prob = pulp.LpProblem("alternativas", pulp.LpMinimize)
+    variaveis = []
+    desvios, trocas = [], []
+    totais = [0, 0, 0, 0, 0]
+    usos: Dict[str, list] = {}
+    originais: Dict[str, int] = {}
+    for r, refeicao in enumerate(refeicoes):
+        porcoes_refeicao = []
+        for a, opcoes_item in enumerate(opcoes[r]):
+            if opcoes_item is None:
+                porcoes_refeicao.append(None)
+                continue
+            candidatos = []
+            for o, (chave, quantidade_g) in enumerate(opcoes_item):
+                base = quantidade_g / PASSO_G
+                minimo, maximo = int(base * FATOR_MIN), max(int(base * FATOR_MAX), 1)
+                if len(opcoes_item) == 1:
+                    y = 1
+                    x = pulp.LpVariable(f"x_{r}_{a}_{o}", lowBound=minimo, upBound=maximo, cat=pulp.LpInteger)
+                else:
+                    y = pulp.LpVariable(f"y_{r}_{a}_{o}", cat=pulp.LpBinary)
+                    x = pulp.LpVariable(f"x_{r}_{a}_{o}", lowBound=0, upBound=maximo, cat=pulp.LpInteger)
+                    prob += x >= minimo * y
+                    prob += x <= maximo * y
+                    y.setInitialValue(1 if o == 0 else 0)
+                    usos.setdefault(chave, []).append(y)
+                    if o:
+                        trocas.append(y)
+                    else:
+                        originais[chave] = originais.get(chave, 0) + 1
+                x.setInitialValue(round(base) if o == 0 else 0)
+
+                d = pulp.LpVariable(f"d_{r}_{a}_{o}", lowBound=0)
+                prob += d >= x - base * y
+                prob += d >= base * y - x
+                desvios.append(d * PASSO_G)
+
+                for i, valor in enumerate(nutrientes[chave]):
+                    totais[i] += valor * PASSO_G * x
+                candidatos.append((chave, x, y))
+            if len(candidatos) > 1:
+                prob += pulp.lpSum(y for _, _, y in candidatos) == 1
+            porcoes_refeicao.append(candidatos)
+        variaveis.append(porcoes_refeicao)
+
+    for chave, ys in usos.items():
+        if len(ys) > 1:
+            prob += pulp.lpSum(ys) <= max(originais.get(chave, 0), 1)
+
+    prob.setObjective(_adicionar_metas(prob, totais, metas, peso, "")
+                      + PESO_DESVIO_TEMPLATE * pulp.lpSum(desvios)
+                      + PESO_TROCA * pulp.lpSum(trocas))
+    return prob, variaveis
+
+
+def _resolver_dias(dias, metas, peso, tempo_limite, fixos=None, nutrientes=None, relaxado=False):
+    """Resolve vários dias em um único problema; retorna (status, gramas por dia).
+
+    Com ``relaxado`` as porções são contínuas (LP) e cada dia é levado aos
+    passos de ``PASSO_G`` por ``_arredondar_dia``: os dias são independentes
+    e o branch and bound do MILP conjunto não cabe no tempo limite.
+    """
+    carregar_solver()
+    if nutrientes is None:
+        nutrientes = _matriz_nutrientes(refeicao for refeicoes in dias for refeicao in refeicoes)
+    if fixos is None:
+        fixos = [(0, 0, 0, 0, 0)] * len(dias)
+
+    prob = pulp.LpProblem("porcoes", pulp.LpMinimize)
+    variaveis, objetivo = [], []
+    for d, (refeicoes, fixos_dia) in enumerate(zip(dias, fixos)):
+        # Um dia só mantém os nomes de variáveis originais (x_r_a)
+        prefixo = f"{d}_" if len(dias) > 1 else ""
+        variaveis_dia, objetivo_dia = _adicionar_dia(
+            prob, refeicoes, metas, peso, fixos_dia, nutrientes, prefixo,
+            pulp.LpContinuous if relaxado else pulp.LpInteger)
+        variaveis.append(variaveis_dia)
+        objetivo.append(objetivo_dia)
+    prob.setObjective(pulp.lpSum(objetivo))
+
+    solver = pulp.PULP_CBC_CMD(msg=False, timeLimit=tempo_limite, warmStart=True, threads=1)
+    prob.solve(solver)
+
+    # Sem solução inteira dentro do tempo limite -> mantém o template
+    if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        return pulp.LpStatus[prob.status], None
+    status = "otimo" if prob.sol_status == pulp.LpSolutionOptimal else "tempo_limite"
+    if relaxado:
+        return status, [
+            _arredondar_dia(refeicoes, variaveis_dia, metas, peso, nutrientes)
+            for refeicoes, variaveis_dia in zip(dias, variaveis)
+        ]
+    valores = [
+        [
+            [item["quantidade_g"] if x is None else int(round(x.value())) * PASSO_G
+             for item, x in zip(refeicao["alimentos"], porcoes)]
+            for refeicao, porcoes in zip(refeicoes, variaveis_dia)
+        ]
+        for refeicoes, variaveis_dia in zip(dias, variaveis)
+    ]
+    return status, valores
+
+
+def _arredondar_dia(refeicoes, variaveis, metas, peso, nutrientes):
+    """Leva as porções contínuas de um dia para inteiras (gramas em ``PASSO_G``).
+
+    Parte do arredondamento simples e troca, uma porção por vez, piso por
+    teto (ou o contrário) enquanto a troca reduzir a mesma função de custo
+    do MILP; cada passo custa O(alimentos) e o dia converge em poucos passos.
+    """
+    kcal_meta = metas.get("kcal_total", 0)
+    proteina_min = metas.get("proteina_min_g_por_kg", 0) * peso
+    carbo_max_kcal = metas.get("carboidrato_max_percent", 100) / 100 * kcal_meta
+    gordura_max_kcal = metas.get("gordura_max_percent", 100) / 100 * kcal_meta
+    fibras_min = metas.get("fibras_min_g", 0)
+
+    itens = []  # (r, a, base, opções, nutrientes por porção)
+    escolhas = []
+    for r, (refeicao, porcoes) in enumerate(zip(refeicoes, variaveis)):
+        for a, (item, x) in enumerate(zip(refeicao["alimentos"], porcoes)):
+            if x is None:
+                continue
+            valor = x.value() or 0.0
+            por_porcao = tuple(v * PASSO_G for v in nutrientes[resolver_chave(item["alimento"])])
+            itens.append((r, a, item["quantidade_g"] / PASSO_G, (math.floor(valor), math.ceil(valor)), por_porcao))
+            escolhas.append(round(valor))
+
+    def custo(totais, desvio):
+        kcal, p, c, g, f = totais
+        return (PESO_KCAL * abs(kcal - kcal_meta)
+                + PESO_PROTEINA * max(proteina_min - p, 0)
+                + PESO_FIBRAS * max(fibras_min - f, 0)
+                + PESO_CARBO * max(c * 4 - carbo_max_kcal, 0)
+                + PESO_GORDURA * max(g * 9 - gordura_max_kcal, 0)
+                + PESO_DESVIO_TEMPLATE * PASSO_G * desvio)
+
+    totais = [0.0] * 5
+    for escolha, (_, _, _, _, por_porcao) in zip(escolhas, itens):
+        totais = [t + escolha * v for t, v in zip(totais, por_porcao)]
+    desvio = sum(abs(escolha - base) for escolha, (_, _, base, _, _) in zip(escolhas, itens))
+    atual = custo(totais, desvio)
+
+    for _ in range(2 * len(itens)):
+        melhor = None
+        for i, (_, _, base, opcoes, por_porcao) in enumerate(itens):
+            for opcao in opcoes:
+                passo = opcao - escolhas[i]
+                if not passo:
+                    continue
+                novos = [t + passo * v for t, v in zip(totais, por_porcao)]
+                novo_desvio = desvio - abs(escolhas[i] - base) + abs(opcao - base)
+                candidato = custo(novos, novo_desvio)
+                if candidato < atual - 1e-9 and (melhor is None or candidato < melhor[0]):
+                    melhor = (candidato, i, opcao, novos, novo_desvio)
+        if melhor is None:
+            break
+        atual, i, escolhas[i], totais, desvio = melhor
+
+    valores = [[item["quantidade_g"] for item in refeicao["alimentos"]] for refeicao in refeicoes]
+    for escolha, (r, a, _, _, _) in zip(escolhas, itens):
+        valores[r][a] = int(escolha) * PASSO_G
+    return valores
@@ -2,6 +2,8 @@
 # prescritor_pedro_barros.py
 # Prescrições manuais simulando as decisões do nutricionista Pedro Barros
 
+from indice_substituicoes import equivalentes
+
 def prescrever_cafe(paciente, metas):
     return [
         {"alimento": "Pão integral", "quantidade_g": 50, "categoria": "carbo"},
@@ -37,11 +39,5 @@ def prescrever_ceia(paciente, metas):
     ]
 
 def gerar_substituicoes(refeicao):
-    substituicoes = {
-        "carbo": ["Pão integral", "Batata doce", "Tapioca", "Aveia"],
-        "proteina": ["Frango", "Ovo", "Iogurte", "Patinho moído", "Tofu"],
-        "gordura": ["Azeite", "Pasta de amendoim", "Requeijão light", "Abacate"],
-        "fruta": ["Banana", "Maçã", "Mamão", "Frutas vermelhas"],
-        "vegetal": ["Brócolis", "Cenoura", "Abobrinha", "Vagem"]
-    }
-    return substituicoes
+    """Equivalentes de cada alimento da refeição, com a quantidade ajustada."""
+    return equivalentes(refeicao)
@@ -0,0 +1,262 @@
+# replanejamento.py
+# Replanejamento incremental (PATCH /planos/<id>): aplica um delta ao estado
+# guardado de um plano e recalcula só as refeições afetadas. As demais
+# mantêm as quantidades e entram no solver como totais já consumidos.
+
+import time
+from typing import Any, Dict, List, Tuple
+
+from cache_planos import PLANOS
+from database import get_food_data
+from indice_substituicoes import equivalentes, substitutos
+from logic import montar_plano, obter_nucleo, refeicoes_base, refeicoes_especiais
+from otimizador import otimizar_porcoes
+from resolvedor import resolver_chave
+from totais import calcular_totais, formatar_totais, vetorizar_plano
+from validacao import PedidoInvalido, validar_pedido
+
+SECOES_DELTA = ("paciente", "metas", "configuracoes")
+QUANTIDADE_MAX_G = 2000
+
+
+class PlanoNaoEncontrado(KeyError):
+    """``plano_id`` desconhecido ou expirado."""
+
+
+def _mesclar(dados: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica as seções do delta sobre ``dados``; ``null`` remove o campo."""
+    mesclados = {chave: valor for chave, valor in dados.items() if chave not in SECOES_DELTA}
+    for secao in SECOES_DELTA:
+        valores = dict(dados.get(secao, {}))
+        for campo, valor in (delta.get(secao) or {}).items():
+            if valor is None:
+                valores.pop(campo, None)
+            elif campo == "preferencias" and isinstance(valor, dict):
+                valores[campo] = {**valores.get(campo, {}), **valor}
+            else:
+                valores[campo] = valor
+        mesclados[secao] = valores
+    return mesclados
+
+
+def _validar_trocas(trocas: Any) -> List[Dict[str, Any]]:
+    if not isinstance(trocas, list):
+        raise PedidoInvalido(["trocas: deve ser uma lista"])
+    erros = []
+    for i, troca in enumerate(trocas):
+        if not isinstance(troca, dict):
+            erros.append(f"trocas[{i}]: deve ser um objeto")
+            continue
+        if not isinstance(troca.get("refeicao"), (str, int)) or isinstance(troca.get("refeicao"), bool):
+            erros.append(f"trocas[{i}].refeicao: nome ou posição da refeição obrigatório")
+        for campo in ("alimento", "por"):
+            if not isinstance(troca.get(campo), str):
+                erros.append(f"trocas[{i}].{campo}: obrigatório")
+        if isinstance(troca.get("por"), str) and resolver_chave(troca["por"]) is None:
+            erros.append(f"trocas[{i}].por: alimento não encontrado no catálogo")
+        quantidade = troca.get("quantidade_g")
+        if quantidade is not None and (isinstance(quantidade, bool) or not isinstance(quantidade, (int, float))
+                                       or not 0 < quantidade <= QUANTIDADE_MAX_G):
+            erros.append(f"trocas[{i}].quantidade_g: fora do intervalo permitido (0, {QUANTIDADE_MAX_G}]")
+    if erros:
+        raise PedidoInvalido(erros)
+    return trocas
+
+
+def _quantidade_equivalente(chave_antiga: str, chave_nova: str, quantidade_g: float) -> float:
+    """Gramas de ``chave_nova`` equivalentes a ``quantidade_g`` de ``chave_antiga``.
+
+    Usa o multiplicador do índice de substituições quando os dois alimentos
+    são do mesmo grupo; caso contrário, iguala as calorias.
+    """
+    for substituto in substitutos(chave_antiga, quantidade_g):
+        if substituto["alimento"] == chave_nova:
+            return substituto["quantidade_g"]
+    catalogo = get_food_data()
+    kcal_nova = catalogo[chave_nova]["kcal"]
+    if not kcal_nova:
+        return quantidade_g
+    return round(quantidade_g * catalogo[chave_antiga]["kcal"] / kcal_nova)
+
+
+def _localizar_refeicao(refeicoes: List[Dict[str, Any]], referencia) -> int:
+    if isinstance(referencia, int):
+        if 0 <= referencia < len(refeicoes):
+            return referencia
+    else:
+        for i, refeicao in enumerate(refeicoes):
+            if refeicao["nome"] == referencia:
+                return i
+    raise PedidoInvalido([f"trocas: refeição {referencia!r} não está no plano"])
+
+
+def _aplicar_troca(refeicao: Dict[str, Any], troca: Dict[str, Any], ajustar_quantidade: bool) -> None:
+    chave_alvo = resolver_chave(troca["alimento"])
+    for item in refeicao["alimentos"]:
+        if item["alimento"] == troca["alimento"] or (
+                chave_alvo is not None and resolver_chave(item["alimento"]) == chave_alvo):
+            break
+    else:
+        raise PedidoInvalido([f"trocas: {troca['alimento']!r} não está em {refeicao['nome']!r}"])
+
+    quantidade = troca.get("quantidade_g")
+    if quantidade is None:
+        chave_antiga, chave_nova = resolver_chave(item["alimento"]), resolver_chave(troca["por"])
+        quantidade = item["quantidade_g"]
+        if ajustar_quantidade and chave_antiga is not None:
+            quantidade = _quantidade_equivalente(chave_antiga, chave_nova, quantidade)
+    item["alimento"] = troca["por"]
+    item["quantidade_g"] = quantidade
+
+
+def _precisa_plano_completo(antes: Dict[str, Any], depois: Dict[str, Any]) -> bool:
+    # Metas, peso e modo mudam o orçamento de todas as refeições; planos de
+    # vários dias e com alternativas são sempre refeitos (o rodízio depende do
+    # dia base inteiro, e as alternativas são resolvidas juntas)
+    return (antes.get("metas") != depois.get("metas")
+            or antes.get("configuracoes", {}).get("alternativas", 1) > 1
+            or depois.get("configuracoes", {}).get("alternativas", 1) > 1
+            or antes.get("configuracoes", {}).get("dias", 1) > 1
+            or depois.get("configuracoes", {}).get("dias", 1) > 1
+            or antes.get("paciente", {}).get("peso_kg") != depois.get("paciente", {}).get("peso_kg")
+            or antes.get("configuracoes", {}).get("modo", "padrao")
+            != depois.get("configuracoes", {}).get("modo", "padrao"))
+
+
+def _replanejar_refeicoes(nucleo: Dict[str, Any], dados: Dict[str, Any],
+                          trocas: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+    """Novo núcleo a partir do anterior, recalculando só as refeições afetadas."""
+    configuracoes = dados.get("configuracoes", {})
+    modo = configuracoes.get("modo", "padrao")
+    otimizado = modo == "otimizado"
+
+    totais_anteriores = nucleo.get("totais_refeicoes")
+    if totais_anteriores is None:
+        # Núcleo gravado antes dos totais por refeição existirem
+        totais_anteriores = [list(t) for t in calcular_totais(vetorizar_plano(nucleo["refeicoes"]))[0]]
+    anteriores = {refeicao["nome"]: (refeicao, totais)
+                  for refeicao, totais in zip(nucleo["refeicoes"], totais_anteriores)}
+
+    # Estrutura nova do dia: refeições que já existiam ficam como estão. Como
+    # em calcular_refeicoes, os templates novos ficam com o que sobra depois
+    # das refeições especiais
+    especiais = refeicoes_especiais(configuracoes.get("preferencias", {}))
+    kcal_alvo = dados.get("metas", {}).get("kcal_total")
+    if kcal_alvo and especiais and otimizado:
+        kcal_alvo = max(kcal_alvo - calcular_totais(vetorizar_plano(especiais))[1][0], 0) or None
+    base = refeicoes_base(modo, configuracoes.get("num_refeicoes", 5), kcal_alvo)
+    alvo = base + especiais
+    refeicoes, totais_refeicoes, alteradas = [], [], set()
+    for i, refeicao in enumerate(alvo):
+        if refeicao["nome"] in anteriores:
+            refeicao, totais = anteriores[refeicao["nome"]]
+        else:
+            totais = None
+            alteradas.add(i)
+        refeicoes.append(refeicao)
+        totais_refeicoes.append(totais)
+
+    # No modo otimizado o orçamento de uma refeição removida vai para a
+    # última refeição do dia mantida (não as especiais), que é resolvida de
+    # novo; uma refeição especial nova tira o seu das refeições mantidas,
+    # que voltam todas ao solver
+    nomes_alvo = {refeicao["nome"] for refeicao in refeicoes}
+    mantidas = [i for i in range(len(base)) if i not in alteradas]
+    if otimizado and any(i >= len(base) for i in alteradas):
+        alteradas.update(mantidas)
+    elif otimizado and any(nome not in nomes_alvo for nome in anteriores):
+        if mantidas:
+            alteradas.add(mantidas[-1])
+
+    for troca in trocas:
+        i = _localizar_refeicao(refeicoes, troca["refeicao"])
+        _aplicar_troca(refeicoes[i], troca, ajustar_quantidade=not otimizado)
+        alteradas.add(i)
+
+    alteradas = sorted(alteradas)
+    otimizacao = nucleo.get("otimizacao")
+    if otimizado and alteradas:
+        fixos = [0.0] * 5
+        for i, totais in enumerate(totais_refeicoes):
+            if i not in alteradas:
+                fixos = [a + b for a, b in zip(fixos, totais)]
+        peso = dados.get("paciente", {}).get("peso_kg", 0)
+        otimizacao = otimizar_porcoes([refeicoes[i] for i in alteradas], dados.get("metas", {}),
+                                      peso, configuracoes, fixos)
+
+    vetor = vetorizar_plano([refeicoes[i] for i in alteradas])
+    for i, totais in zip(alteradas, calcular_totais(vetor)[0]):
+        totais_refeicoes[i] = list(totais)
+        refeicoes[i]["totais"] = formatar_totais(totais)
+        refeicoes[i]["equivalentes"] = equivalentes(refeicoes[i]["alimentos"])
+
+    # Totais do dia: soma dos vetores por refeição, sem revisitar os alimentos
+    totais_dia = [sum(coluna) for coluna in zip(*totais_refeicoes)] if totais_refeicoes else [0.0] * 5
+
+    # Não resolvidos/aproximados: os das refeições mantidas + os das recalculadas
+    nomes_mantidos = {item["alimento"] for i, refeicao in enumerate(refeicoes) if i not in alteradas
+                      for item in refeicao["alimentos"]}
+    nao_resolvidos = [nome for nome in nucleo["alimentos_nao_resolvidos"] if nome in nomes_mantidos]
+    nao_resolvidos += vetor.nao_resolvidos
+    aproximados = {nome: valor for nome, valor in nucleo["alimentos_aproximados"].items() if nome in nomes_mantidos}
+    aproximados.update({nome: {"chave": chave, "confianca": confianca}
+                        for nome, (chave, confianca) in vetor.aproximados.items()})
+
+    novo = {
+        "refeicoes": refeicoes,
+        "totais_refeicoes": totais_refeicoes,
+        "totais_dia": totais_dia,
+        "alimentos_nao_resolvidos": nao_resolvidos,
+        "alimentos_aproximados": aproximados,
+        "otimizacao": otimizacao,
+    }
+    return novo, [refeicoes[i]["nome"] for i in alteradas]
+
+
+def replanejar(plano_id: str, delta: Any) -> Dict[str, Any]:
+    """Aplica ``delta`` ao plano ``plano_id`` e devolve o plano atualizado.
+
+    ``delta`` aceita ``paciente``, ``metas`` e ``configuracoes`` parciais
+    (mesclados sobre o pedido original; ``preferencias`` campo a campo) e
+    ``trocas``: ``[{"refeicao": nome|posição, "alimento": ..., "por": ...,
+    "quantidade_g": opcional}]``. Mudanças de metas, peso ou modo refazem o
+    plano inteiro; as demais recalculam só as refeições afetadas. O estado
+    guardado passa a ser o do plano atualizado.
+
+    Levanta ``PlanoNaoEncontrado`` e ``PedidoInvalido``.
+    """
+    inicio = time.perf_counter()
+    if not isinstance(delta, dict):
+        raise PedidoInvalido(["corpo deve ser um objeto JSON"])
+    desconhecidos = set(delta) - set(SECOES_DELTA) - {"trocas"}
+    if desconhecidos:
+        raise PedidoInvalido([f"{campo}: campo não suportado no replanejamento" for campo in sorted(desconhecidos)])
+    trocas = _validar_trocas(delta.get("trocas", []))
+
+    estado = PLANOS.obter(plano_id)
+    if estado is None:
+        raise PlanoNaoEncontrado(plano_id)
+
+    dados = validar_pedido(_mesclar(estado["dados"], delta)).para_dict()
+    completo = _precisa_plano_completo(estado["dados"], dados)
+    if completo:
+        if trocas and dados.get("configuracoes", {}).get("dias", 1) > 1:
+            raise PedidoInvalido(["trocas: não suportadas em planos de vários dias"])
+        if trocas and dados.get("configuracoes", {}).get("alternativas", 1) > 1:
+            raise PedidoInvalido(["trocas: não suportadas em planos com alternativas"])
+        nucleo = obter_nucleo(dados)
+        if trocas:
+            nucleo, _ = _replanejar_refeicoes(nucleo, dados, trocas)
+        recalculadas = [refeicao["nome"] for refeicao in nucleo["refeicoes"]]
+    else:
+        nucleo, recalculadas = _replanejar_refeicoes(estado["nucleo"], dados, trocas)
+
+    PLANOS.gravar(plano_id, {"dados": dados, "nucleo": nucleo})
+    plano = montar_plano(dados, nucleo)
+    plano["plano_id"] = plano_id
+    plano["replanejamento"] = {
+        "refeicoes_recalculadas": recalculadas,
+        "plano_completo": completo,
+        "tempo_s": round(time.perf_counter() - inicio, 4),
+    }
+    return plano
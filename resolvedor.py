@@ -0,0 +1,175 @@
+# resolvedor.py
+# Resolve nomes livres de alimentos ("Batata Doce", "Iogurte natural") para
+# as chaves do catálogo, com um índice invertido de trigramas montado no import.
+
+import heapq
+import re
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+from typing import List, Optional, Tuple
+
+from database import get_food_data
+
+# Abaixo disso o nome é considerado fora do catálogo. Um token da consulta
+# sem par na chave já derruba a confiança para (n-1)/n, abaixo do mínimo em
+# consultas de até três tokens ("iogurte grego natural" não vira
+# "iogurte_natural")
+CONFIANCA_MIN = 0.7
+
+# Similaridade (Jaccard de trigramas) para dois tokens contarem como o mesmo
+# ("morangos" ~ "morango" = 0.67; "frango" ~ "morango" = 0.44 não conta)
+SIMILARIDADE_TOKEN_MIN = 0.5
+
+# Preposições não pesam: "peito de frango" tem dois tokens
+PALAVRAS_VAZIAS = frozenset({"a", "o", "e", "de", "da", "do", "das", "dos", "em"})
+
+# Nomes livres emitidos por logic.py e pelo prescritor -> chave do catálogo.
+# Indexado pelo nome já normalizado (ver ``normalizar_nome``).
+ALIASES = {
+    "ovos": "ovo_inteiro",
+    "aveia": "aveia_flocos",
+    "arroz": "arroz_branco_cozido",
+    "frango": "peito_frango_grelhado_sem_pele",
+    "frango_grelhado": "peito_frango_grelhado_sem_pele",
+    "tilapia": "tilapia_assada",
+    "batata_doce": "batata_doce_cozida",
+    "pao_de_hamburguer": "pao_hamburguer_light",
+    "hamburguer_de_patinho": "patinho_moido_95_5",
+    "whey": "whey_protein_isolado_hidrolisado",
+    "brocolis_cozido": "brocolis",
+    "azeite_de_oliva": "azeite_oliva_extra_virgem",
+}
+
+
+def normalizar_nome(nome: str) -> str:
+    """'Batata Doce' -> 'batata_doce' (sem acentos, minúsculo, snake_case)."""
+    sem_acento = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", sem_acento.lower()).strip("_")
+
+
+def trigramas(normalizado: str) -> frozenset:
+    texto = f" {normalizado.replace('_', ' ')} "
+    return frozenset(texto[i:i + 3] for i in range(len(texto) - 2))
+
+
+def tokens(normalizado: str) -> Tuple[str, ...]:
+    """'peito_de_frango' -> ('peito', 'frango')."""
+    return tuple(token for token in normalizado.split("_") if token and token not in PALAVRAS_VAZIAS)
+
+
+class ResolvedorAlimentos:
+    """Casamento aproximado de nomes contra as chaves do catálogo.
+
+    O casamento é por token: cada token da consulta procura o token mais
+    parecido de cada chave (Jaccard de trigramas, só acima de
+    ``SIMILARIDADE_TOKEN_MIN``). Os tokens distintos das chaves ficam em um
+    índice invertido (trigrama -> tokens) e cada token sabe em que linhas e
+    posições aparece, então o custo cresce com o tamanho da consulta e não
+    com o do catálogo.
+
+    A confiança é a cobertura da consulta (média das similaridades dos seus
+    tokens) ponderada por 0.7 + 0.2 * (primeiro token casa com o primeiro da
+    chave) + 0.1 * (fração dos tokens da chave casados): "leite" prefere
+    "leite_desnatado" a "doce_leite", e "ovo" prefere "ovo_inteiro" a
+    "gema_ovo".
+    """
+
+    def __init__(self, catalogo):
+        self.chaves = tuple(catalogo)
+        self.indice = {chave: i for i, chave in enumerate(self.chaves)}
+        self._num_tokens = array("l")
+        vocabulario = {}
+        ocorrencias = []
+        for i, chave in enumerate(self.chaves):
+            tokens_chave = tokens(chave)
+            self._num_tokens.append(len(tokens_chave))
+            for posicao, token in enumerate(tokens_chave):
+                if token not in vocabulario:
+                    vocabulario[token] = len(vocabulario)
+                    ocorrencias.append([])
+                ocorrencias[vocabulario[token]].append((i, posicao))
+        self._ocorrencias = ocorrencias
+        self._tamanhos = array("l")
+        postagens = defaultdict(list)
+        for token, t in vocabulario.items():
+            grams = trigramas(token)
+            self._tamanhos.append(len(grams))
+            for grama in grams:
+                postagens[grama].append(t)
+        self._postagens = {grama: array("l", ids) for grama, ids in postagens.items()}
+        self._resolver_normalizado = lru_cache(maxsize=4096)(self._pontuar)
+
+    def _parecidos(self, token: str):
+        """(token do vocabulário, similaridade) acima de ``SIMILARIDADE_TOKEN_MIN``."""
+        grams = trigramas(token)
+        postagens = self._postagens
+        comuns = Counter(chain.from_iterable(postagens[grama] for grama in grams if grama in postagens))
+        tamanhos = self._tamanhos
+        for t, n in comuns.items():
+            similaridade = n / (len(grams) + tamanhos[t] - n)
+            if similaridade >= SIMILARIDADE_TOKEN_MIN:
+                yield t, similaridade
+
+    def _pontuar(self, normalizado: str, k: int = 1) -> Tuple[Tuple[str, float], ...]:
+        consulta = tokens(normalizado)
+        if not consulta:
+            return ()
+        # linha -> melhor similaridade de cada token da consulta
+        cobertura = defaultdict(lambda: [0.0] * len(consulta))
+        casados = defaultdict(set)
+        primeiro = defaultdict(float)
+        for q, token in enumerate(consulta):
+            for t, similaridade in self._parecidos(token):
+                for i, posicao in self._ocorrencias[t]:
+                    melhores = cobertura[i]
+                    if similaridade > melhores[q]:
+                        melhores[q] = similaridade
+                    casados[i].add(posicao)
+                    if q == 0 and posicao == 0:
+                        primeiro[i] = max(primeiro[i], similaridade)
+        num_tokens = self._num_tokens
+
+        def confianca(i):
+            peso = 0.7 + 0.2 * primeiro[i] + 0.1 * len(casados[i]) / num_tokens[i]
+            return sum(cobertura[i]) / len(consulta) * peso
+
+        melhores = heapq.nsmallest(k, ((-confianca(i), num_tokens[i], i) for i in cobertura))
+        return tuple((self.chaves[i], round(-score, 3)) for score, _, i in melhores)
+
+    def resolver(self, nome: str) -> Optional[Tuple[str, float]]:
+        """(chave, confiança) do melhor candidato, ou None abaixo de ``CONFIANCA_MIN``."""
+        normalizado = normalizar_nome(nome)
+        # Um snapshot externo pode não ter a chave do alias
+        if ALIASES.get(normalizado) in self.indice:
+            return ALIASES[normalizado], 1.0
+        melhores = self._resolver_normalizado(normalizado)
+        if not melhores or melhores[0][1] < CONFIANCA_MIN:
+            return None
+        return melhores[0]
+
+    def sugestoes(self, nome: str, k: int = 5) -> List[Tuple[str, float]]:
+        return list(self._resolver_normalizado(normalizar_nome(nome), k))
+
+
+RESOLVEDOR = ResolvedorAlimentos(get_food_data())
+
+
+@lru_cache(maxsize=4096)
+def resolver(nome: str) -> Optional[Tuple[str, float]]:
+    """Resolve um nome para (chave, confiança); chaves exatas têm confiança 1."""
+    catalogo = get_food_data()
+    if nome in catalogo:
+        return nome, 1.0
+    normalizado = normalizar_nome(nome)
+    if normalizado in catalogo:
+        return normalizado, 1.0
+    return RESOLVEDOR.resolver(nome)
+
+
+def resolver_chave(nome: str) -> Optional[str]:
+    """Resolve um nome de alimento para a chave do catálogo, ou None."""
+    resolvido = resolver(nome)
+    return resolvido[0] if resolvido else None
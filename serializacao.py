@@ -0,0 +1,27 @@
+# serializacao.py
+# JSON de entrada e saída: usa orjson quando instalado e cai para o json da
+# biblioteca padrão caso contrário.
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+MOTOR = "orjson" if orjson is not None else "json"
+
+
+def decodificar(corpo: bytes) -> Any:
+    """Decodifica um corpo JSON; levanta ``ValueError`` se for inválido."""
+    if orjson is not None:
+        return orjson.loads(corpo)
+    return json.loads(corpo)
+
+
+def codificar(objeto: Any) -> bytes:
+    """Codifica em JSON UTF-8 (sem escapar acentos)."""
+    if orjson is not None:
+        return orjson.dumps(objeto)
+    return json.dumps(objeto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,127 @@
+# templates_refeicoes.py
+# Compilador dos templates de get_meal_templates(): roda uma vez no import,
+# resolve cada alimento para a linha do catálogo e pré-calcula o vetor de
+# macros do template na quantidade base e os coeficientes de escala. Escalar
+# um template para uma meta vira algumas multiplicações de float.
+#
+# Um template com alimento fora do catálogo carregado (um snapshot externo
+# sem as chaves da tabela embutida) fica de fora e é registrado no log; o
+# catalogo_externo.py recusa esses snapshots já na compilação.
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import COLUNAS_NUTRIENTES, get_food_data, get_meal_templates
+from resolvedor import ALIASES, normalizar_nome
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateInvalido(ValueError):
+    """Template com alimento fora do catálogo ou quantidade inválida."""
+
+
+@dataclass(frozen=True, slots=True)
+class TemplateCompilado:
+    tipo: str
+    variante: str
+    nome: str
+    chaves: Tuple[str, ...]
+    linhas: Tuple[int, ...]
+    qtd_base: Tuple[float, ...]
+    # (kcal, p, c, g, f) do template na quantidade base
+    macros_base: Tuple[float, ...]
+    # Fator de escala por unidade de cada macro (0 quando o macro é zero)
+    coeficientes: Tuple[float, ...]
+
+    def fator(self, alvo: float, macro: str = "kcal") -> float:
+        """Fator que leva o template a ``alvo`` de ``macro`` (kcal, p, c, g ou f)."""
+        return alvo * self.coeficientes[COLUNAS_NUTRIENTES.index(macro)]
+
+    def macros(self, fator: float = 1.0) -> Tuple[float, ...]:
+        return tuple(valor * fator for valor in self.macros_base)
+
+    def refeicao(self, fator: float = 1.0) -> Dict[str, Any]:
+        """Refeição no formato de ``gerar_plano_personalizado`` com as quantidades escaladas."""
+        return {
+            "nome": self.nome,
+            "alimentos": [
+                {"alimento": chave, "quantidade_g": qtd if fator == 1.0 else round(qtd * fator)}
+                for chave, qtd in zip(self.chaves, self.qtd_base)
+            ]
+        }
+
+
+def _resolver_exato(nome: str, catalogo) -> Optional[str]:
+    """Chave de ``nome`` em ``catalogo`` por chave, slug ou alias; sem aproximação."""
+    if nome in catalogo:
+        return nome
+    normalizado = normalizar_nome(nome)
+    if normalizado in catalogo:
+        return normalizado
+    alias = ALIASES.get(normalizado)
+    return alias if alias in catalogo else None
+
+
+def _compilar(templates, catalogo) -> Tuple[Dict[Tuple[str, str], TemplateCompilado], List[str]]:
+    """(templates compilados, erros); um template com erro fica de fora."""
+    colunas = [catalogo.coluna(nome) for nome in COLUNAS_NUTRIENTES]
+
+    compilados, erros = {}, []
+    for tipo, variantes in templates.items():
+        for variante, template in variantes.items():
+            chaves, linhas, quantidades = [], [], []
+            erros_template = []
+            for item in template["alimentos"]:
+                chave = _resolver_exato(item["nome"], catalogo)
+                if chave is None:
+                    erros_template.append(f"{tipo}.{variante}: alimento '{item['nome']}' não está no catálogo")
+                    continue
+                if not item.get("qtd_base", 0) > 0:
+                    erros_template.append(f"{tipo}.{variante}: qtd_base inválida para '{item['nome']}'")
+                    continue
+                chaves.append(chave)
+                linhas.append(catalogo.indice[chave])
+                quantidades.append(item["qtd_base"])
+            if erros_template:
+                erros.extend(erros_template)
+                continue
+            macros = tuple(
+                sum(coluna[linha] * qtd for linha, qtd in zip(linhas, quantidades)) for coluna in colunas
+            )
+            compilados[(tipo, variante)] = TemplateCompilado(
+                tipo=tipo,
+                variante=variante,
+                nome=template["nome"],
+                chaves=tuple(chaves),
+                linhas=tuple(linhas),
+                qtd_base=tuple(quantidades),
+                macros_base=macros,
+                coeficientes=tuple(1 / valor if valor else 0.0 for valor in macros),
+            )
+    return compilados, erros
+
+
+def compilar(templates=None, catalogo=None) -> Dict[Tuple[str, str], TemplateCompilado]:
+    """Compila todos os templates; levanta ``TemplateInvalido`` listando cada problema.
+
+    Só aceita alimentos do catálogo por chave, slug ou alias: uma
+    aproximação do resolvedor em um template é um erro de dados.
+    """
+    compilados, erros = _compilar(get_meal_templates() if templates is None else templates,
+                                  get_food_data() if catalogo is None else catalogo)
+    if erros:
+        raise TemplateInvalido("templates de refeição inválidos:\n" + "\n".join(f"  - {erro}" for erro in erros))
+    return compilados
+
+
+def validar_templates(catalogo) -> List[str]:
+    """Problemas dos templates contra ``catalogo`` (vazio quando todos compilam)."""
+    return _compilar(get_meal_templates(), catalogo)[1]
+
+
+TEMPLATES, ERROS_TEMPLATES = _compilar(get_meal_templates(), get_food_data())
+if ERROS_TEMPLATES:
+    logger.warning("templates de refeição ignorados (alimentos fora do catálogo):\n%s",
+                   "\n".join(f"  - {erro}" for erro in ERROS_TEMPLATES))
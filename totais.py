@@ -0,0 +1,143 @@
+# totais.py
+# Motor de totais nutricionais: converte um plano em um vetor esparso
+# (índice do alimento, gramas) e calcula os macros por refeição e do dia
+# contra as colunas por grama do catálogo.
+
+from array import array
+from typing import Dict, Any, List, Sequence
+
+from database import get_food_data, COLUNAS_NUTRIENTES
+from resolvedor import resolver
+
+
+class VetorPlano:
+    """Plano como vetor esparso em formato CSR.
+
+    ``indices``/``gramas`` guardam os pares (linha do catálogo, gramas) de
+    todas as refeições em sequência; a refeição ``k`` ocupa o intervalo
+    ``inicios[k]:inicios[k + 1]``.
+    """
+
+    __slots__ = ("indices", "gramas", "inicios", "nomes", "nao_resolvidos", "aproximados")
+
+    def __init__(self):
+        self.indices = array("l")
+        self.gramas = array("d")
+        self.inicios = array("l", [0])
+        self.nomes: List[str] = []
+        self.nao_resolvidos: List[str] = []
+        # Nomes resolvidos por aproximação: nome -> (chave, confiança)
+        self.aproximados: Dict[str, tuple] = {}
+
+    def adicionar_refeicao(self, nome: str, alimentos: Sequence[Dict[str, Any]]) -> None:
+        indice = get_food_data().indice
+        for item in alimentos:
+            resolvido = resolver(item["alimento"])
+            if resolvido is None:
+                self.nao_resolvidos.append(item["alimento"])
+                continue
+            chave, confianca = resolvido
+            if confianca < 1.0:
+                self.aproximados[item["alimento"]] = (chave, confianca)
+            self.indices.append(indice[chave])
+            self.gramas.append(float(item.get("quantidade_g", 0)))
+        self.inicios.append(len(self.indices))
+        self.nomes.append(nome)
+
+
+def vetorizar_plano(refeicoes: Sequence[Dict[str, Any]]) -> VetorPlano:
+    """Monta o vetor esparso de uma lista de refeições.
+
+    Cada refeição segue o formato de ``gerar_plano_personalizado``
+    (``{"nome": ..., "alimentos": [{"alimento": ..., "quantidade_g": ...}]}``);
+    as listas devolvidas por ``prescritor_pedro_barros.prescrever_*`` servem
+    diretamente como ``alimentos``.
+    """
+    vetor = VetorPlano()
+    for refeicao in refeicoes:
+        vetor.adicionar_refeicao(refeicao.get("nome", ""), refeicao.get("alimentos", []))
+    return vetor
+
+
+def calcular_totais(vetor: VetorPlano, a_partir: int = 0):
+    """Produto matriz-vetor do plano contra as colunas do catálogo.
+
+    Retorna ``(por_refeicao, dia)``: uma lista de tuplas
+    (kcal, p, c, g, f) por refeição e a tupla do dia, em uma única passada
+    sobre as entradas não nulas do vetor. Com ``a_partir`` só as refeições
+    desse índice em diante entram (planos montados refeição a refeição).
+    """
+    catalogo = get_food_data()
+    kcal, p, c, g, f = (catalogo.coluna(nome) for nome in COLUNAS_NUTRIENTES)
+    indices, gramas, inicios = vetor.indices, vetor.gramas, vetor.inicios
+    por_refeicao = []
+    dia = [0.0] * 5
+    for k in range(a_partir, len(inicios) - 1):
+        tk = tp = tc = tg = tf = 0.0
+        for j in range(inicios[k], inicios[k + 1]):
+            i = indices[j]
+            w = gramas[j]
+            tk += kcal[i] * w
+            tp += p[i] * w
+            tc += c[i] * w
+            tg += g[i] * w
+            tf += f[i] * w
+        por_refeicao.append((tk, tp, tc, tg, tf))
+        dia[0] += tk
+        dia[1] += tp
+        dia[2] += tc
+        dia[3] += tg
+        dia[4] += tf
+    return por_refeicao, tuple(dia)
+
+
+def totais_lote(vetores: Sequence[VetorPlano]) -> List[tuple]:
+    """Totais do dia para N planos de uma vez: uma tupla (kcal, p, c, g, f) por plano.
+
+    Os vetores CSR dos planos são concatenados em um só (as refeições do
+    plano ``n`` ficam em sequência, logo depois das do plano ``n - 1``) e
+    ``calcular_totais`` faz uma única passada sobre o lote inteiro; os
+    totais das refeições são então somados por faixa de plano.
+    """
+    lote = VetorPlano()
+    limites = [0]
+    for vetor in vetores:
+        deslocamento = len(lote.indices)
+        lote.indices.extend(vetor.indices)
+        lote.gramas.extend(vetor.gramas)
+        lote.inicios.extend(inicio + deslocamento for inicio in vetor.inicios[1:])
+        limites.append(len(lote.inicios) - 1)
+    por_refeicao, _ = calcular_totais(lote)
+    return [
+        tuple(sum(coluna) for coluna in zip(*por_refeicao[inicio:fim])) if fim > inicio else (0.0,) * 5
+        for inicio, fim in zip(limites, limites[1:])
+    ]
+
+
+def formatar_totais(totais) -> Dict[str, float]:
+    kcal, p, c, g, f = totais
+    return {
+        "calorias": round(kcal, 1),
+        "proteina_g": round(p, 1),
+        "carboidrato_g": round(c, 1),
+        "gordura_g": round(g, 1),
+        "fibras_g": round(f, 1),
+    }
+
+
+def calcular_aderencia(totais, metas: Dict[str, Any], peso: float) -> Dict[str, Any]:
+    """Compara os totais reais do dia com as metas do paciente."""
+    kcal, p, c, g, f = totais
+    kcal_meta = metas.get("kcal_total", 0)
+    proteina_min = metas.get("proteina_min_g_por_kg", 0) * peso
+    carbo_percent = (c * 4 / kcal * 100) if kcal else 0
+    gordura_percent = (g * 9 / kcal * 100) if kcal else 0
+    return {
+        "calorias_percent_meta": round(kcal / kcal_meta * 100, 1) if kcal_meta else None,
+        "proteina_ok": p >= proteina_min,
+        "carboidrato_percent": round(carbo_percent, 1),
+        "carboidrato_ok": carbo_percent <= metas.get("carboidrato_max_percent", 100),
+        "gordura_percent": round(gordura_percent, 1),
+        "gordura_ok": gordura_percent <= metas.get("gordura_max_percent", 100),
+        "fibras_ok": f >= metas.get("fibras_min_g", 0),
+    }
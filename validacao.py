@@ -0,0 +1,190 @@
+# validacao.py
+# Modelo tipado do payload de /gerarPlano com validação pré-compilada.
+# Os intervalos numéricos vêm de get_static_info()['limites_seguros'].
+
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_static_info
+
+MODOS = ("padrao", "otimizado")
+DIAS_MAX = 28
+ALTERNATIVAS_MAX = 5
+
+
+class PedidoInvalido(ValueError):
+    """Payload rejeitado; ``erros`` lista cada campo inválido."""
+
+    def __init__(self, erros: List[str]):
+        super().__init__("; ".join(erros))
+        self.erros = erros
+
+
+@dataclass(slots=True)
+class Paciente:
+    peso_kg: float
+    nome: Optional[str] = None
+    altura_cm: Optional[float] = None
+    sexo: Optional[str] = None
+    outros: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Metas:
+    kcal_total: float
+    proteina_min_g_por_kg: Optional[float] = None
+    carboidrato_max_percent: Optional[float] = None
+    gordura_max_percent: Optional[float] = None
+    fibras_min_g: Optional[float] = None
+    outros: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Configuracoes:
+    num_refeicoes: Optional[int] = None
+    modo: Optional[str] = None
+    tempo_limite_solver_s: Optional[float] = None
+    dias: Optional[int] = None
+    alternativas: Optional[int] = None
+    intervalo_proteina_dias: Optional[int] = None
+    pre_treino: Optional[Dict[str, Any]] = None
+    preferencias: Optional[Dict[str, Any]] = None
+    outros: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class PedidoPlano:
+    paciente: Paciente
+    metas: Metas
+    configuracoes: Configuracoes = field(default_factory=Configuracoes)
+    # Campos fora do esquema seguem adiante sem validação
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Dict no formato esperado por ``gerar_plano_personalizado``.
+
+        Campos opcionais ausentes não são preenchidos, para que os padrões
+        continuem sendo decididos por logic.py e pelo otimizador; campos fora
+        do esquema (``outros``) voltam como vieram.
+        """
+        dados = dict(self.extras)
+        for secao in ("paciente", "metas", "configuracoes"):
+            objeto = getattr(self, secao)
+            valores = dict(objeto.outros)
+            for f in fields(objeto):
+                valor = getattr(objeto, f.name)
+                if f.name != "outros" and valor is not None:
+                    valores[f.name] = valor
+            dados[secao] = valores
+        return dados
+
+
+# --- Validadores --------------------------------------------------------
+
+def _numero(minimo: float, maximo: float, inteiro: bool = False) -> Callable[[Any], Optional[str]]:
+    tipos = (int,) if inteiro else (int, float)
+
+    def validar(valor):
+        if isinstance(valor, bool) or not isinstance(valor, tipos):
+            return "deve ser um número inteiro" if inteiro else "deve ser numérico"
+        if not minimo <= valor <= maximo:
+            return f"fora do intervalo permitido [{minimo}, {maximo}]"
+        return None
+    return validar
+
+
+def _texto(maximo: int, opcoes: Optional[Tuple[str, ...]] = None) -> Callable[[Any], Optional[str]]:
+    def validar(valor):
+        if not isinstance(valor, str):
+            return "deve ser texto"
+        if len(valor) > maximo:
+            return f"excede {maximo} caracteres"
+        if opcoes is not None and valor not in opcoes:
+            return f"deve ser um de {', '.join(opcoes)}"
+        return None
+    return validar
+
+
+def _objeto(valor) -> Optional[str]:
+    return None if isinstance(valor, dict) else "deve ser um objeto"
+
+
+def _compilar_esquema():
+    """Monta, uma única vez, a tabela secao -> [(campo, validador, obrigatório)]."""
+    limites = get_static_info()["limites_seguros"]
+    return (
+        ("paciente", Paciente, (
+            ("peso_kg", _numero(20, 300), True),
+            ("nome", _texto(200), False),
+            ("altura_cm", _numero(50, 250), False),
+            ("sexo", _texto(1, ("M", "F", "N")), False),
+        )),
+        ("metas", Metas, (
+            ("kcal_total", _numero(800, 6000), True),
+            ("proteina_min_g_por_kg", _numero(limites["proteina_min_g_kg"], limites["proteina_max_g_kg"]), False),
+            ("carboidrato_max_percent", _numero(limites["carb_min_percent"], limites["carb_max_percent"]), False),
+            ("gordura_max_percent", _numero(limites["gordura_min_percent"], limites["gordura_max_percent"]), False),
+            ("fibras_min_g", _numero(limites["fibra_min_g"], limites["fibra_max_g"]), False),
+        )),
+        ("configuracoes", Configuracoes, (
+            ("num_refeicoes", _numero(1, 8, inteiro=True), False),
+            ("modo", _texto(20, MODOS), False),
+            ("tempo_limite_solver_s", _numero(0.1, 30), False),
+            ("dias", _numero(1, DIAS_MAX, inteiro=True), False),
+            ("alternativas", _numero(1, ALTERNATIVAS_MAX, inteiro=True), False),
+            ("intervalo_proteina_dias", _numero(0, 7, inteiro=True), False),
+            ("pre_treino", _objeto, False),
+            ("preferencias", _objeto, False),
+        )),
+    )
+
+
+ESQUEMA = _compilar_esquema()
+_SECOES_OBRIGATORIAS = ("paciente", "metas")
+_CONHECIDOS = {secao: frozenset(campo for campo, _, _ in campos) for secao, _, campos in ESQUEMA}
+
+
+def validar_pedido(dados: Any) -> PedidoPlano:
+    """Valida o payload e retorna o ``PedidoPlano``; levanta ``PedidoInvalido``."""
+    if not isinstance(dados, dict):
+        raise PedidoInvalido(["corpo deve ser um objeto JSON"])
+
+    erros = []
+    secoes = {}
+    for secao, modelo, campos in ESQUEMA:
+        objeto = dados.get(secao)
+        if objeto is None:
+            if secao in _SECOES_OBRIGATORIAS:
+                erros.append(f"{secao}: obrigatório")
+            objeto = {}
+        elif not isinstance(objeto, dict):
+            erros.append(f"{secao}: deve ser um objeto")
+            continue
+        valores = {}
+        for campo, validar, obrigatorio in campos:
+            valor = objeto.get(campo)
+            if valor is None:
+                if obrigatorio:
+                    erros.append(f"{secao}.{campo}: obrigatório")
+                continue
+            erro = validar(valor)
+            if erro is not None:
+                erros.append(f"{secao}.{campo}: {erro}")
+            else:
+                valores[campo] = valor
+        valores["outros"] = {chave: valor for chave, valor in objeto.items() if chave not in _CONHECIDOS[secao]}
+        secoes[secao] = modelo(**valores) if not erros else None
+
+    if erros:
+        raise PedidoInvalido(erros)
+
+    configuracoes = secoes["configuracoes"]
+    if (configuracoes.alternativas or 1) > 1 and (configuracoes.modo != "otimizado" or (configuracoes.dias or 1) > 1):
+        raise PedidoInvalido(["configuracoes.alternativas: exige modo otimizado e um único dia"])
+
+    return PedidoPlano(
+        paciente=secoes["paciente"],
+        metas=secoes["metas"],
+        configuracoes=secoes["configuracoes"],
+        extras={chave: valor for chave, valor in dados.items() if chave not in ("paciente", "metas", "configuracoes")},
+    )